@@ -4,48 +4,328 @@
 # requires-python = ">=3.12"
 # dependencies = []
 # ///
-"""PostToolUse hook: find nearest mise.toml/package.json with 'format' task, run on single file."""
+"""PostToolUse hook: find nearest mise.toml/package.json with 'format' task, run on single file.
 
+Resolutions are cached per directory, one small file each, together with the
+mtimes of every config file the walk looked at, so a warm lookup is one short
+read and a handful of stat calls.
+
+Formatting is handed to a per-workspace daemon over a Unix socket. The daemon
+keeps warm workers (Python console-script formatters such as sqlfluff or black
+imported once, prettierd for prettier) and exits after being idle. When it
+isn't reachable the hook starts it in the background and formats directly.
+Set AUTO_FORMAT_DAEMON=0 to always format directly. The socket is private to the
+user, the daemon only runs the format task the file's own config resolves to,
+and a warm worker restarts when a config it may have cached (.sqlfluff,
+pyproject.toml, ...) changes.
+
+With AUTO_FORMAT_BATCH_MS set, the hook only queues the file with the daemon and
+returns. Files for the same task directory and command are collected until no
+new edit arrives for that many milliseconds (or 4x that since the first one),
+then formatted in a single formatter invocation.
+
+After a successful run the file's content hash is recorded per formatter
+command; an edit that leaves a file byte-identical to that output is skipped.
+
+Set AUTO_FORMAT_TRACE=1 to append per-invocation phase timings, the resolved
+task and the formatter's exit code and stderr to auto-format-trace.jsonl in the
+cache directory (rotated at 5 MB). `auto-format.py --report` summarises it as
+p50/p95/p99 latency per formatter. SKILL_PROFILE profiles the same phases
+with perf.py (CPU time, peak RSS, cProfile, stack samples, Chrome trace).
+"""
+
+import contextlib
+import fcntl
+import hashlib
 import json
+import math
+import os
 import re
 import shlex
+import shutil
+import socket
+import socketserver
 import subprocess
 import sys
+import threading
+import time
 from pathlib import Path
 
+import perf
+
+MAX_CACHED_DIRS = 2000
+MAX_HASHED_FILES = 5000
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUPS = 3
+DAEMON_IDLE_SECONDS = int(os.environ.get("AUTO_FORMAT_DAEMON_IDLE", "1800"))
+CLIENT_TIMEOUT_SECONDS = 60
+BATCH_MS = int(os.environ.get("AUTO_FORMAT_BATCH_MS", "0"))
+BATCH_MAX_FACTOR = 4
+# Config files Python formatters read (and cache) from a file's directory up;
+# a change to any of them restarts the warm worker
+FORMATTER_CONFIGS = (
+    ".sqlfluff",
+    ".sqlfluffignore",
+    "pyproject.toml",
+    "setup.cfg",
+    "tox.ini",
+    ".isort.cfg",
+    ".editorconfig",
+)
+
+# Runs inside a formatter's own interpreter; reads {"cwd", "argv"} lines and
+# calls the console-script entry point without paying import cost again.
+PYTHON_WORKER_SRC = """\
+import contextlib, importlib, io, json, os, sys
+# Replies go to a private copy of stdout; anything the formatter prints is dropped
+reply = os.fdopen(os.dup(1), "w")
+os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+sys.stdout = open(os.devnull, "w")
+module, attr = sys.argv[1], sys.argv[2]
+entry = getattr(importlib.import_module(module), attr)
+for line in sys.stdin:
+    req = json.loads(line)
+    err = io.StringIO()
+    code = 0
+    os.chdir(req["cwd"])
+    sys.argv = req["argv"]
+    try:
+        with contextlib.redirect_stderr(err):
+            entry()
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception as e:
+        code = 1
+        err.write(repr(e))
+    reply.write(json.dumps({"returncode": code, "stderr": err.getvalue()[-4000:]}) + "\\n")
+    reply.flush()
+"""
+
+
+def cache_dir() -> Path:
+    """Per-user state directory ($AUTO_FORMAT_CACHE_DIR overrides it)."""
+    if os.environ.get("AUTO_FORMAT_CACHE_DIR"):
+        return Path(os.environ["AUTO_FORMAT_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "armed-claude"
+
+
+def private_dir(path: Path) -> None:
+    """Create the daemon's directory readable by this user only."""
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    with contextlib.suppress(OSError):
+        os.chmod(path, 0o700)
+
+
+def load_json(path: Path) -> dict:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def save_json(path: Path, data: dict) -> None:
+    """Write atomically so concurrent hooks never see a torn file."""
+    try:
+        path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def file_signature(path: Path) -> list[int] | None:
+    """(mtime_ns, size) of a config file, None when it doesn't exist."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+class Trace:
+    """Phase timings for one invocation, written as a JSON line when enabled."""
+
+    def __init__(self, event: str):
+        self.enabled = os.environ.get("AUTO_FORMAT_TRACE", "0") not in ("", "0")
+        self.started = time.perf_counter()
+        self.record: dict = {"event": event, "ts": time.time(), "phases": {}}
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            with perf.phase(name):
+                yield
+        finally:
+            phases = self.record["phases"]
+            phases[name] = phases.get(name, 0) + (time.perf_counter() - t0) * 1000
+
+    def write(self) -> None:
+        if not self.enabled:
+            return
+        self.record["total_ms"] = round((time.perf_counter() - self.started) * 1000, 3)
+        phases = self.record["phases"]
+        self.record["phases"] = {name: round(ms, 3) for name, ms in phases.items()}
+        path = trace_path()
+        try:
+            path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            if path.exists() and path.stat().st_size > TRACE_MAX_BYTES:
+                for n in range(TRACE_BACKUPS - 1, 0, -1):
+                    older = path.with_name(f"{path.name}.{n}")
+                    if older.exists():
+                        os.replace(older, path.with_name(f"{path.name}.{n + 1}"))
+                os.replace(path, path.with_name(f"{path.name}.1"))
+            with open(path, "a") as f:
+                f.write(json.dumps(self.record, default=str) + "\n")
+        except OSError:
+            pass
+
+
+def trace_path() -> Path:
+    return cache_dir() / "auto-format-trace.jsonl"
+
+
+TRACE = Trace("hook")
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    rank = math.ceil(pct / 100 * len(values)) - 1
+    return values[min(len(values) - 1, max(0, rank))]
+
 
-def extract_file_path() -> str | None:
+def print_report() -> None:
+    """Summarise the trace log: latency percentiles per formatter and repo."""
+    path = trace_path()
+    records = []
+    logs = [path.with_name(f"{path.name}.{n}") for n in range(TRACE_BACKUPS, 0, -1)]
+    for log in [*logs, path]:
+        try:
+            with open(log) as f:
+                records += [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            continue
+    if not records:
+        print(f"No trace records in {path} (set AUTO_FORMAT_TRACE=1)", file=sys.stderr)
+        sys.exit(1)
+
+    groups: dict[tuple[str, str, str], list[dict]] = {}
+    for r in records:
+        if r.get("base_cmd"):
+            key = (r["base_cmd"], r.get("task_dir", ""), r["event"])
+            groups.setdefault(key, []).append(r)
+
+    print(f"{len(records)} invocations from {path}\n")
+    header = (
+        f"{'formatter':<24} {'event':<6} {'n':>5} {'fail':>4} {'skip':>5} "
+        f"{'p50':>8} {'p95':>8} {'p99':>8}  repo"
+    )
+    print(header)
+    print("-" * len(header))
+    # Slowest groups first
+    by_p95 = {key: sorted(r["total_ms"] for r in rs) for key, rs in groups.items()}
+    for key in sorted(by_p95, key=lambda k: percentile(by_p95[k], 95), reverse=True):
+        base_cmd, task_dir, event = key
+        totals = by_p95[key]
+        fails = sum(1 for r in groups[key] if r.get("returncode") not in (None, 0))
+        skips = sum(1 for r in groups[key] if r.get("outcome") == "skipped")
+        print(
+            f"{base_cmd[:24]:<24} {event:<6} {len(totals):>5} {fails:>4} {skips:>5} "
+            f"{percentile(totals, 50):>8.1f} {percentile(totals, 95):>8.1f} "
+            f"{percentile(totals, 99):>8.1f}  {task_dir}"
+        )
+
+    print(f"\n{'phase':<12} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8}")
+    phases: dict[str, list[float]] = {}
+    for r in records:
+        for name, ms in r.get("phases", {}).items():
+            phases.setdefault(name, []).append(ms)
+    for name, values in phases.items():
+        values.sort()
+        print(
+            f"{name:<12} {len(values):>5} {percentile(values, 50):>8.1f} "
+            f"{percentile(values, 95):>8.1f} {percentile(values, 99):>8.1f}"
+        )
+    print("\nAll times in ms, measured from hook start (excludes interpreter startup).")
+
+
+def content_hash(path: Path) -> str | None:
+    try:
+        return hashlib.blake2b(path.read_bytes(), digest_size=16).hexdigest()
+    except OSError:
+        return None
+
+
+def is_formatted(file_path: Path, base_cmd: str) -> bool:
+    """True if the file is unchanged since base_cmd last formatted it."""
+    recorded = load_json(cache_dir() / "auto-format-hashes.json").get(str(file_path))
+    return bool(recorded) and recorded.get(base_cmd) == content_hash(file_path)
+
+
+def record_formatted(base_cmd: str, files: list[str]) -> None:
+    """Remember the post-format content hash of each file for base_cmd."""
+    hashes_path = cache_dir() / "auto-format-hashes.json"
+    hashes = load_json(hashes_path)
+    for name in files:
+        digest = content_hash(Path(name))
+        if digest:
+            # Re-insert so the least recently formatted paths are pruned first
+            entry = hashes.pop(name, {})
+            entry[base_cmd] = digest
+            hashes[name] = entry
+    for stale in list(hashes)[: max(0, len(hashes) - MAX_HASHED_FILES)]:
+        del hashes[stale]
+    save_json(hashes_path, hashes)
+
+
+def read_hook_input() -> tuple[str | None, str]:
+    """Return (edited file path, workspace directory) from the hook payload."""
     data = json.load(sys.stdin)
-    return data.get("tool_input", {}).get("file_path")
+    return data.get("tool_input", {}).get("file_path"), data.get("cwd") or os.getcwd()
 
 
-def find_format_task(file_path: Path) -> tuple[str, Path] | None:
-    """Walk up directories to find nearest mise.toml or package.json with a format task."""
+def find_format_task(
+    file_path: Path,
+) -> tuple[tuple[str, Path, str] | None, dict[str, list[int] | None]]:
+    """Walk up directories to find nearest mise.toml or package.json with a format task.
+
+    Returns (kind, task_dir, format command) or None, plus the signature of
+    every config path looked at so the result can be cached.
+    """
+    deps: dict[str, list[int] | None] = {}
     dir = file_path.parent
     while dir != dir.parent:
         mise = dir / "mise.toml"
-        if mise.is_file():
-            text = mise.read_text()
-            if re.search(r"^\[tasks\.format\]", text, re.MULTILINE):
-                return ("mise", dir)
+        deps[str(mise)] = file_signature(mise)
+        if deps[str(mise)]:
+            with TRACE.phase("config"):
+                text = mise.read_text()
+                has_task = re.search(r"^\[tasks\.format\]", text, re.MULTILINE)
+                fmt_cmd = extract_format_cmd("mise", text) if has_task else None
+            if has_task:
+                return ("mise", dir, fmt_cmd), deps
 
         pkg = dir / "package.json"
-        if pkg.is_file():
-            data = json.loads(pkg.read_text())
-            if "format" in data.get("scripts", {}):
-                return ("pkg", dir)
+        deps[str(pkg)] = file_signature(pkg)
+        if deps[str(pkg)]:
+            with TRACE.phase("config"):
+                text = pkg.read_text()
+                has_task = "format" in json.loads(text).get("scripts", {})
+                fmt_cmd = extract_format_cmd("pkg", text) if has_task else None
+            if has_task:
+                return ("pkg", dir, fmt_cmd), deps
 
         dir = dir.parent
-    return None
+    return None, deps
 
 
-def extract_format_cmd(kind: str, task_dir: Path) -> str | None:
-    """Extract the raw format command string from config."""
+def extract_format_cmd(kind: str, text: str) -> str | None:
+    """Extract the raw format command string from config text."""
     if kind == "pkg":
-        data = json.loads((task_dir / "package.json").read_text())
-        return data["scripts"]["format"]
+        return json.loads(text)["scripts"]["format"]
     elif kind == "mise":
-        text = (task_dir / "mise.toml").read_text()
         m = re.search(
             r'\[tasks\.format\].*?run\s*=\s*"([^"]+)"', text, re.DOTALL
         )
@@ -69,33 +349,439 @@ def strip_file_args(cmd: str) -> str:
     return " ".join(base)
 
 
+def resolve_cache_path(key: str) -> Path:
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return cache_dir() / "auto-format-resolve" / f"{digest}.json"
+
+
+def prune_resolve_cache(directory: Path) -> None:
+    """Delete the least recently resolved entries beyond MAX_CACHED_DIRS."""
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return
+    if len(entries) <= MAX_CACHED_DIRS:
+        return
+    mtimes = {}
+    for entry in entries:
+        with contextlib.suppress(OSError):
+            mtimes[entry.path] = entry.stat().st_mtime_ns
+    # Trim to three quarters so the next misses don't each rescan a full cache
+    keep = MAX_CACHED_DIRS * 3 // 4
+    for path in sorted(mtimes, key=mtimes.get)[: len(mtimes) - keep]:
+        with contextlib.suppress(OSError):
+            os.unlink(path)
+
+
+def resolve_format_task(file_path: Path) -> tuple[Path, str] | None:
+    """Return (task_dir, base_cmd) for a file, using the resolution cache."""
+    key = str(file_path.parent)
+    cache_path = resolve_cache_path(key)
+
+    entry = load_json(cache_path)
+    # The directory is stored too, in case two keys share a digest
+    if entry.get("dir") == key and all(
+        file_signature(Path(path)) == sig for path, sig in entry["deps"].items()
+    ):
+        TRACE.record["resolve_cache"] = "hit"
+        if not entry["task_dir"]:
+            return None
+        return Path(entry["task_dir"]), entry["base_cmd"]
+
+    TRACE.record["resolve_cache"] = "miss"
+    found, deps = find_format_task(file_path)
+    kind = task_dir = base_cmd = None
+    if found:
+        kind, task_dir, fmt_cmd = found
+        base_cmd = strip_file_args(fmt_cmd) if fmt_cmd else None
+
+    save_json(
+        cache_path,
+        {
+            "dir": key,
+            "kind": kind,
+            "task_dir": str(task_dir) if task_dir and base_cmd else None,
+            "base_cmd": base_cmd,
+            "deps": deps,
+        },
+    )
+    prune_resolve_cache(cache_path.parent)
+
+    return (task_dir, base_cmd) if task_dir and base_cmd else None
+
+
+def config_signatures(files: list[str]) -> dict[str, list[int] | None]:
+    """Signatures of the formatter config files that could apply to files."""
+    signatures = {}
+    for dir in {Path(f).parent for f in files}:
+        for parent in [dir, *dir.parents]:
+            for name in FORMATTER_CONFIGS:
+                path = str(parent / name)
+                if path not in signatures:
+                    signatures[path] = file_signature(parent / name)
+    return signatures
+
+
+def run_direct(task_dir: Path, base_cmd: str, files: list[str]) -> dict:
+    """Run the formatter as a fresh process (the no-daemon path)."""
+    try:
+        result = subprocess.run(
+            [*shlex.split(base_cmd), *files], cwd=task_dir, capture_output=True
+        )
+    except OSError as e:
+        return {"returncode": 127, "stderr": str(e)}
+    return {
+        "returncode": result.returncode,
+        "stderr": result.stderr.decode(errors="replace")[-4000:],
+    }
+
+
+class PythonWorker:
+    """A console-script formatter kept imported in its own interpreter."""
+
+    def __init__(self, python: str, module: str, attr: str):
+        self.proc = subprocess.Popen(
+            [python, "-c", PYTHON_WORKER_SRC, module, attr],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_tool(cls, tool: str) -> "PythonWorker | None":
+        """Build a worker from a pip-style console script's shebang and import line."""
+        path = shutil.which(tool)
+        if not path:
+            return None
+        try:
+            head = Path(path).read_text(errors="replace")[:2000]
+        except OSError:
+            return None
+        shebang = re.match(r"#!(\S*python[\d.]*)\s*\n", head)
+        entry = re.search(r"^from (\S+) import (\w+)$", head, re.MULTILINE)
+        if not shebang or not entry:
+            return None
+        return cls(shebang.group(1), entry.group(1), entry.group(2))
+
+    def run(self, task_dir: Path, argv: list[str]) -> dict:
+        with self.lock:
+            request = json.dumps({"cwd": str(task_dir), "argv": argv})
+            self.proc.stdin.write(request + "\n")
+            self.proc.stdin.flush()
+            line = self.proc.stdout.readline()
+        if not line:
+            raise OSError("formatter worker exited")
+        return json.loads(line)
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def close(self) -> None:
+        self.proc.kill()
+
+
+class PrettierdWorker:
+    """prettier through prettierd, which keeps prettier loaded between calls."""
+
+    def __init__(self, prettierd: str):
+        self.prettierd = prettierd
+
+    @classmethod
+    def for_cmd(cls, task_dir: Path, argv: list[str]) -> "PrettierdWorker | None":
+        # prettierd takes no flags, so anything beyond --write (--config,
+        # plugins, ...) runs as a plain prettier process instead
+        if Path(argv[0]).name != "prettier" or argv[1:] != ["--write"]:
+            return None
+        local = task_dir / "node_modules" / ".bin" / "prettierd"
+        prettierd = str(local) if local.exists() else shutil.which("prettierd")
+        return cls(prettierd) if prettierd else None
+
+    def run(self, task_dir: Path, argv: list[str]) -> dict:
+        for file in argv[1:]:
+            if file.startswith("-"):
+                continue
+            path = Path(file)
+            source = path.read_bytes()
+            result = subprocess.run(
+                [self.prettierd, str(path)],
+                input=source,
+                cwd=task_dir,
+                capture_output=True,
+            )
+            if result.returncode != 0:
+                return {
+                    "returncode": result.returncode,
+                    "stderr": result.stderr.decode(errors="replace")[-4000:],
+                }
+            if result.stdout and result.stdout != source:
+                path.write_bytes(result.stdout)
+        return {"returncode": 0, "stderr": ""}
+
+    def alive(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+class FormatDaemon:
+    """Warm formatter workers for one workspace, keyed by (task_dir, base_cmd)."""
+
+    def __init__(self):
+        self.workers: dict[tuple[str, str], PythonWorker | PrettierdWorker | None] = {}
+        # Config signatures each worker has seen, to notice edits it has cached
+        self.configs: dict[tuple[str, str], dict[str, list[int] | None]] = {}
+        self.lock = threading.Lock()
+        self.last_request = time.monotonic()
+        # (task_dir, base_cmd) -> {"files": ordered set, "first": t, "timer": Timer}
+        self.batches: dict[tuple[str, str], dict] = {}
+
+    def worker(self, task_dir: Path, base_cmd: str, files: list[str]):
+        key = (str(task_dir), base_cmd)
+        configs = config_signatures(files)
+        with self.lock:
+            worker = self.workers.get(key)
+            seen = self.configs.get(key, {})
+            changed = any(seen.get(path, sig) != sig for path, sig in configs.items())
+            if key not in self.workers or (worker and (changed or not worker.alive())):
+                if worker:
+                    worker.close()
+                argv = shlex.split(base_cmd)
+                worker = PrettierdWorker.for_cmd(task_dir, argv)
+                if worker is None and Path(argv[0]).name != "prettier":
+                    worker = PythonWorker.for_tool(argv[0])
+                self.workers[key] = worker
+                self.configs[key] = {}
+            self.configs[key].update(configs)
+            return worker
+
+    def format(self, task_dir: Path, base_cmd: str, files: list[str]) -> dict:
+        self.last_request = time.monotonic()
+        worker = self.worker(task_dir, base_cmd, files)
+        if worker:
+            try:
+                return worker.run(task_dir, [*shlex.split(base_cmd), *files])
+            except (OSError, ValueError):
+                with self.lock:
+                    self.workers.pop((str(task_dir), base_cmd), None)
+        return run_direct(task_dir, base_cmd, files)
+
+    def enqueue(self, task_dir: Path, base_cmd: str, files: list[str], delay: float) -> dict:
+        """Queue files and (re)arm the debounce timer for their group."""
+        self.last_request = time.monotonic()
+        key = (str(task_dir), base_cmd)
+        with self.lock:
+            batch = self.batches.setdefault(
+                key, {"files": {}, "first": self.last_request, "timer": None}
+            )
+            batch["files"].update(dict.fromkeys(files))
+            if batch["timer"]:
+                batch["timer"].cancel()
+            deadline = batch["first"] + delay * BATCH_MAX_FACTOR
+            wait = max(0.0, min(delay, deadline - self.last_request))
+            batch["timer"] = threading.Timer(wait, self.flush, (key,))
+            batch["timer"].daemon = True
+            batch["timer"].start()
+            queued = len(batch["files"])
+        return {"returncode": 0, "stderr": "", "queued": queued}
+
+    def flush(self, key: tuple[str, str]) -> dict | None:
+        with self.lock:
+            batch = self.batches.pop(key, None)
+        if not batch:
+            return None
+        # Files may have been deleted or renamed while they sat in the queue
+        files = [f for f in batch["files"] if Path(f).is_file()]
+        if not files:
+            return None
+        trace = Trace("batch")
+        trace.record.update(task_dir=key[0], base_cmd=key[1], files=len(files))
+        with trace.phase("format"):
+            response = self.format(Path(key[0]), key[1], files)
+        if response["returncode"] == 0:
+            record_formatted(key[1], files)
+        trace.record.update(response)
+        trace.write()
+        return response
+
+    def close(self) -> None:
+        for key in list(self.batches):
+            self.flush(key)
+        for worker in self.workers.values():
+            if worker:
+                worker.close()
+
+
+def socket_path(workspace: str) -> Path:
+    digest = hashlib.sha1(workspace.encode()).hexdigest()[:12]
+    return cache_dir() / f"auto-format-{digest}.sock"
+
+
+def serve(workspace: str) -> None:
+    """Run the formatter daemon for a workspace until it has been idle a while."""
+    path = socket_path(workspace)
+    private_dir(path.parent)
+    # Parallel edits can each start a daemon; only the lock holder may replace
+    # the socket, or the daemon it replaced would run on with none
+    lock = open(path.with_name(f"{path.name}.lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return
+    path.unlink(missing_ok=True)
+    daemon = FormatDaemon()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            request = json.loads(self.rfile.readline())
+            task_dir = Path(request["task_dir"])
+            # Only run the format task the files' own config resolves to, never
+            # a command a client made up
+            for file in request["files"]:
+                if resolve_format_task(Path(file)) != (task_dir, request["base_cmd"]):
+                    response = {
+                        "returncode": 1,
+                        "stderr": f"{request['base_cmd']!r} is not the format task "
+                        f"configured for {file}",
+                    }
+                    self.wfile.write(json.dumps(response).encode() + b"\n")
+                    return
+            if request.get("batch_ms"):
+                response = daemon.enqueue(
+                    task_dir,
+                    request["base_cmd"],
+                    request["files"],
+                    request["batch_ms"] / 1000,
+                )
+            else:
+                response = daemon.format(task_dir, request["base_cmd"], request["files"])
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+
+    # Only this user may connect: requests run commands in their task_dir
+    umask = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(str(path), Handler)
+    finally:
+        os.umask(umask)
+    with server:
+        server.daemon_threads = True
+
+        def exit_when_idle() -> None:
+            while (
+                daemon.batches
+                or time.monotonic() - daemon.last_request < DAEMON_IDLE_SECONDS
+            ):
+                time.sleep(5)
+            server.shutdown()
+
+        threading.Thread(target=exit_when_idle, daemon=True).start()
+        try:
+            server.serve_forever()
+        finally:
+            daemon.close()
+            path.unlink(missing_ok=True)
+            lock.close()
+
+
+def start_daemon(workspace: str) -> None:
+    subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), "--daemon", workspace],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def request_daemon(workspace: str, request: dict) -> dict | None:
+    """Send a format request to the workspace daemon; None if it isn't running."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CLIENT_TIMEOUT_SECONDS)
+    try:
+        sock.connect(str(socket_path(workspace)))
+    except OSError:
+        sock.close()
+        return None
+    with sock, sock.makefile("rwb") as stream:
+        try:
+            stream.write(json.dumps(request).encode() + b"\n")
+            stream.flush()
+            line = stream.readline()
+        except OSError:
+            line = b""
+    # A daemon that accepted the request owns it, even if it didn't answer
+    return json.loads(line) if line else {"returncode": None, "stderr": "no reply"}
+
+
+def format_files(workspace: str, task_dir: Path, base_cmd: str, files: list[str]) -> dict:
+    """Format through the workspace daemon, falling back to a direct run."""
+    TRACE.record["via"] = "direct"
+    if os.environ.get("AUTO_FORMAT_DAEMON", "1") == "0":
+        response = run_direct(task_dir, base_cmd, files)
+    else:
+        request = {"task_dir": str(task_dir), "base_cmd": base_cmd, "files": files}
+        if BATCH_MS > 0:
+            request["batch_ms"] = BATCH_MS
+        response = request_daemon(workspace, request)
+        if response is None:
+            start_daemon(workspace)
+            response = run_direct(task_dir, base_cmd, files)
+        else:
+            TRACE.record["via"] = "daemon"
+    # Queued batches are recorded by the daemon once they have actually run
+    if response["returncode"] == 0 and "queued" not in response:
+        record_formatted(base_cmd, files)
+    return response
+
+
 def main() -> None:
-    file_path_str = extract_file_path()
+    if len(sys.argv) == 3 and sys.argv[1] == "--daemon":
+        serve(sys.argv[2])
+        return
+
+    if len(sys.argv) == 2 and sys.argv[1] == "--report":
+        print_report()
+        return
+
+    perf.start()
+    try:
+        run_hook()
+    finally:
+        TRACE.write()
+
+
+def run_hook() -> None:
+    with TRACE.phase("stdin"):
+        file_path_str, workspace = read_hook_input()
     if not file_path_str:
         return
 
     file_path = Path(file_path_str)
+    TRACE.record["file"] = file_path_str
     if not file_path.is_file():
         return
 
-    result = find_format_task(file_path)
+    with TRACE.phase("resolve"):
+        result = resolve_format_task(file_path)
     if not result:
+        TRACE.record["outcome"] = "no-task"
         return
 
-    kind, task_dir = result
-    fmt_cmd = extract_format_cmd(kind, task_dir)
-    if not fmt_cmd:
+    task_dir, base_cmd = result
+    TRACE.record.update(task_dir=str(task_dir), base_cmd=base_cmd)
+    with TRACE.phase("hash"):
+        formatted = is_formatted(file_path, base_cmd)
+    if formatted:
+        TRACE.record["outcome"] = "skipped"
         return
 
-    base_cmd = strip_file_args(fmt_cmd)
-    if not base_cmd:
-        return
-
-    subprocess.run(
-        [*shlex.split(base_cmd), str(file_path)],
-        cwd=task_dir,
-        capture_output=True,
-    )
+    with TRACE.phase("format"):
+        response = format_files(workspace, task_dir, base_cmd, [str(file_path)])
+    TRACE.record["outcome"] = "queued" if "queued" in response else "formatted"
+    TRACE.record.update(response)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,279 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.11"
+# dependencies = []
+# ///
+"""
+Measure cold-start time of every skill script and hook, and fail over budget.
+
+Each case runs a script down a path that should stay cheap: --help, an
+argument error, a dry run, or a batch whose outputs all exist already. Every
+case runs in a fresh interpreter --repeat times. The first run is reported as
+cold and the median as warm. The median minus a bare `python -c pass` is the
+script's own startup cost. That cost must stay under the case's budget.
+
+Usage:
+    uv run scripts/bench_startup.py [options]
+
+Examples:
+    uv run scripts/bench_startup.py                      # scripts run by this python
+    uv run scripts/bench_startup.py --uv                 # through uv, as users run them
+    uv run scripts/bench_startup.py --budget-ms 100 --importtime
+    uv run scripts/bench_startup.py -o startup.json
+
+--uv runs each script the way its shebang or docstring does. uv re-resolves
+a script's inline dependencies unless it has a lock file. `uv lock --script
+skills/media-gen/scripts/gen_image.py` writes gen_image.py.lock next to it,
+which later `uv run --script` calls use as is. Compare --uv runs before and
+after locking to see what resolution costs.
+
+--importtime reruns each failing case once under `python -X importtime` and
+lists the imports that took longest.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BUDGET_MS = 150
+# Scripts whose modules need pyarrow/duckdb on every path, --help included
+HEAVY_BUDGET_MS = 750
+IMPORTTIME_TOP = 8
+
+
+def cases(tmp: Path) -> list[dict]:
+    """Script, arguments and expected exit code of every measured path."""
+    dbf = "skills/dbf-analysis/scripts"
+    media = "skills/media-gen/scripts"
+    migration = "skills/supabase-migration/scripts"
+    seeding = "skills/supabase-seeding/scripts"
+
+    # A manifest whose only output exists: the batch is skipped without an API call
+    done = tmp / "done.png"
+    done.write_bytes(b"")
+    manifest = tmp / "manifest.jsonl"
+    manifest.write_text(json.dumps({"prompt": "x", "output": str(done)}) + "\n")
+    empty_seeds = tmp / "seed"
+    empty_seeds.mkdir()
+
+    return [
+        {"script": f"{dbf}/dbf_to_parquet.py", "args": ["--help"]},
+        {
+            "script": f"{dbf}/dbf_to_parquet.py",
+            "args": ["X.DBF", "--key", "ID"],
+            "expect": 2,
+        },
+        {"script": f"{dbf}/inspect_dbf.py", "args": ["--help"]},
+        {
+            "script": f"{dbf}/dbf_raw.py",
+            "args": ["--help"],
+            "budget_ms": HEAVY_BUDGET_MS,
+        },
+        {
+            "script": f"{dbf}/dbf_index.py",
+            "args": ["--help"],
+            "budget_ms": HEAVY_BUDGET_MS,
+        },
+        {
+            "script": f"{dbf}/dbf_search.py",
+            "args": ["--help"],
+            "budget_ms": HEAVY_BUDGET_MS,
+        },
+        {
+            "script": f"{dbf}/build_duckdb.py",
+            "args": ["--help"],
+            "budget_ms": HEAVY_BUDGET_MS,
+        },
+        {"script": f"{media}/gen_image.py", "args": ["--help"]},
+        {"script": f"{media}/gen_image.py", "args": [], "expect": 2},
+        {"script": f"{media}/gen_image.py", "args": ["--manifest", str(manifest)]},
+        {"script": f"{media}/gen_video.py", "args": ["--help"]},
+        {"script": f"{media}/gen_video.py", "args": ["--manifest", str(manifest)]},
+        {"script": f"{media}/media_server.py", "args": ["--help"]},
+        {"script": f"{migration}/lint_migration.py", "args": ["--help"]},
+        {
+            "script": f"{migration}/lint_migration.py",
+            "args": [str(tmp / "missing")],
+            "expect": 1,
+        },
+        {"script": f"{migration}/new_migration.py", "args": ["--help"]},
+        {"script": f"{migration}/squash_migrations.py", "args": ["--help"]},
+        {"script": f"{seeding}/generate_seed.py", "args": ["--help"]},
+        {"script": f"{seeding}/run_seeds.py", "args": ["--help"]},
+        {"script": f"{seeding}/run_seeds.py", "args": [str(empty_seeds), "--dry-run"]},
+        {"script": f"{seeding}/template_db.py", "args": ["--help"]},
+        {"script": f"{seeding}/bench_seeds.py", "args": ["--help"]},
+        {"script": "hooks/auto-format.py", "args": [], "stdin": b"{}"},
+    ]
+
+
+def script_cmd(script: Path, use_uv: bool) -> list[str]:
+    """Command prefix that runs a script with this python or the way users do."""
+    if not use_uv:
+        return [sys.executable, str(script)]
+    with open(script) as f:
+        first_line = f.readline()
+    if "uv run" in first_line:
+        return ["uv", "run", "--script", str(script)]
+    # The dbf-analysis scripts run in their project's environment
+    return ["uv", "run", "python", str(script)]
+
+
+def run_once(cmd: list[str], stdin: bytes | None, cwd: Path) -> tuple[float, int, str]:
+    """Wall seconds, exit code and stderr tail of one run."""
+    env = {k: v for k, v in os.environ.items() if k != "SKILL_PROFILE"}
+    started = time.perf_counter()
+    result = subprocess.run(
+        cmd,
+        input=stdin or b"",
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        env=env,
+    )
+    wall = time.perf_counter() - started
+    return wall, result.returncode, result.stderr.decode(errors="replace")[-500:]
+
+
+def measure(cmd: list[str], stdin: bytes | None, cwd: Path, repeat: int) -> dict:
+    runs = [run_once(cmd, stdin, cwd) for _ in range(repeat)]
+    walls = [wall for wall, _, _ in runs]
+    return {
+        "cold_ms": round(walls[0] * 1000, 1),
+        "median_ms": round(statistics.median(walls) * 1000, 1),
+        "returncode": runs[-1][1],
+        "stderr": runs[-1][2],
+    }
+
+
+def slowest_imports(cmd: list[str], stdin: bytes | None, cwd: Path) -> list[str]:
+    """Top cumulative entries of `python -X importtime` for one run."""
+    result = subprocess.run(
+        [cmd[0], "-X", "importtime", *cmd[1:]],
+        input=stdin or b"",
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+    )
+    rows = []
+    for line in result.stderr.decode(errors="replace").splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        # Only top-level entries; nested ones are already in their parent's total
+        if not name.startswith("  "):
+            rows.append((int(cumulative), name.strip()))
+    rows.sort(reverse=True)
+    return [f"{us / 1000:8.1f} ms  {name}" for us, name in rows[:IMPORTTIME_TOP]]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark cold-start time of the skill scripts",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument(
+        "--uv",
+        action="store_true",
+        help="Run scripts through uv (includes dependency resolution)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Runs per case (default: 5)"
+    )
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=DEFAULT_BUDGET_MS,
+        help="Startup budget over a bare interpreter for light cases "
+        f"(default: {DEFAULT_BUDGET_MS})",
+    )
+    parser.add_argument(
+        "--match", help="Only run cases whose script path contains this text"
+    )
+    parser.add_argument(
+        "--importtime",
+        action="store_true",
+        help="Show the slowest imports of cases over budget",
+    )
+    parser.add_argument("--output", "-o", type=Path, help="Write results JSON here")
+
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    if args.uv and not shutil.which("uv"):
+        print("Error: uv not found", file=sys.stderr)
+        sys.exit(1)
+
+    failed = 0
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_startup_") as tmp:
+        tmp = Path(tmp)
+        baseline = measure([sys.executable, "-c", "pass"], None, tmp, args.repeat)
+        base_ms = baseline["median_ms"]
+        print(f"bare interpreter: {base_ms:.1f} ms (cold {baseline['cold_ms']:.1f} ms)")
+        print(f"{'case':<58} {'cold':>8} {'median':>8} {'startup':>8} {'budget':>7}")
+
+        for case in cases(tmp):
+            label = " ".join([case["script"], *case["args"]]).replace(str(tmp), "$TMP")
+            if args.match and args.match not in case["script"]:
+                continue
+            cmd = [*script_cmd(ROOT / case["script"], args.uv), *case["args"]]
+            stdin = case.get("stdin")
+            result = measure(cmd, stdin, tmp, args.repeat)
+            startup = round(result["median_ms"] - base_ms, 1)
+            budget = case.get("budget_ms", args.budget_ms)
+
+            status = "ok"
+            if result["returncode"] != case.get("expect", 0):
+                status = f"exit {result['returncode']}"
+            elif startup > budget:
+                status = "OVER"
+            print(
+                f"{label[:58]:<58} {result['cold_ms']:>8.1f} {result['median_ms']:>8.1f} "
+                f"{startup:>8.1f} {budget:>7.0f}  {status}"
+            )
+            if status != "ok":
+                failed += 1
+                if status != "OVER":
+                    print(f"    {result['stderr'].strip()[-300:]}", file=sys.stderr)
+                elif args.importtime and not args.uv:
+                    for line in slowest_imports(cmd, stdin, tmp):
+                        print(f"    {line}")
+
+            results.append(
+                {
+                    "case": label,
+                    "cold_ms": result["cold_ms"],
+                    "median_ms": result["median_ms"],
+                    "startup_ms": startup,
+                    "budget_ms": budget,
+                    "status": status,
+                }
+            )
+
+    if args.output:
+        report = {
+            "runner": "uv" if args.uv else sys.executable,
+            "bare_ms": base_ms,
+            "results": results,
+        }
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Results written to {args.output}")
+
+    if failed:
+        print(f"\n{failed} case(s) failed or over budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
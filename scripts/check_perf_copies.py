@@ -0,0 +1,77 @@
+#!/usr/bin/env -S uv run --script
+# /// script
+# requires-python = ">=3.11"
+# dependencies = []
+# ///
+"""
+Check that every vendored copy of perf.py is identical.
+
+Skills are installed independently, so each one (and hooks/) ships its own
+perf.py. hooks/perf.py is the reference; edit it, then run this with --sync
+to copy it over the others.
+
+Usage:
+    uv run scripts/check_perf_copies.py           # exit 1 if any copy differs
+    uv run scripts/check_perf_copies.py --sync    # overwrite copies from hooks/
+"""
+
+import argparse
+import difflib
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+REFERENCE = ROOT / "hooks" / "perf.py"
+
+
+def copies() -> list[Path]:
+    return sorted(ROOT.glob("skills/*/scripts/perf.py"))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check that the vendored perf.py copies are identical",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help=f"Overwrite differing copies with {REFERENCE.relative_to(ROOT)}",
+    )
+    args = parser.parse_args()
+
+    reference = REFERENCE.read_text()
+    differing = 0
+    for path in copies():
+        text = path.read_text()
+        if text == reference:
+            continue
+        rel = path.relative_to(ROOT)
+        if args.sync:
+            path.write_text(reference)
+            print(f"Synced {rel}")
+            continue
+        differing += 1
+        print(f"{rel} differs from {REFERENCE.relative_to(ROOT)}:", file=sys.stderr)
+        diff = difflib.unified_diff(
+            reference.splitlines(keepends=True),
+            text.splitlines(keepends=True),
+            fromfile=str(REFERENCE.relative_to(ROOT)),
+            tofile=str(rel),
+        )
+        sys.stderr.writelines(diff)
+
+    if differing:
+        print(
+            f"\n{differing} of {len(copies())} copies differ; edit the reference, "
+            "then run with --sync",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    if not args.sync:
+        print(f"{len(copies()) + 1} perf.py copies identical")
+
+
+if __name__ == "__main__":
+    main()
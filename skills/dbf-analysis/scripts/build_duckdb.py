@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""Load converted Parquet tables into one persistent DuckDB database.
+
+Every <TABLE>.parquet in the directory becomes a table. Known accounting
+tables get the primary and foreign keys from references/table-schemas.md
+(ARMST.ACCID, ARTR.DOCNO -> ARTR.ACCID references ARMST, ...), checked
+against the data first: a key that the data violates (duplicate DOCNOs,
+orphan ACCIDs) is reported and left out instead of failing the load.
+
+The standard rollups from references/query-patterns.md are materialized as
+summary tables (monthly_revenue, customer_revenue, gl_balances,
+ar_open_by_due plus the ar_aging view), so dashboard queries read a few
+hundred rows instead of re-aggregating the transactions.
+
+Reruns are incremental. _sources records each table's Parquet fingerprint
+and the last change-capture delta applied (<TABLE>.deltas/, written by
+dbf_to_parquet.py --changes). Unchanged tables are skipped, tables with new
+deltas are patched by primary key, and only the summary groups those rows
+touch (months, customers, due dates) are recomputed. Anything else is
+reloaded from its Parquet file, with its summaries rebuilt in full.
+
+Usage:
+    uv run python build_duckdb.py asParquet/                    # -> asParquet/accounting.duckdb
+    uv run python build_duckdb.py asParquet/ -o /data/acc.duckdb
+    uv run python build_duckdb.py asParquet/ --rebuild          # reload everything
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import duckdb
+import pyarrow.parquet as pq
+
+from dbf_changes import DELTA_KEY_META, STATE_META
+
+# Dependency order: parents before the tables that reference them
+TABLES = {
+    "ARMST": {"key": ["ACCID"]},
+    "APMST": {"key": ["ACCID"]},
+    "INVMST": {"key": ["PCODE"]},
+    "GLTRHD": {"key": ["DOCNO"]},
+    "ARTR": {"key": ["DOCNO"], "refs": {"ACCID": "ARMST"}},
+    "APTR": {"key": ["DOCNO"], "refs": {"ACCID": "APMST"}},
+    "INVLOC": {"key": ["PCODE", "LOCID"], "refs": {"PCODE": "INVMST"}},
+    "GLTR": {"refs": {"DOCNO": "GLTRHD"}, "index": ["GLID"]},
+    "ARPAY": {"refs": {"ACCID": "ARMST", "INVNO": "ARTR"}},
+    "APPAY": {"refs": {"ACCID": "APMST", "INVNO": "APTR"}},
+}
+
+# Rollups from query-patterns.md. "sources" maps each input table to the
+# expression giving a row's group, "filter" is that group in the query.
+SUMMARIES = {
+    "monthly_revenue": {
+        "group": "month",
+        "sources": {"ARTR": "strftime(DATEDOC, '%Y-%m')"},
+        "filter": "strftime(DATEDOC, '%Y-%m')",
+        "sql": """
+            SELECT strftime(DATEDOC, '%Y-%m') AS month,
+                   COUNT(*) AS invoices,
+                   ROUND(SUM(AMOUNT_A), 2) AS revenue
+            FROM ARTR
+            WHERE DATEDOC IS NOT NULL AND {filter}
+            GROUP BY month""",
+    },
+    "customer_revenue": {
+        "group": "ACCID",
+        "sources": {"ARTR": "ACCID", "ARMST": "ACCID"},
+        "filter": "a.ACCID",
+        "sql": """
+            SELECT a.ACCID, m.COMP,
+                   COUNT(*) AS txn_count,
+                   ROUND(SUM(a.AMOUNT_A), 2) AS total_revenue
+            FROM ARTR a
+            LEFT JOIN ARMST m ON a.ACCID = m.ACCID
+            WHERE {filter}
+            GROUP BY a.ACCID, m.COMP""",
+    },
+    "gl_balances": {
+        "group": "GLID",
+        "sources": {"GLTR": "GLID"},
+        "filter": "GLID",
+        "sql": """
+            SELECT GLID,
+                   ROUND(SUM(DEBIT), 2) AS total_debit,
+                   ROUND(SUM(CREDIT), 2) AS total_credit,
+                   ROUND(SUM(DEBIT) - SUM(CREDIT), 2) AS balance
+            FROM GLTR
+            WHERE {filter}
+            GROUP BY GLID""",
+    },
+    # Aging depends on CURRENT_DATE, so the open balance is kept per due date
+    # and bucketed at query time by the ar_aging view
+    "ar_open_by_due": {
+        "group": "DUEDATE",
+        "sources": {"ARTR": "DUEDATE"},
+        "filter": "DUEDATE",
+        "sql": """
+            SELECT DUEDATE, COUNT(*) AS invoices, ROUND(SUM(BALANCE), 2) AS balance
+            FROM ARTR
+            WHERE BALANCE > 0 AND {filter}
+            GROUP BY DUEDATE""",
+    },
+}
+
+AGING_VIEW = """
+CREATE OR REPLACE VIEW ar_aging AS
+SELECT
+    CASE
+        WHEN DUEDATE >= CURRENT_DATE THEN 'Current'
+        WHEN DUEDATE >= CURRENT_DATE - INTERVAL '30 days' THEN '1-30 days'
+        WHEN DUEDATE >= CURRENT_DATE - INTERVAL '60 days' THEN '31-60 days'
+        WHEN DUEDATE >= CURRENT_DATE - INTERVAL '90 days' THEN '61-90 days'
+        ELSE 'Over 90 days'
+    END AS aging_bucket,
+    SUM(invoices) AS invoices,
+    ROUND(SUM(balance), 2) AS total_balance
+FROM ar_open_by_due
+GROUP BY aging_bucket
+ORDER BY list_position(
+    ['Current', '1-30 days', '31-60 days', '61-90 days', 'Over 90 days'], aging_bucket)
+"""
+
+SOURCES_DDL = """
+CREATE TABLE IF NOT EXISTS _sources (
+    table_name VARCHAR PRIMARY KEY,
+    path VARCHAR,
+    fingerprint VARCHAR,
+    deltas_through VARCHAR,
+    rows BIGINT,
+    loaded_at TIMESTAMP
+)"""
+
+
+def ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def sql_list(paths: list[Path]) -> str:
+    return "[" + ", ".join("'" + str(p).replace("'", "''") + "'" for p in paths) + "]"
+
+
+def fingerprint(path: Path) -> str:
+    """Identity of a Parquet file's contents.
+
+    Change-capture snapshots carry the digest of the record hashes they
+    match, which stays the same when a run found nothing to change.
+    """
+    state = (pq.read_schema(path).metadata or {}).get(STATE_META)
+    if state:
+        return f"state:{state.decode()}"
+    stat = path.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def table_order(names: list[str]) -> list[str]:
+    known = [name for name in TABLES if name in names]
+    return known + sorted(set(names) - set(known))
+
+
+def primary_key(con, table: str) -> list[str] | None:
+    row = con.execute(
+        "SELECT constraint_column_names FROM duckdb_constraints() "
+        "WHERE table_name = ? AND constraint_type = 'PRIMARY KEY'",
+        [table],
+    ).fetchone()
+    return row[0] if row else None
+
+
+def referencing_tables(con, table: str) -> list[str]:
+    rows = con.execute(
+        "SELECT DISTINCT table_name FROM duckdb_constraints() "
+        "WHERE constraint_type = 'FOREIGN KEY' AND referenced_table = ?",
+        [table],
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def existing_tables(con) -> set[str]:
+    rows = con.execute(
+        "SELECT table_name FROM duckdb_tables() WHERE NOT temporary"
+    ).fetchall()
+    return {r[0] for r in rows}
+
+
+def load_table(con, table: str, path: Path) -> list[str]:
+    """Create a table from a Parquet file with the keys its data satisfies.
+
+    Returns notes on keys that were left out.
+    """
+    source = f"read_parquet({sql_list([path])})"
+    columns = con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()
+    names = {c[0] for c in columns}
+    spec = TABLES.get(table, {})
+    notes = []
+    constraints = []
+
+    key = spec.get("key")
+    if key and set(key) <= names:
+        cols = ", ".join(ident(c) for c in key)
+        nulls = " OR ".join(f"{ident(c)} IS NULL" for c in key)
+        missing, dupes = con.execute(
+            f"SELECT count(*) FILTER ({nulls}), count(*) - count(DISTINCT ({cols})) "
+            f"FROM {source}"
+        ).fetchone()
+        if missing or dupes:
+            notes.append(
+                f"{'+'.join(key)} has {dupes} duplicate and {missing} empty keys; "
+                "loaded without PRIMARY KEY"
+            )
+        else:
+            constraints.append(f"PRIMARY KEY ({cols})")
+
+    for column, parent in spec.get("refs", {}).items():
+        parent_key = primary_key(con, parent)
+        if column not in names or not parent_key or len(parent_key) != 1:
+            continue
+        orphans = con.execute(
+            f"SELECT count(DISTINCT {ident(column)}) FROM {source} t "
+            f"WHERE {ident(column)} IS NOT NULL AND NOT EXISTS ("
+            f"SELECT 1 FROM {ident(parent)} p "
+            f"WHERE p.{ident(parent_key[0])} = t.{ident(column)})"
+        ).fetchone()[0]
+        if orphans:
+            notes.append(
+                f"{column}: {orphans} values missing from {parent}; "
+                "loaded without FOREIGN KEY"
+            )
+        else:
+            constraints.append(
+                f"FOREIGN KEY ({ident(column)}) "
+                f"REFERENCES {ident(parent)} ({ident(parent_key[0])})"
+            )
+
+    body = [f"{ident(name)} {dtype}" for name, dtype, *_ in columns] + constraints
+    con.execute(f"CREATE TABLE {ident(table)} ({', '.join(body)})")
+    con.execute(f"INSERT INTO {ident(table)} SELECT * FROM {source}")
+    for column in spec.get("index", []):
+        if column in names:
+            con.execute(
+                f"CREATE INDEX {ident(f'idx_{table}_{column}')} "
+                f"ON {ident(table)} ({ident(column)})"
+            )
+    return notes
+
+
+def stage_deltas(con, table: str, deltas: list[Path], key: list[str]) -> int:
+    """Collapse delta files into _delta, keeping each key's latest change."""
+    keys = ", ".join(ident(c) for c in key)
+    con.execute(f"""
+        CREATE OR REPLACE TEMP TABLE _delta AS
+        SELECT * EXCLUDE (filename, _rn) FROM (
+            SELECT *, row_number() OVER (PARTITION BY {keys} ORDER BY filename DESC) AS _rn
+            FROM read_parquet({sql_list(deltas)}, filename = true, union_by_name = true)
+        ) WHERE _rn = 1""")
+    return con.execute("SELECT count(*) FROM _delta").fetchone()[0]
+
+
+def deltas_usable(con, deltas: list[Path], key: list[str] | None) -> bool:
+    """True when every delta row can be matched by primary key.
+
+    Only deltas captured with --key set to the table's single-column primary
+    key qualify. Matched by record number, an update can change the key
+    (the old row would survive the upsert) and one file can hold a delete
+    and an insert for the same key; a packed-away delete has no key at all.
+    """
+    if not key or len(key) != 1:
+        return False
+    for delta in deltas:
+        captured = (pq.read_schema(delta).metadata or {}).get(DELTA_KEY_META, b"")
+        if captured.decode().upper() != key[0].upper():
+            return False
+    names = {
+        c[0]
+        for c in con.execute(
+            f"DESCRIBE SELECT * FROM read_parquet({sql_list(deltas)}, union_by_name = true)"
+        ).fetchall()
+    }
+    if not set(key) <= names:
+        return False
+    nulls = " OR ".join(f"{ident(c)} IS NULL" for c in key)
+    return not con.execute(
+        f"SELECT count(*) FROM read_parquet({sql_list(deltas)}, union_by_name = true) "
+        f"WHERE {nulls}"
+    ).fetchone()[0]
+
+
+def note_affected(con, table: str, key: list[str], summaries: list[str]) -> None:
+    """Record the summary groups the staged delta touches, old and new values."""
+    for name in summaries:
+        expr = SUMMARIES[name]["sources"][table]
+        target = ident(f"_affected_{name}")
+        old = (
+            f"SELECT {expr} AS g FROM {ident(table)} "
+            f"SEMI JOIN _delta USING ({', '.join(ident(c) for c in key)})"
+        )
+        new = f"SELECT {expr} AS g FROM _delta WHERE _op <> 'D'"
+        con.execute(f"CREATE TEMP TABLE IF NOT EXISTS {target} AS {old} LIMIT 0")
+        con.execute(f"INSERT INTO {target} {old} UNION {new}")
+
+
+def apply_upserts(con, table: str, key: list[str]) -> None:
+    match = " AND ".join(f"t.{ident(c)} = d.{ident(c)}" for c in key)
+    columns = [
+        r[0]
+        for r in con.execute(f"DESCRIBE {ident(table)}").fetchall()
+        if r[0] not in key
+    ]
+    if columns:
+        assign = ", ".join(f"{ident(c)} = d.{ident(c)}" for c in columns)
+        con.execute(
+            f"UPDATE {ident(table)} t SET {assign} FROM _delta d "
+            f"WHERE d._op <> 'D' AND {match}"
+        )
+    con.execute(
+        f"INSERT INTO {ident(table)} BY NAME "
+        f"SELECT * EXCLUDE (_op, _RECNO) FROM _delta d WHERE d._op <> 'D' "
+        f"AND NOT EXISTS (SELECT 1 FROM {ident(table)} t WHERE {match})"
+    )
+    # Deletes wait until the tables referencing this one are up to date
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE {ident(f'_deletes_{table}')} AS "
+        f"SELECT {', '.join(ident(c) for c in key)} FROM _delta WHERE _op = 'D'"
+    )
+
+
+def apply_deletes(con, table: str, key: list[str]) -> None:
+    pending = ident(f"_deletes_{table}")
+    match = " AND ".join(f"t.{ident(c)} = d.{ident(c)}" for c in key)
+    try:
+        con.execute(f"DELETE FROM {ident(table)} t USING {pending} d WHERE {match}")
+    except duckdb.ConstraintException as e:
+        raise RuntimeError(
+            f"{table}: deleted rows are still referenced ({e}); "
+            "fix the referencing table or run with --rebuild"
+        ) from e
+    con.execute(f"DROP TABLE {pending}")
+
+
+def refresh_summary(con, name: str, full: bool) -> str:
+    spec = SUMMARIES[name]
+    if full:
+        con.execute(
+            f"CREATE OR REPLACE TABLE {ident(name)} AS "
+            + spec["sql"].format(filter="TRUE")
+        )
+        return "rebuilt"
+
+    affected = ident(f"_affected_{name}")
+    if not con.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE table_name = ?",
+        [f"_affected_{name}"],
+    ).fetchone()[0]:
+        return "unchanged"
+    # IS NOT DISTINCT FROM so a NULL group (e.g. no DUEDATE) is refreshed too
+    group = ident(spec["group"])
+    count = con.execute(f"SELECT count(DISTINCT g) FROM {affected}").fetchone()[0]
+    con.execute(
+        f"DELETE FROM {ident(name)} s WHERE EXISTS ("
+        f"SELECT 1 FROM {affected} x WHERE x.g IS NOT DISTINCT FROM s.{group})"
+    )
+    in_affected = (
+        f"EXISTS (SELECT 1 FROM {affected} x "
+        f"WHERE x.g IS NOT DISTINCT FROM {spec['filter']})"
+    )
+    con.execute(
+        f"INSERT INTO {ident(name)} BY NAME " + spec["sql"].format(filter=in_affected)
+    )
+    con.execute(f"DROP TABLE {affected}")
+    return f"{count} groups refreshed"
+
+
+def build(parquet_dir: Path, db_path: Path, rebuild: bool = False) -> None:
+    paths = {p.stem: p for p in sorted(parquet_dir.glob("*.parquet"))}
+    if not paths:
+        raise RuntimeError(f"No .parquet files in {parquet_dir}")
+
+    con = duckdb.connect(str(db_path))
+    con.execute(SOURCES_DDL)
+    loaded = {
+        row[0]: row[1:]
+        for row in con.execute(
+            "SELECT table_name, fingerprint, deltas_through FROM _sources"
+        ).fetchall()
+    }
+    present = existing_tables(con)
+    order = table_order(list(paths))
+
+    # Decide per table: skip, patch from deltas, or reload from Parquet
+    plan = {}
+    for table in order:
+        path = paths[table]
+        current = fingerprint(path)
+        deltas = sorted((parquet_dir / f"{table}.deltas").glob("*.parquet"))
+        previous = loaded.get(table) if table in present and not rebuild else None
+        if previous is None:
+            plan[table] = "load"
+            continue
+        old_fingerprint, through = previous
+        new_deltas = [d for d in deltas if not through or d.name > through]
+        is_snapshot = current.startswith("state:")
+        if new_deltas and (current == old_fingerprint or is_snapshot):
+            if deltas_usable(con, new_deltas, primary_key(con, table)):
+                plan[table] = "patch"
+            else:
+                plan[table] = "load"
+        elif current != old_fingerprint:
+            plan[table] = "load"
+
+    # DuckDB can't drop a table that others reference: reload those as well
+    queue = [t for t, action in plan.items() if action == "load"]
+    while queue:
+        parent = queue.pop()
+        for child in referencing_tables(con, parent):
+            if child not in paths:
+                raise RuntimeError(
+                    f"{child} references {parent} but {child}.parquet is gone; "
+                    f"restore it or delete {db_path}"
+                )
+            if plan.get(child) != "load":
+                plan[child] = "load"
+                queue.append(child)
+
+    reloaded = {t for t, action in plan.items() if action == "load"}
+    summaries = [
+        name for name, spec in SUMMARIES.items() if set(spec["sources"]) <= set(paths)
+    ]
+    if not plan and all(name in present for name in summaries):
+        print(f"{db_path}: up to date")
+        con.close()
+        return
+
+    con.execute("BEGIN")
+    try:
+        for table in reversed(order):
+            if table in reloaded and table in present:
+                con.execute(f"DROP TABLE {ident(table)}")
+
+        patched = []
+        done = []
+        for table in order:
+            action = plan.get(table)
+            path = paths[table]
+            deltas = sorted((parquet_dir / f"{table}.deltas").glob("*.parquet"))
+            through = loaded.get(table, (None, None))[1]
+            if action == "load":
+                for note in load_table(con, table, path):
+                    print(f"  ! {table}: {note}")
+                # Deltas written after the Parquet file are not in it yet
+                mtime = path.stat().st_mtime_ns
+                pending = [d for d in deltas if d.stat().st_mtime_ns > mtime]
+                key = primary_key(con, table)
+                if pending and not deltas_usable(con, pending, key):
+                    print(
+                        f"  ! {table}: {len(pending)} delta(s) newer than "
+                        f"{path.name} can't be applied by key; convert with "
+                        "--changes --snapshot to keep it current"
+                    )
+                    pending = []
+            elif action == "patch":
+                key = primary_key(con, table)
+                pending = [d for d in deltas if not through or d.name > through]
+            else:
+                continue
+
+            if pending:
+                changes = stage_deltas(con, table, pending, key)
+                note_affected(
+                    con,
+                    table,
+                    key,
+                    [
+                        name
+                        for name in summaries
+                        if table in SUMMARIES[name]["sources"]
+                        and not reloaded & set(SUMMARIES[name]["sources"])
+                    ],
+                )
+                apply_upserts(con, table, key)
+                patched.append((table, key))
+                detail = f"{changes} changed keys from {len(pending)} delta(s)"
+            else:
+                detail = "loaded"
+            done.append((table, path, deltas, detail))
+
+        for table, key in reversed(patched):
+            apply_deletes(con, table, key)
+
+        for table, path, deltas, detail in done:
+            rows = con.execute(f"SELECT count(*) FROM {ident(table)}").fetchone()[0]
+            con.execute(
+                "INSERT OR REPLACE INTO _sources VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    table,
+                    str(path),
+                    fingerprint(path),
+                    deltas[-1].name if deltas else None,
+                    rows,
+                    datetime.now(),
+                ],
+            )
+            print(f"✓ {table} ← {path.name} ({rows} rows, {detail})")
+
+        for name in summaries:
+            full = name not in present or bool(
+                reloaded & set(SUMMARIES[name]["sources"])
+            )
+            status = refresh_summary(con, name, full)
+            if status != "unchanged":
+                print(f"✓ {name} ({status})")
+        if "ar_open_by_due" in summaries:
+            con.execute(AGING_VIEW)
+        con.execute("COMMIT")
+    except Exception:
+        con.execute("ROLLBACK")
+        raise
+    finally:
+        con.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load Parquet tables into DuckDB with keys and rollup tables"
+    )
+    parser.add_argument("parquet_dir", help="Directory of converted .parquet tables")
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="DuckDB database file (default: <parquet_dir>/accounting.duckdb)",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Reload every table and summary instead of only what changed",
+    )
+    args = parser.parse_args()
+
+    parquet_dir = Path(args.parquet_dir)
+    if not parquet_dir.is_dir():
+        print(f"Error: {parquet_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+    db_path = Path(args.output) if args.output else parquet_dir / "accounting.duckdb"
+
+    try:
+        build(parquet_dir, db_path, args.rebuild)
+    except (RuntimeError, duckdb.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+"""Keyed lookups on DBF tables through their FoxPro .CDX/.IDX or dBase .NDX index.
+
+Instead of scanning the table, the index B-tree is descended to the matching
+keys and only those records are read, so point and range queries on huge
+tables touch a handful of 512-byte pages.
+
+Usage:
+    uv run python dbf_index.py ARMST.DBF --tags
+    uv run python dbf_index.py ARMST.DBF ACCID=C0001
+    uv run python dbf_index.py ARTR.DBF DOCNO=IV5401 --prefix
+    uv run python dbf_index.py ARTR.DBF --tag DATEDOC --from 2011-01-01 --to 2011-01-31
+    uv run python dbf_index.py GLTR.DBF GLID=1100 --index GLTR.CDX --json
+
+The index defaults to the production index next to the table (same name,
+.CDX). Keys are built from the tag's expression (FIELD, UPPER(FIELD),
+DTOS(FIELD) and + concatenations) and encoded in the table's code page
+(TIS-620), matching FoxPro's MACHINE collation, which orders raw code page
+bytes. Tags built under another collation (e.g. SET COLLATE TO "THAI") store
+sort weights instead of text; those lookups fall back to a vectorized scan.
+dBase IV .MDX files are not supported.
+"""
+
+import argparse
+import json
+import re
+import struct
+import sys
+from collections.abc import Generator, Iterator
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from dbf_raw import DBFHeader, RawField, decode_records, read_header, read_records
+
+PAGE_SIZE = 512
+# Julian day number of date.fromordinal(1) minus one
+JULIAN_OFFSET = 1721425
+# Compact index header options
+CDX_UNIQUE = 0x01
+CDX_FOR = 0x08
+# Node attribute bit of leaf pages
+NODE_LEAF = 0x02
+TERM_RE = re.compile(
+    r"^(?:(UPPER|DTOS|STR)\()?\s*(\w+)\s*(?:,\s*(\d+)\s*)?(?:,\s*\d+\s*)?\)?$",
+    re.IGNORECASE,
+)
+MACHINE_COLLATIONS = {"", "MACHINE"}
+
+
+@dataclass
+class KeyTerm:
+    """One field of a key expression such as UPPER(ACCID) or DTOS(DATEDOC)."""
+
+    function: str
+    field: RawField
+    width: int
+
+
+@dataclass
+class IndexTag:
+    """One B-tree: a tag of a compound .CDX, or a whole .IDX/.NDX file."""
+
+    path: Path
+    name: str
+    kind: str  # "cdx" or "ndx"
+    root: int
+    key_len: int
+    expression: str
+    for_expression: str = ""
+    unique: bool = False
+    descending: bool = False
+    collation: str = ""
+    numeric: bool = False  # NDX keys that are IEEE doubles
+    group_len: int = 0  # NDX bytes per node entry
+    terms: list[KeyTerm] = field(default_factory=list)
+
+    @property
+    def searchable(self) -> bool:
+        """Whether stored keys are raw code page bytes we can build ourselves.
+
+        Descending tags store their pages in reverse key order, which walk()
+        does not follow, so they are scanned instead.
+        """
+        return (
+            self.collation.upper() in MACHINE_COLLATIONS
+            and bool(self.terms)
+            and not self.descending
+        )
+
+    def pad_byte(self) -> bytes:
+        binary = (
+            len(self.terms) == 1
+            and self.terms[0].function == ""
+            and (self.terms[0].field.type in "NFDIBTY")
+        )
+        return b"\0" if binary else b" "
+
+
+def read_page(f, offset: int) -> bytes:
+    f.seek(offset)
+    return f.read(PAGE_SIZE)
+
+
+# --- FoxPro compact index (.IDX, and each tag of a .CDX) ---------------------
+
+
+def cdx_tag(f, path: Path, name: str, offset: int) -> IndexTag:
+    """Parse the 1024-byte compact index header at offset."""
+    f.seek(offset)
+    head = f.read(2 * PAGE_SIZE)
+    root, key_len, options = struct.unpack_from("<IxxxxxxxxHB", head)
+    collation = head[118:126].split(b"\0", 1)[0].decode("ascii", errors="replace")
+    descending, for_pos, for_len, key_pos, key_len_expr = struct.unpack_from(
+        "<HHHHH", head, 502
+    )
+    pool = head[PAGE_SIZE:]
+    expression = pool[key_pos : key_pos + key_len_expr]
+    # The FOR expression follows the key expression unless placed explicitly
+    for_pos = for_pos or key_pos + key_len_expr
+    for_expression = pool[for_pos : for_pos + for_len] if options & CDX_FOR else b""
+    return IndexTag(
+        path,
+        name,
+        "cdx",
+        root,
+        key_len,
+        expression.split(b"\0", 1)[0].decode("latin-1").strip(),
+        for_expression.split(b"\0", 1)[0].decode("latin-1").strip(),
+        bool(options & CDX_UNIQUE),
+        bool(descending),
+        collation.strip(),
+    )
+
+
+def cdx_entries(
+    page: bytes, key_len: int, pad: bytes
+) -> tuple[int, list[tuple[bytes, int, int]]]:
+    """Decode a compact index node into (attributes, [(key, recno, child)]).
+
+    Interior entries hold the full key, then a big-endian record number and
+    child page offset. Leaf entries are bit-packed (record number, duplicate
+    count, trailing count) integers from byte 24 on, while the key suffixes
+    are stored back to front from the end of the page: each key repeats `dup`
+    bytes of the previous key and drops `trail` pad bytes.
+    """
+    attributes, count = struct.unpack_from("<HH", page)
+    entries = []
+    if not attributes & NODE_LEAF:
+        step = key_len + 8
+        for i in range(count):
+            pos = 12 + i * step
+            recno, child = struct.unpack_from(">II", page, pos + key_len)
+            entries.append((page[pos : pos + key_len], recno, child))
+        return attributes, entries
+
+    rec_mask, dup_mask, trail_mask, rec_bits, dup_bits, _, entry_len = (
+        struct.unpack_from("<IBBBBBB", page, 14)
+    )
+    key = b""
+    key_end = PAGE_SIZE
+    for i in range(count):
+        pos = 24 + i * entry_len
+        packed = int.from_bytes(page[pos : pos + entry_len], "little")
+        recno = packed & rec_mask
+        dup = (packed >> rec_bits) & dup_mask
+        trail = (packed >> (rec_bits + dup_bits)) & trail_mask
+        size = key_len - dup - trail
+        key_end -= size
+        key = key[:dup] + page[key_end : key_end + size] + pad * trail
+        entries.append((key, recno, 0))
+    return attributes, entries
+
+
+def cdx_tags(path: Path) -> dict[str, IndexTag]:
+    """All tags of a .CDX (via its tag directory) or the single tag of an .IDX."""
+    with open(path, "rb") as f:
+        directory = cdx_tag(f, path, path.stem.upper(), 0)
+        if path.suffix.lower() == ".idx":
+            return {directory.name: directory}
+        # The directory is itself a compact index keyed by tag name, whose
+        # "record numbers" are the offsets of each tag's header
+        tags = {}
+        for key, offset in walk(directory, f, None, None):
+            name = key.rstrip(b"\0 ").decode("latin-1")
+            tags[name] = cdx_tag(f, path, name, offset)
+        return tags
+
+
+# --- dBase III .NDX ----------------------------------------------------------
+
+
+def ndx_tag(path: Path) -> IndexTag:
+    with open(path, "rb") as f:
+        head = f.read(PAGE_SIZE)
+    root, key_len, key_type, group_len, unique = struct.unpack_from(
+        "<I8xH2xHH2xB", head
+    )
+    expression = head[24:].split(b"\0", 1)[0].decode("latin-1")
+    return IndexTag(
+        path,
+        path.stem.upper(),
+        "ndx",
+        root * PAGE_SIZE,
+        key_len,
+        expression.strip(),
+        unique=bool(unique),
+        numeric=key_type == 1,
+        group_len=group_len,
+    )
+
+
+def ndx_entries(page: bytes, tag: IndexTag) -> tuple[int, list[tuple[bytes, int, int]]]:
+    """Decode an NDX node: [child page, record number, key] groups.
+
+    Interior nodes carry one more child pointer than keys; it is returned as
+    a final entry with an empty key.
+    """
+    (count,) = struct.unpack_from("<I", page)
+    entries = []
+    leaf = True
+    for i in range(count + 1):
+        pos = 4 + i * tag.group_len
+        if pos + 8 > len(page):
+            break
+        child, recno = struct.unpack_from("<II", page, pos)
+        if i == count:
+            if child:
+                entries.append((b"", 0, child * PAGE_SIZE))
+                leaf = False
+            break
+        if child:
+            leaf = False
+        entries.append(
+            (page[pos + 8 : pos + 8 + tag.key_len], recno, child * PAGE_SIZE)
+        )
+    return (NODE_LEAF if leaf else 0), entries
+
+
+# --- Search ------------------------------------------------------------------
+
+
+def comparable(tag: IndexTag, key: bytes):
+    """Stored or search key in a form whose Python ordering is the index order."""
+    if tag.numeric:
+        return struct.unpack("<d", key[:8])[0] if key else float("inf")
+    return key
+
+
+def walk(
+    tag: IndexTag, f, lo: bytes | None, hi: bytes | None, prefix: bool = False
+) -> Iterator[tuple[bytes, int]]:
+    """Yield (key, recno) in index order for lo <= key <= hi.
+
+    With prefix set, hi matches every key that starts with it. Interior keys
+    are the largest key of their subtree, so children entirely below lo are
+    skipped and the walk stops at the first key past hi.
+    """
+    pad = tag.pad_byte()
+    low = comparable(tag, lo) if lo is not None else None
+    high = comparable(tag, hi) if hi is not None else None
+
+    def past_hi(key: bytes) -> bool:
+        if high is None:
+            return False
+        if prefix:
+            return key[: len(hi)] > hi
+        return comparable(tag, key) > high
+
+    def visit(offset: int) -> Generator[tuple[bytes, int], None, bool]:
+        page = read_page(f, offset)
+        if tag.kind == "cdx":
+            attributes, entries = cdx_entries(page, tag.key_len, pad)
+        else:
+            attributes, entries = ndx_entries(page, tag)
+        for key, recno, child in entries:
+            last = key == b"" and tag.kind == "ndx"
+            if attributes & NODE_LEAF:
+                if low is not None and comparable(tag, key) < low:
+                    continue
+                if past_hi(key):
+                    return False
+                yield key, recno
+            else:
+                if not last and low is not None and comparable(tag, key) < low:
+                    continue
+                if (yield from visit(child)) is False:
+                    return False
+                if not last and past_hi(key):
+                    return False
+        return True
+
+    yield from visit(tag.root)
+
+
+# --- Keys --------------------------------------------------------------------
+
+
+def parse_terms(expression: str, header: DBFHeader) -> list[KeyTerm]:
+    """Split FIELD+UPPER(FIELD)+DTOS(FIELD) into terms; [] if unsupported."""
+    fields = {f.name.upper(): f for f in header.fields}
+    terms = []
+    for part in expression.split("+"):
+        match = TERM_RE.match(part.strip())
+        if not match or match[2].upper() not in fields:
+            return []
+        raw = fields[match[2].upper()]
+        function = (match[1] or "").upper()
+        width = (
+            int(match[3])
+            if function == "STR" and match[3]
+            else (8 if function == "DTOS" else raw.length)
+        )
+        terms.append(KeyTerm(function, raw, width))
+    return terms
+
+
+def encode_key(
+    tag: IndexTag, values: list[str], encoding: str, pad_last: bool = True
+) -> bytes:
+    """Search key bytes for values of the tag's leading terms.
+
+    Character keys are the code page bytes of each term padded to its width;
+    the last term stays unpadded unless pad_last is set (prefix searches).
+    Single numeric or date terms use the index's binary number format.
+    """
+    if len(tag.terms) == 1 and tag.pad_byte() == b"\0":
+        raw = tag.terms[0].field
+        value = values[0]
+        if raw.type == "D":
+            number = float(date.fromisoformat(value).toordinal() + JULIAN_OFFSET)
+        else:
+            number = float(value)
+        if tag.kind == "ndx":
+            return struct.pack("<d", number)
+        # FoxPro: big-endian double, sign bit flipped (positive) or all bits
+        # inverted (negative), so byte order equals numeric order
+        packed = bytearray(struct.pack(">d", number))
+        if number >= 0:
+            packed[0] ^= 0x80
+        else:
+            packed = bytearray(b ^ 0xFF for b in packed)
+        return bytes(packed)[: tag.key_len]
+
+    key = b""
+    for n, (term, value) in enumerate(zip(tag.terms, values)):
+        if term.function == "DTOS":
+            value = value.replace("-", "")
+        elif term.function == "STR":
+            value = value.rjust(term.width)
+        elif term.function == "UPPER":
+            value = value.upper()
+        data = value.encode(encoding)[: term.width]
+        if pad_last or n < len(values) - 1:
+            data = data.ljust(term.width, b" ")
+        key += data
+    return key[: tag.key_len]
+
+
+# --- Lookups -----------------------------------------------------------------
+
+
+def find_index(dbf_path: Path) -> Path | None:
+    """The production index next to a table: same stem, .CDX in any case."""
+    for candidate in dbf_path.parent.iterdir():
+        if (
+            candidate.stem.upper() == dbf_path.stem.upper()
+            and candidate.suffix.lower() == ".cdx"
+        ):
+            return candidate
+    return None
+
+
+def open_index(index_path: Path, header: DBFHeader) -> dict[str, IndexTag]:
+    suffix = index_path.suffix.lower()
+    if suffix in (".cdx", ".idx"):
+        tags = cdx_tags(index_path)
+    elif suffix == ".ndx":
+        tags = {index_path.stem.upper(): ndx_tag(index_path)}
+    else:
+        raise ValueError(
+            f"Unsupported index format: {index_path.name} (use .CDX, .IDX or .NDX)"
+        )
+    for tag in tags.values():
+        tag.terms = parse_terms(tag.expression, header)
+    return tags
+
+
+def pick_tag(tags: dict[str, IndexTag], name: str) -> IndexTag:
+    """A tag by name, else a tag whose expression starts with that field.
+
+    Among tags on the field, one without UNIQUE or FOR is preferred: those
+    index only the first record of each key, or only the records passing the
+    filter, so a lookup through them can miss matching rows.
+    """
+    name = name.upper()
+    if name in tags:
+        tag = tags[name]
+    else:
+        candidates = [
+            tag
+            for tag in tags.values()
+            if tag.terms and tag.terms[0].field.name.upper() == name
+        ]
+        if not candidates:
+            raise ValueError(
+                f"No index tag on {name}; available: {', '.join(tags) or 'none'}"
+            )
+        complete = [t for t in candidates if not t.unique and not t.for_expression]
+        tag = (complete or candidates)[0]
+    if tag.unique or tag.for_expression:
+        reason = f"FOR {tag.for_expression}" if tag.for_expression else "UNIQUE"
+        print(
+            f"Tag {tag.name} is {reason}: it may not list every matching record",
+            file=sys.stderr,
+        )
+    return tag
+
+
+def scan(
+    dbf_path: Path,
+    header: DBFHeader,
+    tag: IndexTag,
+    lo: list[str] | None,
+    hi: list[str] | None,
+    prefix: bool,
+    encoding: str,
+) -> pa.Table:
+    """Filter the whole table on the tag's key terms (no usable B-tree).
+
+    Bounds compare term by term, like the concatenated key: (a, b) >= lo
+    when a > lo[0], or a == lo[0] and b >= lo[1].
+    """
+    if not tag.terms:
+        raise ValueError(f"Cannot evaluate tag expression {tag.expression!r}")
+    table = decode_records(dbf_path, header, encoding=encoding)
+    columns = []
+    for term in tag.terms:
+        values = table[term.field.name]
+        if pa.types.is_string(values.type) and term.function == "UPPER":
+            values = pc.utf8_upper(values)
+        columns.append(values)
+
+    def typed(values, term: KeyTerm, value: str):
+        if pa.types.is_date(values.type):
+            return pa.scalar(date.fromisoformat(value))
+        if term.function == "UPPER":
+            value = value.upper()
+        return pa.scalar(value).cast(values.type)
+
+    def bound(bounds: list[str], strict, last) -> pa.ChunkedArray:
+        terms = list(zip(tag.terms, columns, bounds))
+        term, values, value = terms[-1]
+        mask = last(values, typed(values, term, value))
+        for term, values, value in reversed(terms[:-1]):
+            scalar = typed(values, term, value)
+            mask = pc.or_(
+                strict(values, scalar), pc.and_(pc.equal(values, scalar), mask)
+            )
+        return mask
+
+    mask = pa.array([True] * len(table))
+    if prefix and lo:
+        terms = list(zip(tag.terms, columns, lo))
+        for n, (term, values, value) in enumerate(terms):
+            scalar = typed(values, term, value)
+            if n == len(terms) - 1 and pa.types.is_string(values.type):
+                mask = pc.and_(mask, pc.starts_with(values, scalar.as_py()))
+            else:
+                mask = pc.and_(mask, pc.equal(values, scalar))
+    else:
+        if lo:
+            mask = pc.and_(mask, bound(lo, pc.greater, pc.greater_equal))
+        if hi:
+            mask = pc.and_(mask, bound(hi, pc.less, pc.less_equal))
+    return table.filter(mask)
+
+
+def lookup(
+    dbf_path: Path,
+    tag_name: str,
+    lo: list[str] | None = None,
+    hi: list[str] | None = None,
+    prefix: bool = False,
+    index_path: Path | None = None,
+    encoding: str = "tis-620",
+    limit: int | None = None,
+) -> pa.Table:
+    """Records whose tag key lies in [lo, hi] (or starts with lo if prefix).
+
+    lo/hi hold one value per leading term of the tag's expression; for an
+    exact match pass the same values as both.
+    """
+    header = read_header(dbf_path, encoding)
+    index_path = index_path or find_index(dbf_path)
+    if index_path is None:
+        raise FileNotFoundError(f"No .CDX index next to {dbf_path}; pass --index")
+    tag = pick_tag(open_index(index_path, header), tag_name)
+
+    if not tag.searchable:
+        print(
+            f"Tag {tag.name} ({tag.expression}, collation {tag.collation or '?'}"
+            f"{', descending' if tag.descending else ''}) "
+            "cannot be searched directly; scanning the table",
+            file=sys.stderr,
+        )
+        table = scan(dbf_path, header, tag, lo, hi, prefix, encoding)
+        return table.slice(0, limit) if limit else table
+
+    if prefix:
+        lo_key = hi_key = encode_key(tag, lo, encoding, pad_last=False)
+    else:
+        lo_key = encode_key(tag, lo, encoding) if lo else None
+        hi_key = encode_key(tag, hi, encoding) if hi else None
+        if hi_key is not None and len(hi) < len(tag.terms):
+            # Values for the leading terms only: include every continuation
+            hi_key = hi_key.ljust(tag.key_len, b"\xff")
+
+    recnos = []
+    with open(tag.path, "rb") as f:
+        for _, recno in walk(tag, f, lo_key, hi_key, prefix):
+            recnos.append(recno)
+            if limit and len(recnos) >= limit:
+                break
+    return read_records(dbf_path, header, recnos, encoding)
+
+
+def print_tags(tags: dict[str, IndexTag]) -> None:
+    for tag in tags.values():
+        flags = [
+            flag
+            for flag, on in (
+                ("unique", tag.unique),
+                ("descending", tag.descending),
+                ("no direct search", not tag.searchable),
+            )
+            if on
+        ]
+        line = f"  {tag.name:12} {tag.expression:30} key={tag.key_len}"
+        if tag.collation:
+            line += f" collate={tag.collation}"
+        if tag.for_expression:
+            line += f" FOR {tag.for_expression}"
+        if flags:
+            line += f" ({', '.join(flags)})"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexed lookups on DBF tables")
+    parser.add_argument("file", help="DBF table")
+    parser.add_argument(
+        "query",
+        nargs="?",
+        help="TAG=VALUE for an exact match; VALUE may be A|B for compound keys",
+    )
+    parser.add_argument("--index", help="Index file (default: <table>.CDX)")
+    parser.add_argument("--tags", action="store_true", help="List index tags and exit")
+    parser.add_argument("--tag", help="Tag (or leading field) for --from/--to")
+    parser.add_argument("--from", dest="lo", help="Range start (inclusive)")
+    parser.add_argument("--to", dest="hi", help="Range end (inclusive)")
+    parser.add_argument(
+        "--prefix", action="store_true", help="Match keys starting with VALUE"
+    )
+    parser.add_argument("--limit", type=int, help="Stop after this many index entries")
+    parser.add_argument("--json", action="store_true", help="Output JSON lines")
+    parser.add_argument(
+        "--encoding", default="tis-620", help="Character encoding (default: tis-620)"
+    )
+    args = parser.parse_args()
+
+    dbf_path = Path(args.file)
+    index_path = Path(args.index) if args.index else None
+    try:
+        if args.tags:
+            header = read_header(dbf_path, args.encoding)
+            index_path = index_path or find_index(dbf_path)
+            if index_path is None:
+                raise FileNotFoundError(f"No .CDX index next to {dbf_path}")
+            print(f"{index_path.name}:")
+            print_tags(open_index(index_path, header))
+            return
+
+        if args.query:
+            tag_name, sep, value = args.query.partition("=")
+            if not sep:
+                parser.error("query must look like TAG=VALUE")
+            lo = hi = value.split("|")
+        elif args.tag and (args.lo or args.hi):
+            tag_name = args.tag
+            lo = args.lo.split("|") if args.lo else None
+            hi = args.hi.split("|") if args.hi else None
+        else:
+            parser.error("give TAG=VALUE, or --tag with --from/--to")
+
+        table = lookup(
+            dbf_path,
+            tag_name,
+            lo,
+            None if args.prefix else hi,
+            args.prefix,
+            index_path,
+            args.encoding,
+            args.limit,
+        )
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    for row in table.to_pylist():
+        if args.json:
+            print(json.dumps(row, ensure_ascii=False, default=str))
+        else:
+            print(", ".join(f"{k}={v!r}" for k, v in row.items()))
+    print(f"{table.num_rows} record(s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""Vectorized decoding of fixed-width DBF records straight into Arrow.
+
+DBF records are fixed-width: record i starts at header_len + i * record_len,
+so any range of records can be decoded on its own. This is what lets
+dbf_to_parquet.py split one huge table across worker processes.
+
+Only plain field types (C, N, F, D, L) are handled; use roonpoo for tables
+with memo or binary fields (see supports_raw).
+
+Usage:
+    uv run python dbf_raw.py file.DBF              # header and fields
+    uv run python dbf_raw.py file.DBF --head 5     # decode the first records
+"""
+
+import argparse
+import os
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+RAW_TYPES = {"C", "N", "F", "D", "L"}
+DELETED = ord("*")
+TRUE_CHARS = np.frombuffer(b"TtYy", dtype=np.uint8)
+FALSE_CHARS = np.frombuffer(b"FfNn", dtype=np.uint8)
+# Widest N(x, 0) field that always fits in int64
+MAX_INT_DIGITS = 18
+
+
+@dataclass
+class RawField:
+    name: str
+    type: str
+    offset: int
+    length: int
+    decimal_count: int
+
+
+@dataclass
+class DBFHeader:
+    version: int
+    numrecords: int
+    header_len: int
+    record_len: int
+    fields: list[RawField]
+
+
+def read_header(dbf_path: Path, encoding: str = "tis-620") -> DBFHeader:
+    """Parse the DBF header and field descriptors."""
+    with open(dbf_path, "rb") as f:
+        version, numrecords, header_len, record_len = struct.unpack(
+            "<B3xIHH", f.read(12)
+        )
+        f.seek(32)
+        fields = []
+        offset = 1  # byte 0 of every record is the deletion flag
+        while True:
+            desc = f.read(32)
+            if len(desc) < 32 or desc[0] == 0x0D:
+                break
+            name = desc[:11].split(b"\0", 1)[0].decode(encoding, errors="replace")
+            fields.append(RawField(name, chr(desc[11]), offset, desc[16], desc[17]))
+            offset += desc[16]
+
+        # The header count can be stale after a crash; trust the file size
+        size = f.seek(0, 2)
+    available = max(0, size - header_len) // record_len if record_len else 0
+    return DBFHeader(
+        version, min(numrecords, available), header_len, record_len, fields
+    )
+
+
+def supports_raw(header: DBFHeader) -> bool:
+    """True when every field has a type decode_records understands."""
+    return bool(header.fields) and all(f.type in RAW_TYPES for f in header.fields)
+
+
+def is_single_byte(encoding: str) -> bool:
+    return len(bytes(range(256)).decode(encoding, errors="replace")) == 256
+
+
+def arrow_type(field: RawField) -> pa.DataType:
+    if field.type == "C":
+        return pa.string()
+    if field.type == "D":
+        return pa.date32()
+    if field.type == "L":
+        return pa.bool_()
+    if field.type == "N" and not field.decimal_count and field.length <= MAX_INT_DIGITS:
+        return pa.int64()
+    return pa.float64()
+
+
+def arrow_schema(header: DBFHeader) -> pa.Schema:
+    return pa.schema([(f.name, arrow_type(f)) for f in header.fields])
+
+
+def split_text(block: np.ndarray, length: int, encoding: str, errors: str) -> list[str]:
+    """Decode an (n, length) byte block into n strings, trailing NULs/spaces cut."""
+    if errors == "replace" and is_single_byte(encoding):
+        # One character per byte: decode the whole column in one call
+        text = block.tobytes().decode(encoding, errors="replace")
+        return [text[i : i + length].rstrip("\0 ") for i in range(0, len(text), length)]
+    values = np.ascontiguousarray(block).view(f"S{length}").ravel()
+    return [v.rstrip(b"\0 ").decode(encoding, errors=errors) for v in values]
+
+
+def parse_number(value: str) -> float | None:
+    try:
+        return float(value.replace(",", "."))
+    except ValueError:
+        return None
+
+
+def decode_column(
+    block: np.ndarray, field: RawField, encoding: str, errors: str
+) -> pa.Array:
+    """Decode one field's bytes for every record in the block."""
+    if field.type == "L":
+        flag = block[:, 0]
+        values = np.isin(flag, TRUE_CHARS)
+        known = values | np.isin(flag, FALSE_CHARS)
+        return pa.array(values, mask=~known, type=pa.bool_())
+
+    if field.type == "C":
+        return pa.array(split_text(block, field.length, encoding, errors), pa.string())
+
+    # Numbers and dates are ASCII, which latin-1 maps one to one
+    text = pa.array(split_text(block, field.length, "latin-1", "replace"), pa.string())
+    text = pc.utf8_trim(text, " *\0")
+    text = pc.if_else(pc.equal(text, ""), pa.scalar(None, pa.string()), text)
+    if field.type == "D":
+        stamps = pc.strptime(text, format="%Y%m%d", unit="s", error_is_null=True)
+        return stamps.cast(pa.date32())
+
+    target = arrow_type(field)
+    try:
+        return pc.replace_substring(text, ",", ".").cast(target)
+    except pa.ArrowInvalid:
+        # Garbage in a numeric field: fall back to parsing value by value
+        parsed = [None if v is None else parse_number(v) for v in text.to_pylist()]
+        if target == pa.int64():
+            parsed = [None if v is None else int(v) for v in parsed]
+        return pa.array(parsed, target)
+
+
+def decode_block(
+    records: np.ndarray,
+    fields: list[RawField],
+    encoding: str = "tis-620",
+    errors: str = "replace",
+) -> pa.Table:
+    """Decode an (n, record_len) array of live records into an Arrow table."""
+    columns = [
+        decode_column(records[:, f.offset : f.offset + f.length], f, encoding, errors)
+        for f in fields
+    ]
+    return pa.Table.from_arrays(
+        columns, schema=pa.schema([(f.name, arrow_type(f)) for f in fields])
+    )
+
+
+def decode_records(
+    dbf_path: Path,
+    header: DBFHeader,
+    start: int = 0,
+    stop: int | None = None,
+    encoding: str = "tis-620",
+    errors: str = "replace",
+) -> pa.Table:
+    """Decode records [start, stop) into an Arrow table, skipping deleted ones."""
+    stop = header.numrecords if stop is None else min(stop, header.numrecords)
+    count = max(0, stop - start)
+    with open(dbf_path, "rb") as f:
+        f.seek(header.header_len + start * header.record_len)
+        data = f.read(count * header.record_len)
+    count = len(data) // header.record_len
+    records = np.frombuffer(data, dtype=np.uint8, count=count * header.record_len)
+    records = records.reshape(count, header.record_len)
+    return decode_block(
+        records[records[:, 0] != DELETED], header.fields, encoding, errors
+    )
+
+
+def fetch_records(dbf_path: Path, header: DBFHeader, recnos: list[int]) -> np.ndarray:
+    """Raw (n, record_len) bytes of the given 1-based record numbers."""
+    data = bytearray(len(recnos) * header.record_len)
+    fd = os.open(dbf_path, os.O_RDONLY)
+    try:
+        for i, n in enumerate(recnos):
+            offset = header.header_len + (n - 1) * header.record_len
+            data[i * header.record_len : (i + 1) * header.record_len] = os.pread(
+                fd, header.record_len, offset
+            )
+    finally:
+        os.close(fd)
+    records = np.frombuffer(bytes(data), dtype=np.uint8)
+    return records.reshape(len(recnos), header.record_len)
+
+
+def read_records(
+    dbf_path: Path,
+    header: DBFHeader,
+    recnos: list[int],
+    encoding: str = "tis-620",
+    errors: str = "replace",
+) -> pa.Table:
+    """Decode the given 1-based record numbers, in that order.
+
+    Deleted records are skipped, and so are fields of types this module does
+    not decode. A _RECNO column holds each row's record number.
+    """
+    recnos = [n for n in recnos if 1 <= n <= header.numrecords]
+    records = fetch_records(dbf_path, header, recnos)
+    live = records[:, 0] != DELETED
+    fields = [f for f in header.fields if f.type in RAW_TYPES]
+    table = decode_block(records[live], fields, encoding, errors)
+    return table.add_column(
+        0, "_RECNO", pa.array(np.asarray(recnos, dtype=np.int64)[live])
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode DBF records without roonpoo")
+    parser.add_argument("file", help="DBF file")
+    parser.add_argument(
+        "--head", type=int, default=0, help="Records to decode and show"
+    )
+    parser.add_argument(
+        "--encoding", default="tis-620", help="Character encoding (default: tis-620)"
+    )
+    args = parser.parse_args()
+
+    header = read_header(Path(args.file), args.encoding)
+    print(
+        f"{args.file}: version 0x{header.version:02x}, {header.numrecords} records, "
+        f"header {header.header_len} bytes, record {header.record_len} bytes"
+    )
+    for f in header.fields:
+        print(f"  {f.name:15} {f.type}({f.length},{f.decimal_count}) @ {f.offset}")
+    if not supports_raw(header):
+        print("Unsupported field types; use roonpoo for this table")
+    elif args.head:
+        print(decode_records(Path(args.file), header, 0, args.head, args.encoding))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""Fuzzy name search over converted tables through a character n-gram index.
+
+Thai is written without spaces between words, so neither word splitting nor
+LIKE '%...%' finds "สยามการค้า" in "บริษัทสยามการค้า จำกัด" when the
+user typed a tone mark differently. Text is folded first: lower case,
+ํา -> ำ, Thai digits -> 0-9, tone marks and other marks that are commonly
+mistyped removed, company forms (บริษัท, จำกัด, หจก., Co., Ltd., ...)
+dropped, and everything but letters and digits stripped. The folded text is
+cut into overlapping character trigrams, stored next to the table as
+<stem>.ngrams.parquet: one (gram, row, column) posting per distinct trigram,
+sorted by gram.
+
+A search folds the query the same way, looks up its trigrams with a binary
+search, and ranks rows by the share of the query's trigrams they contain
+(so a typo or a missing character still matches), then by how close the
+name's length is to the query. Only the row groups holding candidates are
+read from the table.
+
+Usage:
+    uv run python dbf_search.py asParquet/ARMST.parquet --build COMP,NAME
+    uv run python dbf_search.py asParquet/ARMST.parquet -q "สยามการค้า"
+    uv run python dbf_search.py DATA*/asParquet/APMST.parquet -q "siam steel" --json
+
+dbf_to_parquet.py --search-index COMP,NAME builds the index at conversion
+time. An index whose table was rewritten since is rebuilt on the next search.
+Queries that fold to fewer than three characters are matched by a scan.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from dbf_changes import save_atomic
+
+NGRAM = 3
+# Bits per code point in a packed gram; Unicode fits in 21
+CODE_BITS = 21
+# Rows folded and cut into grams per step (bounds the UTF-32 scratch array)
+BUILD_CHUNK_ROWS = 100_000
+# Postings per index row group; a lookup reads only groups whose gram range
+# covers a query gram
+INDEX_ROW_GROUP = 1 << 16
+META_SOURCE = b"dbf_search_source"
+META_COLUMNS = b"dbf_search_columns"
+
+# Legal forms, already folded (no tone marks), longest first
+COMPANY_FORMS = [
+    "หางหุนสวนจำกัด",
+    "หางหุนสวนสามัญ",
+    "บริษัท",
+    "มหาชน",
+    "จำกัด",
+    "บจก",
+    "บมจ",
+    "หจก",
+    "หสน",
+]
+LATIN_FORMS = r"\b(company|limited|co|ltd|inc|plc|corp|part)\b"
+# Maitaikhu, the four tone marks, thanthakhat and nikhahit
+THAI_MARKS = r"[\x{0E47}-\x{0E4D}]"
+KEEP = r"[^0-9a-z\x{0E01}-\x{0E3A}\x{0E40}-\x{0E46}]"
+
+
+def fold(values: pa.Array) -> pa.Array:
+    """Normalize names for matching; see the module docstring."""
+    text = pc.utf8_lower(values.cast(pa.string()))
+    text = pc.replace_substring(text, "ํา", "ำ")
+    for digit in range(10):
+        text = pc.replace_substring(text, chr(0x0E50 + digit), str(digit))
+    text = pc.replace_substring_regex(text, THAI_MARKS, "")
+    text = pc.replace_substring_regex(text, "|".join(COMPANY_FORMS), "")
+    text = pc.replace_substring_regex(text, LATIN_FORMS, "")
+    return pc.replace_substring_regex(text, KEEP, "")
+
+
+def code_points(text: list[str]) -> np.ndarray:
+    """(n, longest) uint32 code points, zero padded."""
+    width = max((len(s) for s in text), default=0)
+    return np.array(text, dtype=f"<U{max(width, 1)}").view("<u4").reshape(len(text), -1)
+
+
+def pack_grams(codes: np.ndarray) -> np.ndarray:
+    """(n, width - NGRAM + 1) packed grams; 0 where the window runs past the end."""
+    windows = codes.shape[1] - NGRAM + 1
+    if windows < 1:
+        return np.zeros((len(codes), 0), dtype=np.uint64)
+    grams = np.zeros((len(codes), windows), dtype=np.uint64)
+    for i in range(NGRAM):
+        grams = (grams << np.uint64(CODE_BITS)) | codes[:, i : i + windows].astype(
+            np.uint64
+        )
+    grams[codes[:, NGRAM - 1 :] == 0] = 0
+    return grams
+
+
+def query_grams(query: str) -> tuple[str, np.ndarray]:
+    """The folded query and its distinct packed grams."""
+    folded = fold(pa.array([query]))[0].as_py()
+    grams = pack_grams(code_points([folded]))[0]
+    return folded, np.unique(grams[grams != 0])
+
+
+def index_path(parquet_path: Path) -> Path:
+    return parquet_path.with_name(f"{parquet_path.stem}.ngrams.parquet")
+
+
+def source_id(parquet_path: Path) -> str:
+    stat = parquet_path.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def build_index(parquet_path: Path, columns: list[str]) -> Path:
+    """Write <stem>.ngrams.parquet for the given text columns."""
+    parquet_path = Path(parquet_path)
+    table = pq.read_table(parquet_path, columns=columns)
+    grams, rows, cols, sizes = [], [], [], []
+    for col, name in enumerate(columns):
+        values = table.column(name)
+        for start in range(0, table.num_rows, BUILD_CHUNK_ROWS):
+            text = fold(values.slice(start, BUILD_CHUNK_ROWS).combine_chunks())
+            packed = pack_grams(code_points(text.fill_null("").to_pylist()))
+            # One posting per distinct gram of a name
+            packed.sort(axis=1)
+            packed[:, 1:][packed[:, 1:] == packed[:, :-1]] = 0
+            row, pos = np.nonzero(packed)
+            grams.append(packed[row, pos])
+            rows.append((row + start).astype(np.uint32))
+            cols.append(np.full(len(row), col, dtype=np.uint8))
+            sizes.append(np.count_nonzero(packed, axis=1).astype(np.uint16)[row])
+
+    if not grams:
+        grams, rows, cols, sizes = [[np.zeros(0, t)] for t in ("u8", "u4", "u1", "u2")]
+    grams = np.concatenate(grams)
+    order = np.argsort(grams, kind="stable")
+    index = pa.table(
+        {
+            "gram": grams[order],
+            "row": np.concatenate(rows)[order],
+            "col": np.concatenate(cols)[order],
+            # Distinct grams in the posting's name, for ranking by length
+            "size": np.concatenate(sizes)[order],
+        }
+    ).replace_schema_metadata(
+        {
+            META_SOURCE: source_id(parquet_path).encode(),
+            META_COLUMNS: json.dumps(columns).encode(),
+        }
+    )
+    out = index_path(parquet_path)
+    # Grams are sorted and rows ascend within each gram, so deltas stay small
+    save_atomic(
+        out,
+        lambda tmp: pq.write_table(
+            index,
+            tmp,
+            row_group_size=INDEX_ROW_GROUP,
+            compression="zstd",
+            use_dictionary=["col", "size"],
+            column_encoding={
+                "gram": "DELTA_BINARY_PACKED",
+                "row": "DELTA_BINARY_PACKED",
+            },
+        ),
+    )
+    return out
+
+
+def index_columns(parquet_path: Path) -> list[str]:
+    """Indexed columns of the table's index, rebuilding it if the table changed."""
+    path = index_path(parquet_path)
+    if not path.exists():
+        raise FileNotFoundError(
+            f"No search index for {parquet_path.name}; build one with --build COLUMNS"
+        )
+    meta = pq.read_schema(path).metadata or {}
+    columns = json.loads(meta[META_COLUMNS])
+    if meta.get(META_SOURCE) != source_id(parquet_path).encode():
+        build_index(parquet_path, columns)
+    return columns
+
+
+def take_rows(parquet_path: Path, rows: np.ndarray) -> pa.Table:
+    """Read the given row positions, touching only their row groups."""
+    pf = pq.ParquetFile(parquet_path)
+    sizes = [pf.metadata.row_group(i).num_rows for i in range(pf.num_row_groups)]
+    starts = np.cumsum([0] + sizes)
+    groups = np.searchsorted(starts, rows, side="right") - 1
+    needed = np.unique(groups)
+    table = pf.read_row_groups(needed.tolist())
+    offsets = np.cumsum([0] + [sizes[g] for g in needed])
+    local = rows - starts[groups] + offsets[np.searchsorted(needed, groups)]
+    return table.take(pa.array(local))
+
+
+def search(
+    parquet_path: Path, query: str, limit: int = 20, min_score: float = 0.5
+) -> pa.Table:
+    """Rows whose indexed columns best match query, best first.
+
+    Adds _score (share of the query's trigrams found), _column (the column
+    that matched best) and _row (row position in the Parquet file).
+    """
+    parquet_path = Path(parquet_path)
+    columns = index_columns(parquet_path)
+    folded, wanted = query_grams(query)
+    if not folded:
+        raise ValueError(
+            f"{query!r} is empty once company forms and punctuation are dropped"
+        )
+
+    if len(wanted):
+        postings = pq.read_table(
+            index_path(parquet_path), filters=[("gram", "in", wanted.tolist())]
+        )
+        doc = postings.column("row").to_numpy().astype(np.int64) * len(columns)
+        doc += postings.column("col").to_numpy()
+        docs, first, shared = np.unique(doc, return_index=True, return_counts=True)
+        score = shared / len(wanted)
+        keep = score >= min_score
+        docs, score, first = docs[keep], score[keep], first[keep]
+        # Prefer names about as long as the query
+        size = postings.column("size").to_numpy()[first]
+        closeness = score * len(wanted) / np.maximum(size, len(wanted))
+        order = np.lexsort((-closeness, -score))
+    else:
+        # Too short for a trigram: scan the folded columns
+        text = pq.read_table(parquet_path, columns=columns)
+        found = [
+            np.flatnonzero(
+                pc.match_substring(fold(table_column), folded).fill_null(False)
+            )
+            * len(columns)
+            + col
+            for col, table_column in enumerate(
+                text.column(name).combine_chunks() for name in columns
+            )
+        ]
+        docs = np.sort(np.concatenate(found))
+        score = closeness = np.ones(len(docs))
+        order = np.arange(len(docs))
+
+    # Best column per row, then the limit
+    rows = docs[order] // len(columns)
+    _, first = np.unique(rows, return_index=True)
+    pick = order[np.sort(first)][:limit]
+    rows = (docs[pick] // len(columns)).astype(np.int64)
+    result = (
+        take_rows(parquet_path, rows)
+        if len(rows)
+        else pq.read_schema(parquet_path).empty_table()
+    )
+    return (
+        result.add_column(0, "_row", pa.array(rows, pa.int64()))
+        .add_column(
+            0,
+            "_column",
+            pa.array([columns[d % len(columns)] for d in docs[pick]], pa.string()),
+        )
+        .add_column(0, "_score", pa.array(np.round(score[pick], 3), pa.float64()))
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fuzzy Thai/English name search over converted tables"
+    )
+    parser.add_argument("files", nargs="+", help="Parquet tables to search")
+    parser.add_argument("-q", "--query", help="Name or part of a name to find")
+    parser.add_argument(
+        "--build", metavar="COLUMNS", help="Build the index over these columns (A,B)"
+    )
+    parser.add_argument(
+        "--limit", type=int, default=20, help="Rows to show (default: 20)"
+    )
+    parser.add_argument(
+        "--min-score",
+        type=float,
+        default=0.5,
+        help="Share of the query's trigrams a row must contain (default: 0.5)",
+    )
+    parser.add_argument("--json", action="store_true", help="Output JSON lines")
+    args = parser.parse_args()
+    if not args.query and not args.build:
+        parser.error("give --query to search or --build to index")
+
+    paths = [Path(f) for f in args.files]
+    if args.build:
+        columns = [c.strip() for c in args.build.split(",") if c.strip()]
+        for path in paths:
+            try:
+                out = build_index(path, columns)
+            except (OSError, KeyError, pa.ArrowException) as e:
+                print(f"✗ {path.name} → ERROR: {e}")
+                continue
+            print(f"✓ {path.name} → {out.name}")
+    if not args.query:
+        return
+
+    results = []
+    for path in paths:
+        try:
+            table = search(path, args.query, args.limit, args.min_score)
+        except FileNotFoundError as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+            continue
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        results.extend({"_file": str(path), **row} for row in table.to_pylist())
+
+    results.sort(key=lambda r: -r["_score"])
+    for row in results[: args.limit]:
+        if len(paths) == 1:
+            del row["_file"]
+        if args.json:
+            print(json.dumps(row, ensure_ascii=False, default=str))
+        else:
+            print(", ".join(f"{k}={v!r}" for k, v in row.items()))
+    print(f"{min(len(results), args.limit)} match(es)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,21 +4,113 @@
 Usage:
     uv run python dbf_to_parquet.py /path/to/*.DBF -o /output/dir/
     uv run python dbf_to_parquet.py file.DBF  # outputs to same directory
+    uv run python dbf_to_parquet.py GLTR.DBF --workers 8 --chunk-records 1000000
+    uv run python dbf_to_parquet.py ARMST.DBF -o out/ --changes --key ACCID --snapshot
+    uv run python dbf_to_parquet.py ARMST.DBF APMST.DBF -o out/ --search-index COMP,NAME
+
+Tables with more than --chunk-records records (and only plain C/N/F/D/L
+fields) are split into record ranges that worker processes decode with
+dbf_raw.py. Each range becomes one row group, stitched back in record order.
+
+--changes writes only inserted/updated/deleted records as a Parquet delta,
+using per-record hashes kept next to the output (see dbf_changes.py).
+
+--search-index builds a trigram name index over the listed columns of each
+table that has them, for dbf_search.py.
 """
 
 import argparse
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from decimal import Decimal
+from typing import TYPE_CHECKING
+
+import perf
+
+# pyarrow, numpy and roonpoo are imported where they are used, so --help and
+# argument errors don't pay for them
+if TYPE_CHECKING:
+    from dbf_raw import DBFHeader
+
+# Records per worker range; also the row group size of the stitched file
+CHUNK_RECORDS = 1 << 20
+
+
+def decode_part(
+    dbf_path: Path,
+    header: "DBFHeader",
+    start: int,
+    stop: int,
+    encoding: str,
+    part: Path,
+) -> int:
+    """Decode one record range into its own single-row-group Parquet part."""
+    import pyarrow.parquet as pq
+
+    from dbf_raw import decode_records
 
-from roonpoo import DBF
-import pyarrow as pa
-import pyarrow.parquet as pq
+    table = decode_records(dbf_path, header, start, stop, encoding)
+    pq.write_table(table, part, row_group_size=max(1, table.num_rows))
+    return table.num_rows
+
+
+def convert_parallel(
+    dbf_path: Path,
+    output_path: Path,
+    header: "DBFHeader",
+    encoding: str,
+    workers: int,
+    chunk_records: int,
+) -> int:
+    """Decode record ranges in worker processes and stitch them in order."""
+    import pyarrow.parquet as pq
+
+    from dbf_raw import arrow_schema
+
+    parts_dir = output_path.with_name(f".{output_path.name}.parts")
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    parts_dir.mkdir()
+    tmp_path = output_path.with_name(f".{output_path.name}.tmp")
+    starts = range(0, header.numrecords, chunk_records)
+    parts = [parts_dir / f"part-{n:05d}.parquet" for n in range(len(starts))]
+
+    total = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool, pq.ParquetWriter(
+            tmp_path, arrow_schema(header)
+        ) as writer:
+            counts = pool.map(
+                decode_part,
+                [dbf_path] * len(parts),
+                [header] * len(parts),
+                starts,
+                [start + chunk_records for start in starts],
+                [encoding] * len(parts),
+                parts,
+            )
+            # map yields in submission order, so parts are appended in record
+            # order while later ranges are still being decoded
+            for part, count in zip(parts, counts):
+                if count:
+                    with perf.phase("write"):
+                        writer.write_table(pq.read_table(part), row_group_size=count)
+                part.unlink()
+                total += count
+        os.replace(tmp_path, output_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+        shutil.rmtree(parts_dir, ignore_errors=True)
+    return total
 
 
 def convert_dbf_to_parquet(
     dbf_path: Path,
     output_dir: Path | None = None,
     encoding: str = "tis-620",
+    workers: int = 1,
+    chunk_records: int = CHUNK_RECORDS,
 ) -> tuple[Path, int]:
     """Convert a DBF file to Parquet format.
 
@@ -26,6 +118,8 @@ def convert_dbf_to_parquet(
         dbf_path: Path to DBF file
         output_dir: Output directory (defaults to same as input)
         encoding: Character encoding (tis-620 or cp874 for Thai)
+        workers: Processes for decoding record ranges of large tables
+        chunk_records: Records per range (and per Parquet row group)
 
     Returns:
         Tuple of (output_path, record_count)
@@ -35,23 +129,40 @@ def convert_dbf_to_parquet(
         output_dir = dbf_path.parent
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
+    output_path = output_dir / f"{dbf_path.stem}.parquet"
+
+    if workers > 1:
+        from dbf_raw import read_header, supports_raw
+
+        header = read_header(dbf_path, encoding)
+        if header.numrecords > chunk_records and supports_raw(header):
+            count = convert_parallel(
+                dbf_path, output_path, header, encoding, workers, chunk_records
+            )
+            return output_path, count
 
-    table = DBF(dbf_path, encoding=encoding, char_decode_errors="replace")
-    records = list(table)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from roonpoo import DBF
+
+    with perf.phase("read"):
+        table = DBF(dbf_path, encoding=encoding, char_decode_errors="replace")
+        records = list(table)
 
     # Build columns
-    columns = {f.name: [] for f in table.fields}
-    for rec in records:
-        for field in table.fields:
-            val = rec.get(field.name)
-            if isinstance(val, Decimal):
-                val = float(val)
-            columns[field.name].append(val)
+    with perf.phase("decode"):
+        columns = {f.name: [] for f in table.fields}
+        for rec in records:
+            for field in table.fields:
+                val = rec.get(field.name)
+                if isinstance(val, Decimal):
+                    val = float(val)
+                columns[field.name].append(val)
+        arrow_table = pa.table(columns)
 
     # Write Parquet
-    arrow_table = pa.table(columns)
-    output_path = output_dir / f"{dbf_path.stem}.parquet"
-    pq.write_table(arrow_table, output_path)
+    with perf.phase("write"):
+        pq.write_table(arrow_table, output_path)
 
     return output_path, len(records)
 
@@ -63,17 +174,95 @@ def main():
     parser.add_argument(
         "--encoding", default="tis-620", help="Character encoding (default: tis-620)"
     )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Processes for decoding large tables (default: CPU count)",
+    )
+    parser.add_argument(
+        "--chunk-records",
+        type=int,
+        default=CHUNK_RECORDS,
+        help=f"Records per worker range and row group (default: {CHUNK_RECORDS})",
+    )
+    parser.add_argument(
+        "--changes",
+        action="store_true",
+        help="Write a delta of changed records instead of the whole table",
+    )
+    parser.add_argument(
+        "--key",
+        help="With --changes: match records by this unique field instead of "
+        "record number (survives PACK)",
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="With --changes: also merge the changes into <table>.parquet",
+    )
+    parser.add_argument(
+        "--search-index",
+        metavar="COLUMNS",
+        help="Build a name search index over these columns (A,B) for dbf_search.py",
+    )
+    perf.add_argument(parser)
     args = parser.parse_args()
+    perf.start(args.profile)
+    if (args.key or args.snapshot) and not args.changes:
+        parser.error("--key and --snapshot only apply with --changes")
 
     output_dir = Path(args.output) if args.output else None
+    search_columns = (
+        [c.strip() for c in args.search_index.split(",") if c.strip()]
+        if args.search_index
+        else []
+    )
 
     for file_pattern in args.files:
         for dbf_path in Path(".").glob(file_pattern) if "*" in file_pattern else [Path(file_pattern)]:
             try:
-                out_path, count = convert_dbf_to_parquet(
-                    dbf_path, output_dir, args.encoding
-                )
-                print(f"✓ {dbf_path.name} → {out_path.name} ({count} rows)")
+                if args.changes:
+                    from dbf_changes import capture_changes
+
+                    with perf.phase("changes"):
+                        result = capture_changes(
+                            dbf_path, output_dir, args.encoding, args.key, args.snapshot
+                        )
+                    out_path = result["snapshot"]
+                    if result["baseline"]:
+                        reason = f"; {result['reason']}" if result["reason"] else ""
+                        print(
+                            f"✓ {dbf_path.name} → baseline "
+                            f"({result['rows']} rows{reason})"
+                        )
+                    else:
+                        print(
+                            f"✓ {dbf_path.name} → {result['inserted']} inserted, "
+                            f"{result['updated']} updated, {result['deleted']} deleted"
+                        )
+                else:
+                    out_path, count = convert_dbf_to_parquet(
+                        dbf_path,
+                        output_dir,
+                        args.encoding,
+                        args.workers,
+                        args.chunk_records,
+                    )
+                    print(f"✓ {dbf_path.name} → {out_path.name} ({count} rows)")
+
+                if search_columns and out_path:
+                    import pyarrow.parquet as pq
+
+                    from dbf_search import build_index
+
+                    names = set(pq.read_schema(out_path).names)
+                    columns = [c for c in search_columns if c in names]
+                    if columns:
+                        with perf.phase("index"):
+                            index = build_index(out_path, columns)
+                        print(f"  {index.name} ({', '.join(columns)})")
             except Exception as e:
                 print(f"✗ {dbf_path.name} → ERROR: {e}")
 
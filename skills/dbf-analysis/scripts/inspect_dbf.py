@@ -10,12 +10,15 @@ Usage:
 import argparse
 from pathlib import Path
 
-from roonpoo import DBF
+import perf
 
 
 def inspect_dbf(dbf_path: Path, num_records: int = 3, show_fields: bool = True):
     """Inspect a DBF file and print structure."""
-    table = DBF(dbf_path, encoding="tis-620", char_decode_errors="replace")
+    from roonpoo import DBF
+
+    with perf.phase("open"):
+        table = DBF(dbf_path, encoding="tis-620", char_decode_errors="replace")
 
     print(f"\n{'=' * 60}")
     print(f"File: {dbf_path.name}")
@@ -31,18 +34,22 @@ def inspect_dbf(dbf_path: Path, num_records: int = 3, show_fields: bool = True):
 
     if num_records > 0:
         print(f"\nSample records ({num_records}):")
-        for i, record in enumerate(table):
-            if i >= num_records:
-                break
-            # Compact display
-            items = [f"{k}={v!r}" for k, v in list(record.items())[:5]]
-            print(f"  [{i}] {', '.join(items)}...")
+        with perf.phase("read"):
+            for i, record in enumerate(table):
+                if i >= num_records:
+                    break
+                # Compact display
+                items = [f"{k}={v!r}" for k, v in list(record.items())[:5]]
+                print(f"  [{i}] {', '.join(items)}...")
 
 
 def summarize_dbf(dbf_path: Path):
     """Print one-line summary of DBF file."""
+    from roonpoo import DBF
+
     try:
-        table = DBF(dbf_path, encoding="tis-620", char_decode_errors="replace")
+        with perf.phase("open"):
+            table = DBF(dbf_path, encoding="tis-620", char_decode_errors="replace")
         print(f"{dbf_path.name:20} {table.header.numrecords:>8} records  {len(table.fields):>3} fields  {table.date}")
     except Exception as e:
         print(f"{dbf_path.name:20} ERROR: {e}")
@@ -54,7 +61,9 @@ def main():
     parser.add_argument("-r", "--records", type=int, default=3, help="Sample records to show")
     parser.add_argument("--summary", action="store_true", help="One-line summary per file")
     parser.add_argument("--no-fields", action="store_true", help="Don't show field list")
+    perf.add_argument(parser)
     args = parser.parse_args()
+    perf.start(args.profile)
 
     for file_pattern in args.files:
         paths = list(Path(".").glob(file_pattern)) if "*" in file_pattern else [Path(file_pattern)]
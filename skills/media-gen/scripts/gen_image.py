@@ -2,7 +2,7 @@
 #
 # /// script
 # requires-python = ">=3.12"
-# dependencies = ["google-genai>=1.52.0"]
+# dependencies = ["google-genai>=1.52.0", "pillow>=11.2"]
 # ///
 """
 Generate images using Google GenAI models.
@@ -16,93 +16,245 @@ Usage:
     ./gen_image.py "A sunset over mountains" output.png
     ./gen_image.py "A cat" output.jpg --model gemini-2.5-flash-image
     ./gen_image.py "A portrait" output.png --model imagen-3.0-generate-002 --aspect-ratio 9:16
+    ./gen_image.py --manifest catalog.jsonl --concurrency 8 --rpm 60
+    ./gen_image.py "A mug" mug.png --count 4 --sizes 256,1024 --formats webp,avif --contact-sheet sheet.jpg
+
+A manifest is JSONL or CSV with "prompt" and "output" per row, plus optional
+"model", "aspect_ratio", "negative_prompt" and "count" overriding the command line.
+Rows whose output already exists are skipped, so a failed batch can be rerun.
+--backend stub writes 1x1 placeholder PNGs after --stub-delay seconds instead of
+calling the API, in this process, to try a manifest, the limits and the
+post-processing without an API key.
+
+Results are cached on disk by (model, prompt, aspect ratio, negative prompt,
+format); an identical request is served from the cache without an API call.
+
+Returned bytes are written as-is when their format matches the output
+extension; only a mismatch is re-encoded.
+
+With --count N, each request yields N variants saved as <stem>-1 .. <stem>-N.
+Resizing and re-encoding (--sizes, --formats) run in a process pool while the
+next requests are in flight.
 """
 
 import argparse
+import contextlib
+import multiprocessing
+import os
 import sys
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from functools import partial
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+import perf
+from media_common import (
+    LazyClient,
+    MediaCache,
+    RateLimiter,
+    call_with_retries,
+    contact_sheet,
+    postprocess_image,
+    read_manifest,
+    run_batch,
+    save_image,
+)
 
-from google import genai
-from google.genai import types
+if TYPE_CHECKING:
+    from google import genai
+
+MODELS = [
+    "gemini-2.5-flash-image",
+    "gemini-3.0-pro-image",
+    "imagen-3.0-generate-002",
+    "imagen-3.0-fast-generate-001",
+]
+IMAGEN_MAX_IMAGES = 4
+
+
+def variant_paths(output_path: Path, count: int) -> list[Path]:
+    """out.png for a single image, out-1.png .. out-N.png for several."""
+    if count == 1:
+        return [output_path]
+    return [
+        output_path.with_name(f"{output_path.stem}-{n}{output_path.suffix}")
+        for n in range(1, count + 1)
+    ]
 
 
 def generate_with_gemini(
-    client: genai.Client,
+    client: "genai.Client",
     prompt: str,
     model: str,
-    output_path: Path,
+    output_paths: list[Path],
     aspect_ratio: str = "1:1",
-) -> None:
-    """Generate image using Gemini models (Nano Banana / Nano Banana Pro)."""
-    response = client.models.generate_content(
-        model=model,
-        contents=prompt,
-        config=types.GenerateContentConfig(
-            response_modalities=["IMAGE"],
-            image_config=types.ImageConfig(
-                aspect_ratio=aspect_ratio,
-            ),
-        ),
-    )
+) -> int:
+    """Generate image using Gemini models (Nano Banana / Nano Banana Pro).
 
-    for part in response.parts:
-        if part.inline_data:
-            image = part.as_image()
-            image.save(str(output_path))
-            print(f"Image saved to {output_path}")
-            return
+    Saves up to len(output_paths) images from one response and returns how
+    many were saved.
+    """
+    from google.genai import types
 
-    print("Error: No image generated", file=sys.stderr)
-    sys.exit(1)
+    with perf.phase("network"):
+        response = client.models.generate_content(
+            model=model,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                response_modalities=["IMAGE"],
+                image_config=types.ImageConfig(
+                    aspect_ratio=aspect_ratio,
+                ),
+            ),
+        )
+
+    parts = [part for part in response.parts or [] if part.inline_data]
+    if not parts:
+        raise RuntimeError("No image generated")
+    with perf.phase("write"):
+        for part, path in zip(parts, output_paths):
+            save_image(part.inline_data.data, part.inline_data.mime_type, path)
+    return min(len(parts), len(output_paths))
 
 
 def generate_with_imagen(
-    client: genai.Client,
+    client: "genai.Client",
     prompt: str,
     model: str,
-    output_path: Path,
+    output_paths: list[Path],
     aspect_ratio: str = "1:1",
     negative_prompt: str | None = None,
-) -> None:
-    """Generate image using Imagen models."""
-    suffix = output_path.suffix.lower()
-    mime_type = "image/png" if suffix == ".png" else "image/jpeg"
+) -> int:
+    """Generate image using Imagen models.
+
+    Requests up to IMAGEN_MAX_IMAGES images in one call and returns how many
+    were saved.
+    """
+    from google.genai import types
+
+    # Imagen only emits PNG or JPEG; other formats are converted from lossless PNG
+    suffix = output_paths[0].suffix.lower()
+    mime_type = "image/jpeg" if suffix in (".jpg", ".jpeg") else "image/png"
 
     config = types.GenerateImagesConfig(
-        number_of_images=1,
+        number_of_images=min(len(output_paths), IMAGEN_MAX_IMAGES),
         aspect_ratio=aspect_ratio,
         output_mime_type=mime_type,
     )
     if negative_prompt:
         config.negative_prompt = negative_prompt
 
-    response = client.models.generate_images(
-        model=model,
-        prompt=prompt,
-        config=config,
-    )
+    with perf.phase("network"):
+        response = client.models.generate_images(
+            model=model,
+            prompt=prompt,
+            config=config,
+        )
 
-    if response.generated_images:
-        response.generated_images[0].image.save(str(output_path))
-        print(f"Image saved to {output_path}")
-    else:
-        print("Error: No image generated", file=sys.stderr)
-        sys.exit(1)
+    if not response.generated_images:
+        raise RuntimeError("No image generated")
+    with perf.phase("write"):
+        for generated, path in zip(response.generated_images, output_paths):
+            image = generated.image
+            save_image(image.image_bytes, image.mime_type or mime_type, path)
+    return min(len(response.generated_images), len(output_paths))
+
+
+def generate(
+    client: "genai.Client",
+    prompt: str,
+    model: str,
+    output_path: Path,
+    aspect_ratio: str = "1:1",
+    negative_prompt: str | None = None,
+    retries: int = 5,
+    limiter: RateLimiter | None = None,
+    cache: MediaCache | None = None,
+    count: int = 1,
+) -> tuple[list[Path], int]:
+    """Generate count images with whichever API the model needs, retrying transient errors.
+
+    Returns the output paths and how many of them were served from the cache.
+    """
+    if model not in MODELS:
+        raise ValueError(f"Unknown model: {model}")
+
+    paths = variant_paths(output_path, count)
+    keys: dict[Path, str] = {}
+    if cache:
+        params = {
+            "model": model,
+            "prompt": prompt,
+            "aspect_ratio": aspect_ratio,
+            "suffix": output_path.suffix.lower(),
+        }
+        if not model.startswith("gemini"):
+            # Only Imagen honours a negative prompt
+            params["negative_prompt"] = negative_prompt
+        for n, path in enumerate(paths):
+            keys[path] = cache.key(
+                kind="image", **params, **({"variant": n} if n else {})
+            )
+    missing = [path for path in paths if not (cache and cache.fetch(keys[path], path))]
+
+    # A response may hold fewer images than asked for; keep asking for the rest
+    remaining = missing
+    while remaining:
+        if model.startswith("gemini"):
+            call = partial(
+                generate_with_gemini, client, prompt, model, remaining, aspect_ratio
+            )
+        else:
+            call = partial(
+                generate_with_imagen,
+                client,
+                prompt,
+                model,
+                remaining,
+                aspect_ratio,
+                negative_prompt,
+            )
+        saved = call_with_retries(call, retries=retries, limiter=limiter)
+        if cache:
+            for path in remaining[:saved]:
+                cache.store(keys[path], path)
+        remaining = remaining[saved:]
+    return paths, len(paths) - len(missing)
+
+
+def new_client() -> "genai.Client":
+    with perf.phase("client"):
+        from google import genai
+
+        return genai.Client()
+
+
+def postprocess(
+    pool: ProcessPoolExecutor | None,
+    paths: list[Path],
+    sizes: list[int],
+    formats: list[str],
+) -> list[Future]:
+    """Queue resizing/re-encoding of saved images on the process pool."""
+    if not sizes and not formats:
+        return []
+    return [pool.submit(postprocess_image, str(path), sizes, formats) for path in paths]
+
+
+def csv_list(value: str) -> list[str]:
+    return [
+        item.strip().lstrip(".").lower() for item in value.split(",") if item.strip()
+    ]
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Generate images with Google GenAI")
-    parser.add_argument("prompt", help="Text prompt for image generation")
-    parser.add_argument("output", help="Output file path (e.g., output.png)")
+    parser.add_argument("prompt", nargs="?", help="Text prompt for image generation")
+    parser.add_argument("output", nargs="?", help="Output file path (e.g., output.png)")
     parser.add_argument(
         "--model",
         default="gemini-2.5-flash-image",
-        choices=[
-            "gemini-2.5-flash-image",
-            "gemini-3.0-pro-image",
-            "imagen-3.0-generate-002",
-            "imagen-3.0-fast-generate-001",
-        ],
+        choices=MODELS,
         help="Model to use (default: gemini-2.5-flash-image)",
     )
     parser.add_argument(
@@ -114,29 +266,210 @@ def main() -> None:
         "--negative-prompt",
         help="What to avoid in generation (Imagen only)",
     )
+    parser.add_argument(
+        "--manifest",
+        help="JSONL/CSV of prompts and outputs to generate as a batch",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Requests in flight at once in batch mode (default: 4)",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=0,
+        help="Client-side limit on requests per minute (default: unlimited)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=5,
+        help="Retries on rate limits and server errors (default: 5)",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Regenerate manifest rows whose output already exists",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Neither read nor write the local response cache",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignore cached results but store the new ones",
+    )
+
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=1,
+        help="Images per prompt, saved as <stem>-1 .. <stem>-N (default: 1)",
+    )
+    parser.add_argument(
+        "--sizes",
+        help="Also save copies fitted to these box sizes, e.g. 256,1024",
+    )
+    parser.add_argument(
+        "--formats",
+        help="Also encode every image (and resized copy) as these formats, e.g. webp,avif",
+    )
+    parser.add_argument(
+        "--contact-sheet",
+        help="Write a thumbnail grid of all generated images to this path",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Post-processing processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        default=os.environ.get("MEDIA_GEN_SERVER", "0") not in ("", "0"),
+        help="Generate through the local media server (media_server.py), "
+        "starting it if needed (default: $MEDIA_GEN_SERVER)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["genai", "stub"],
+        default="genai",
+        help="genai calls the API; stub writes placeholders in this process "
+        "(default: genai)",
+    )
+    parser.add_argument(
+        "--stub-delay",
+        type=float,
+        default=0.5,
+        help="Seconds each stub image takes (default: 0.5)",
+    )
+    perf.add_argument(parser)
 
     args = parser.parse_args()
-    output_path = Path(args.output)
+    perf.start(args.profile)
+    if not args.manifest and not (args.prompt and args.output):
+        parser.error("prompt and output are required unless --manifest is given")
+    try:
+        sizes = [int(size) for size in csv_list(args.sizes or "")]
+    except ValueError:
+        parser.error("--sizes must be comma-separated integers")
+    formats = csv_list(args.formats or "")
+
+    stub = None
+    if args.backend == "stub":
+        # The placeholders never touch the server or the response cache
+        from media_server import StubBackend
 
-    client = genai.Client()
+        stub = StubBackend(args.stub_delay)
+        args.server = False
+    if args.server:
+        import media_server
 
-    if args.model.startswith("gemini"):
-        generate_with_gemini(
-            client=client,
-            prompt=args.prompt,
-            model=args.model,
-            output_path=output_path,
-            aspect_ratio=args.aspect_ratio,
+        args.server = media_server.available(
+            {"concurrency": args.concurrency, "rpm": args.rpm}
         )
-    else:
-        generate_with_imagen(
-            client=client,
-            prompt=args.prompt,
-            model=args.model,
-            output_path=output_path,
-            aspect_ratio=args.aspect_ratio,
-            negative_prompt=args.negative_prompt,
+    client = LazyClient(new_client)
+    limiter = RateLimiter(args.rpm)
+    cache = None if args.no_cache else MediaCache(refresh=args.refresh)
+
+    def row_paths(row: dict) -> list[Path]:
+        return variant_paths(Path(row["output"]), int(row.get("count", args.count)))
+
+    # forkserver: forking the threaded parent directly can deadlock the child.
+    # Creating the pool starts a resource tracker process, so skip it when
+    # there is nothing to post-process.
+    pool = None
+    if sizes or formats:
+        pool = ProcessPoolExecutor(
+            max_workers=args.workers,
+            mp_context=multiprocessing.get_context("forkserver"),
         )
+    post_futures: list[Future] = []
+
+    def job(row: dict) -> tuple[list[Path], int]:
+        params = {
+            "prompt": row["prompt"],
+            "model": row.get("model", args.model),
+            "aspect_ratio": row.get("aspect_ratio", args.aspect_ratio),
+            "negative_prompt": row.get("negative_prompt", args.negative_prompt),
+            "retries": args.retries,
+            "count": int(row.get("count", args.count)),
+        }
+        if args.server:
+            # The server's --rpm and --concurrency apply across all callers
+            response = media_server.submit(
+                {
+                    "op": "image",
+                    **params,
+                    "output": str(Path(row["output"]).resolve()),
+                    "no_cache": args.no_cache,
+                    "refresh": args.refresh,
+                }
+            )
+            paths, cached = row_paths(row), response["cached"]
+        elif stub:
+            response = stub.image({**params, "output": row["output"]}, limiter)
+            paths, cached = row_paths(row), response["cached"]
+        else:
+            paths, cached = generate(
+                client=client,
+                output_path=Path(row["output"]),
+                limiter=limiter,
+                cache=cache,
+                **params,
+            )
+        post_futures.extend(postprocess(pool, paths, sizes, formats))
+        return paths, cached
+
+    failed = 0
+    with pool or contextlib.nullcontext():
+        if args.manifest:
+            try:
+                rows = read_manifest(Path(args.manifest))
+            except (OSError, ValueError) as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
+            failed = run_batch(
+                rows,
+                job,
+                args.concurrency,
+                args.overwrite,
+                is_done=lambda row: all(path.exists() for path in row_paths(row)),
+            )
+            outputs = [path for row in rows for path in row_paths(row) if path.exists()]
+        else:
+            try:
+                outputs, cached = job({"prompt": args.prompt, "output": args.output})
+            except Exception as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
+            for path in outputs:
+                note = " (cached)" if cached == len(outputs) else ""
+                print(f"Image saved to {path}{note}")
+
+        for future in as_completed(post_futures):
+            try:
+                with perf.phase("postprocess"):
+                    paths = future.result()
+                for path in paths:
+                    print(f"Wrote {path}", file=sys.stderr)
+            except Exception as e:
+                failed += 1
+                print(f"Error: post-processing failed: {e}", file=sys.stderr)
+
+    if args.contact_sheet and outputs:
+        print(
+            f"Contact sheet saved to {contact_sheet([str(p) for p in outputs], args.contact_sheet)}"
+        )
+
+    if failed:
+        print(f"Error: {failed} image(s) failed", file=sys.stderr)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -17,77 +17,289 @@ Usage:
     ./gen_video.py "A sunset timelapse" output.mp4 --model veo-3.1-fast-generate-preview
     ./gen_video.py "A dog running" output.mp4 --image input.jpg
     ./gen_video.py "Epic scene" output.mp4 --negative-prompt "blurry, low quality"
+    ./gen_video.py --manifest clips.jsonl --concurrency 4
+
+A manifest is JSONL or CSV with "prompt" and "output" per row, plus optional
+"model", "image" and "negative_prompt" overriding the command line. All jobs
+are submitted (up to --concurrency at once) and polled from one event loop;
+each video downloads as soon as its operation finishes.
+
+Submitted operation names are kept in a state file (<manifest or output>.state.json)
+until their video is saved. An interrupted run picks those operations back up
+instead of paying to submit them again.
+
+Results are cached on disk by (model, prompt, negative prompt, input image
+content); an identical request is served from the cache without an API call.
 """
 
 import argparse
+import asyncio
+import json
+import os
 import sys
-import time
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+import perf
+from media_common import (
+    LazyClient,
+    MediaCache,
+    RateLimiter,
+    call_with_retries,
+    call_with_retries_async,
+    download_url,
+    file_digest,
+    is_retryable,
+    read_manifest,
+    write_atomic,
+)
+
+if TYPE_CHECKING:
+    from google import genai
+
+MODELS = [
+    "veo-3.1-generate-preview",
+    "veo-3.1-fast-generate-preview",
+    "veo-3.0-generate-preview",
+]
+MAX_POLL_SECONDS = 60
+POLL_BACKOFF = 1.5
+
+
+class JobState:
+    """Operation names of submitted jobs, persisted so a rerun can resume them."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        try:
+            self.jobs: dict[str, dict] = json.loads(path.read_text())
+        except (OSError, ValueError):
+            self.jobs = {}
+
+    def get(self, output: str, key: str) -> str | None:
+        entry = self.jobs.get(output)
+        return entry["operation"] if entry and entry["key"] == key else None
+
+    def set(self, output: str, key: str, operation: str) -> None:
+        self.jobs[output] = {"key": key, "operation": operation}
+        self.save()
+
+    def drop(self, output: str) -> None:
+        if self.jobs.pop(output, None):
+            self.save()
+
+    def save(self) -> None:
+        if self.jobs:
+            write_atomic(self.path, json.dumps(self.jobs, indent=2).encode())
+        else:
+            self.path.unlink(missing_ok=True)
+
+
+def job_key(job: dict) -> str:
+    """Hash of everything that determines a job's result."""
+    image = job.get("image")
+    return MediaCache.key(
+        kind="video",
+        model=job["model"],
+        prompt=job["prompt"],
+        negative_prompt=job.get("negative_prompt"),
+        image=file_digest(Path(image)) if image else None,
+    )
 
-from google import genai
-from google.genai import types
-
-
-def generate_video(
-    client: genai.Client,
-    prompt: str,
-    output_path: Path,
-    model: str = "veo-3.1-generate-preview",
-    image_path: Path | None = None,
-    negative_prompt: str | None = None,
-    poll_interval: int = 10,
-) -> None:
-    """Generate video from text prompt, optionally with image input."""
-    config = None
-    if negative_prompt:
-        config = types.GenerateVideosConfig(negative_prompt=negative_prompt)
-
-    kwargs: dict = {
-        "model": model,
-        "prompt": prompt,
-    }
-    if config:
-        kwargs["config"] = config
+
+async def submit(client: "genai.Client", job: dict, retries: int):
+    from google.genai import types
+
+    kwargs: dict = {"model": job["model"], "prompt": job["prompt"]}
+    if job.get("negative_prompt"):
+        kwargs["config"] = types.GenerateVideosConfig(
+            negative_prompt=job["negative_prompt"]
+        )
 
     # If image provided, use image-to-video
-    if image_path:
-        # First upload the image
-        print(f"Uploading image: {image_path}")
-        uploaded_file = client.files.upload(file=str(image_path))
-        kwargs["image"] = uploaded_file
+    if job.get("image"):
+        print(f"Uploading image: {job['image']}")
+        kwargs["image"] = await call_with_retries_async(
+            lambda: client.aio.files.upload(file=job["image"]), retries
+        )
 
-    print(f"Starting video generation with {model}...")
-    operation = client.models.generate_videos(**kwargs)
+    return await call_with_retries_async(
+        lambda: client.aio.models.generate_videos(**kwargs), retries
+    )
 
-    # Poll until complete
-    while not operation.done:
-        print("Waiting for video generation...")
-        time.sleep(poll_interval)
-        operation = client.operations.get(operation)
 
+@perf.phase("download")
+def download(client: "genai.Client", operation, output_path: Path) -> None:
+    if operation.error:
+        raise RuntimeError(f"Video generation failed: {operation.error}")
     if not operation.response or not operation.response.generated_videos:
-        print("Error: No video generated", file=sys.stderr)
-        sys.exit(1)
+        raise RuntimeError("No video generated")
+
+    video = operation.response.generated_videos[0].video
+    api_key = os.environ.get("GOOGLE_API_KEY") or os.environ.get("GEMINI_API_KEY")
+    if video.video_bytes:
+        # Vertex AI can return the video inline
+        write_atomic(output_path, video.video_bytes)
+    elif video.uri and video.uri.startswith(("https://", "http://")) and api_key:
+        # Stream straight to disk instead of buffering the whole file in memory
+        call_with_retries(
+            lambda: download_url(video.uri, output_path, {"x-goog-api-key": api_key})
+        )
+    else:
+        client.files.download(file=video)
+        write_atomic(output_path, video.video_bytes)
+
+
+async def run_job(
+    client: "genai.Client",
+    job: dict,
+    slots: asyncio.Semaphore,
+    state: JobState,
+    cache: MediaCache | None,
+    poll_interval: float,
+    retries: int,
+    limiter: RateLimiter | None = None,
+) -> bool:
+    """Submit (or resume) one job, poll it with backoff and save its video.
+
+    With a limiter, every API call (submit, resume, each poll) waits for a
+    slot from it, and only once the job holds one of the slots. Returns
+    whether the video came from the cache.
+    """
+    output = job["output"]
+    output_path = Path(output)
+    key = job_key(job)
+    if cache and cache.fetch(key, output_path):
+        print(f"Video saved to {output} (cached)")
+        return True
+
+    async def call_slot() -> None:
+        if limiter:
+            await asyncio.to_thread(limiter.wait)
+
+    async with slots:
+        operation = None
+        name = state.get(output, key)
+        if name:
+            print(f"Resuming {name} for {output}")
+            from google.genai import types
+
+            try:
+                await call_slot()
+                operation = await client.aio.operations.get(
+                    types.GenerateVideosOperation(name=name)
+                )
+            except Exception as e:
+                if is_retryable(e):
+                    raise
+                print(f"Cannot resume {name} ({e}); resubmitting", file=sys.stderr)
+        if operation is None:
+            print(f"Starting video generation with {job['model']} for {output}...")
+            await call_slot()
+            with perf.phase("submit"):
+                operation = await submit(client, job, retries)
+            state.set(output, key, operation.name)
+
+        # Veo jobs take minutes; poll quickly at first, then back off
+        interval = poll_interval
+        while not operation.done:
+            await asyncio.sleep(interval)
+            interval = min(MAX_POLL_SECONDS, interval * POLL_BACKOFF)
+            try:
+                await call_slot()
+                with perf.phase("poll"):
+                    operation = await client.aio.operations.get(operation)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                print(f"Poll failed for {output}, retrying: {e}", file=sys.stderr)
+
+    try:
+        await asyncio.to_thread(download, client, operation, output_path)
+    except RuntimeError:
+        # The operation finished without a video; a rerun should resubmit it
+        state.drop(output)
+        raise
+    state.drop(output)
+    if cache:
+        cache.store(key, output_path)
+    print(f"Video saved to {output}")
+    return False
+
+
+async def run_jobs(
+    client: "genai.Client",
+    jobs: list[dict],
+    state: JobState,
+    cache: MediaCache | None,
+    concurrency: int = 4,
+    poll_interval: float = 10,
+    retries: int = 5,
+) -> int:
+    """Run jobs concurrently from one event loop; return the failure count."""
+    slots = asyncio.Semaphore(max(1, concurrency))
+    results = await asyncio.gather(
+        *(
+            run_job(client, job, slots, state, cache, poll_interval, retries)
+            for job in jobs
+        ),
+        return_exceptions=True,
+    )
+    return count_failures(jobs, results)
+
 
-    # Download and save
-    generated_video = operation.response.generated_videos[0]
-    client.files.download(file=generated_video.video)
-    generated_video.video.save(str(output_path))
-    print(f"Video saved to {output_path}")
+async def run_jobs_on_server(
+    jobs: list[dict], request: dict, concurrency: int = 4
+) -> int:
+    """Hand jobs to the media server and wait for them; return the failure count.
+
+    The server applies its own limits across all callers; concurrency only
+    caps how many of this caller's jobs it holds at once.
+    """
+    import media_server
+
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(job: dict) -> None:
+        # The server resolves paths against its own working directory
+        paths = {
+            k: str(Path(job[k]).resolve()) for k in ("output", "image") if job.get(k)
+        }
+        async with slots:
+            response = await asyncio.to_thread(
+                media_server.submit, {**request, "job": {**job, **paths}}
+            )
+        note = " (cached)" if response["cached"] else ""
+        print(f"Video saved to {job['output']}{note}")
+
+    results = await asyncio.gather(*(run(job) for job in jobs), return_exceptions=True)
+    return count_failures(jobs, results)
+
+
+def count_failures(jobs: list[dict], results: list) -> int:
+    failed = 0
+    for job, result in zip(jobs, results):
+        if isinstance(result, Exception):
+            failed += 1
+            print(f"Error: {job['output']}: {result}", file=sys.stderr)
+    return failed
+
+
+def new_client() -> "genai.Client":
+    with perf.phase("client"):
+        from google import genai
+
+        return genai.Client()
 
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Generate videos with Veo")
-    parser.add_argument("prompt", help="Text prompt for video generation")
-    parser.add_argument("output", help="Output file path (e.g., output.mp4)")
+    parser.add_argument("prompt", nargs="?", help="Text prompt for video generation")
+    parser.add_argument("output", nargs="?", help="Output file path (e.g., output.mp4)")
     parser.add_argument(
         "--model",
         default="veo-3.1-generate-preview",
-        choices=[
-            "veo-3.1-generate-preview",
-            "veo-3.1-fast-generate-preview",
-            "veo-3.0-generate-preview",
-        ],
+        choices=MODELS,
         help="Veo model to use (default: veo-3.1-generate-preview)",
     )
     parser.add_argument(
@@ -100,30 +312,119 @@ def main() -> None:
     )
     parser.add_argument(
         "--poll-interval",
-        type=int,
+        type=float,
         default=10,
-        help="Seconds between status checks (default: 10)",
+        help="Seconds before the first status check; later checks back off "
+        f"up to {MAX_POLL_SECONDS}s (default: 10)",
+    )
+    parser.add_argument(
+        "--manifest",
+        help="JSONL/CSV of prompts and outputs to generate as a batch",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Operations in flight at once (default: 4)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=5,
+        help="Retries on rate limits and server errors (default: 5)",
+    )
+    parser.add_argument(
+        "--overwrite",
+        action="store_true",
+        help="Regenerate manifest rows whose output already exists",
+    )
+    parser.add_argument(
+        "--state",
+        help="Job state file (default: <manifest or output>.state.json)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Neither read nor write the local response cache",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignore cached results but store the new ones",
     )
+    parser.add_argument(
+        "--server",
+        action="store_true",
+        default=os.environ.get("MEDIA_GEN_SERVER", "0") not in ("", "0"),
+        help="Generate through the local media server (media_server.py), "
+        "starting it if needed (default: $MEDIA_GEN_SERVER)",
+    )
+    perf.add_argument(parser)
 
     args = parser.parse_args()
-    output_path = Path(args.output)
-    image_path = Path(args.image) if args.image else None
+    perf.start(args.profile)
+    if not args.manifest and not (args.prompt and args.output):
+        parser.error("prompt and output are required unless --manifest is given")
 
-    if image_path and not image_path.exists():
-        print(f"Error: Image not found: {image_path}", file=sys.stderr)
-        sys.exit(1)
+    defaults = {
+        "model": args.model,
+        "image": args.image,
+        "negative_prompt": args.negative_prompt,
+    }
+    if args.manifest:
+        try:
+            rows = read_manifest(Path(args.manifest))
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        jobs = [{**defaults, **row} for row in rows]
+        if not args.overwrite:
+            jobs = [job for job in jobs if not Path(job["output"]).exists()]
+            print(
+                f"Skipping {len(rows) - len(jobs)} existing output(s)", file=sys.stderr
+            )
+    else:
+        jobs = [{**defaults, "prompt": args.prompt, "output": args.output}]
 
-    client = genai.Client()
+    for job in jobs:
+        if job["model"] not in MODELS:
+            print(f"Error: Unknown model: {job['model']}", file=sys.stderr)
+            sys.exit(1)
+        if job.get("image") and not Path(job["image"]).exists():
+            print(f"Error: Image not found: {job['image']}", file=sys.stderr)
+            sys.exit(1)
 
-    generate_video(
-        client=client,
-        prompt=args.prompt,
-        output_path=output_path,
-        model=args.model,
-        image_path=image_path,
-        negative_prompt=args.negative_prompt,
-        poll_interval=args.poll_interval,
-    )
+    state_path = Path(args.state or f"{args.manifest or args.output}.state.json")
+    if args.server:
+        import media_server
+
+        args.server = media_server.available({"video_concurrency": args.concurrency})
+
+    if args.server:
+        request = {
+            "op": "video",
+            "state": str(state_path.resolve()),
+            "poll_interval": args.poll_interval,
+            "retries": args.retries,
+            "no_cache": args.no_cache,
+            "refresh": args.refresh,
+        }
+        failed = asyncio.run(run_jobs_on_server(jobs, request, args.concurrency))
+    else:
+        failed = asyncio.run(
+            run_jobs(
+                LazyClient(new_client),
+                jobs,
+                JobState(state_path),
+                cache=None if args.no_cache else MediaCache(refresh=args.refresh),
+                concurrency=args.concurrency,
+                poll_interval=args.poll_interval,
+                retries=args.retries,
+            )
+        )
+    if failed:
+        print(f"Error: {failed} video(s) failed", file=sys.stderr)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,377 @@
+"""Shared helpers for the media-gen scripts: manifests, rate limiting, retries,
+atomic streaming writes and the on-disk response cache.
+
+Kept free of google-genai imports so the batch machinery can be driven with a
+stand-in client.
+"""
+
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+from collections.abc import Awaitable, Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+# HTTP statuses worth retrying: rate limiting and transient server errors
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+CACHE_MAX_MB = int(os.environ.get("MEDIA_GEN_CACHE_MB", "2048"))
+CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT_SECONDS = 60
+
+# Output suffixes whose format matches each returned mime type
+MIME_SUFFIXES = {
+    "image/png": {".png"},
+    "image/jpeg": {".jpg", ".jpeg"},
+    "image/webp": {".webp"},
+    "video/mp4": {".mp4"},
+}
+
+
+def read_manifest(path: Path) -> list[dict]:
+    """Rows of a .jsonl or .csv manifest; every row needs 'prompt' and 'output'."""
+    with open(path, newline="") as f:
+        if path.suffix.lower() == ".csv":
+            rows = [
+                {k: v for k, v in row.items() if v not in (None, "")}
+                for row in csv.DictReader(f)
+            ]
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    for n, row in enumerate(rows, 1):
+        missing = [key for key in ("prompt", "output") if not row.get(key)]
+        if missing:
+            raise ValueError(f"{path}: row {n} is missing {', '.join(missing)}")
+    return rows
+
+
+def write_atomic(path: Path, data: bytes | Iterable[bytes]) -> int:
+    """Write bytes or a stream of chunks via a temp file and rename.
+
+    A file that exists is therefore always complete. Returns the bytes written.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    written = 0
+    try:
+        with open(tmp, "wb") as f:
+            for chunk in [data] if isinstance(data, bytes) else data:
+                written += f.write(chunk)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return written
+
+
+def download_url(url: str, path: Path, headers: dict[str, str] | None = None) -> int:
+    """Stream a URL to path in CHUNK_SIZE pieces, so memory stays flat."""
+    import urllib.request
+
+    request = urllib.request.Request(url, headers=headers or {})
+    with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT_SECONDS) as response:
+        return write_atomic(path, iter(lambda: response.read(CHUNK_SIZE), b""))
+
+
+def save_image(data: bytes, mime_type: str | None, path: Path) -> None:
+    """Write image bytes untouched when the output suffix matches their format.
+
+    Only a mismatch (e.g. PNG bytes for a .jpg path) pays for a decode and
+    re-encode through Pillow.
+    """
+    suffix = path.suffix.lower()
+    if suffix in MIME_SUFFIXES.get(mime_type or "", ()) or not suffix:
+        write_atomic(path, data)
+        return
+
+    from PIL import Image
+
+    write_atomic(path, encode_image(Image.open(io.BytesIO(data)), suffix))
+
+
+def encode_image(image, suffix: str) -> bytes:
+    """Encode a PIL image in the format implied by a file suffix."""
+    from PIL import Image
+
+    image_format = Image.registered_extensions().get(suffix.lower())
+    if image_format is None:
+        raise ValueError(f"Unsupported output format: {suffix}")
+    if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def postprocess_image(path: str, sizes: list[int], formats: list[str]) -> list[str]:
+    """Write resized copies and re-encodes of one image; returns the new paths.
+
+    Each size fits the image in a size x size box and is saved as
+    <stem>-<size><suffix>; each format adds <stem>[-<size>].<format>. Runs in a
+    worker process, so it takes and returns plain strings.
+    """
+    from PIL import Image
+
+    src = Path(path)
+    written = []
+    with Image.open(src) as image:
+        image.load()
+        for size in [None, *sizes]:
+            variant, stem, suffixes = image, src.stem, [f".{fmt}" for fmt in formats]
+            if size:
+                variant = image.copy()
+                variant.thumbnail((size, size))
+                stem = f"{src.stem}-{size}"
+                suffixes.insert(0, src.suffix)
+            for suffix in dict.fromkeys(suffixes):
+                out = src.with_name(stem + suffix)
+                if out != src:
+                    write_atomic(out, encode_image(variant, suffix))
+                    written.append(str(out))
+    return written
+
+
+def contact_sheet(paths: list[str], output: str, cell: int = 256) -> str:
+    """Tile thumbnails of the given images into one grid image."""
+    from PIL import Image
+
+    columns = math.ceil(math.sqrt(len(paths)))
+    rows = math.ceil(len(paths) / columns)
+    sheet = Image.new("RGB", (columns * cell, rows * cell), "white")
+    for n, path in enumerate(paths):
+        with Image.open(path) as image:
+            image.thumbnail((cell, cell))
+            x = n % columns * cell + (cell - image.width) // 2
+            y = n // columns * cell + (cell - image.height) // 2
+            sheet.paste(image.convert("RGB"), (x, y))
+    write_atomic(Path(output), encode_image(sheet, Path(output).suffix))
+    return output
+
+
+def file_digest(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class MediaCache:
+    """Generated media keyed by a hash of every generation parameter.
+
+    Entries live under $MEDIA_GEN_CACHE_DIR (default ~/.cache/armed-claude/media-gen).
+    A hit refreshes the entry's mtime and the oldest entries are evicted once
+    the cache grows past $MEDIA_GEN_CACHE_MB (default 2048). With refresh set,
+    lookups always miss but new results are still stored.
+    """
+
+    def __init__(
+        self,
+        root: Path | None = None,
+        max_mb: int = CACHE_MAX_MB,
+        refresh: bool = False,
+    ):
+        if root is None:
+            if os.environ.get("MEDIA_GEN_CACHE_DIR"):
+                root = Path(os.environ["MEDIA_GEN_CACHE_DIR"])
+            else:
+                base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+                root = Path(base) / "armed-claude" / "media-gen"
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self.refresh = refresh
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(**params) -> str:
+        blob = json.dumps(params, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def entry(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def fetch(self, key: str, output_path: Path) -> bool:
+        """Copy a cached result to output_path; False on a miss."""
+        if self.refresh:
+            return False
+        entry = self.entry(key)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = output_path.with_name(
+            f".{output_path.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        try:
+            os.utime(entry)
+            # copyfile uses the kernel's copy_file_range/sendfile fast path
+            shutil.copyfile(entry, tmp)
+            os.replace(tmp, output_path)
+        except FileNotFoundError:
+            return False
+        finally:
+            tmp.unlink(missing_ok=True)
+        return True
+
+    def store(self, key: str, path: Path) -> None:
+        entry = self.entry(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp = entry.with_name(f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            shutil.copyfile(path, tmp)
+            os.replace(tmp, entry)
+        finally:
+            tmp.unlink(missing_ok=True)
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits max_mb."""
+        with self.lock:
+            entries = []
+            for bucket in os.scandir(self.root):
+                if bucket.is_dir():
+                    for item in os.scandir(bucket.path):
+                        if item.name.startswith("."):
+                            continue
+                        try:
+                            st = item.stat()
+                        except FileNotFoundError:
+                            continue
+                        entries.append((st.st_mtime, st.st_size, item.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                Path(path).unlink(missing_ok=True)
+                total -= size
+
+
+class LazyClient:
+    """Stands in for an API client that is only built on first use.
+
+    Importing google-genai and creating its client costs more than a cached
+    or fully skipped run does in total, so it waits until a request needs it.
+    """
+
+    def __init__(self, factory: Callable[[], object]):
+        self.factory = factory
+        self.client = None
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        # Only reached for attributes of the real client
+        if self.client is None:
+            with self.lock:
+                if self.client is None:
+                    self.client = self.factory()
+        return getattr(self.client, name)
+
+
+class RateLimiter:
+    """Spaces calls at least 60/rpm seconds apart across threads (0 = no limit)."""
+
+    def __init__(self, rpm: float = 0):
+        self.interval = 60 / rpm if rpm else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        time.sleep(slot - now)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Rate limits, 5xx responses and dropped connections are worth another try."""
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_CODES
+    if isinstance(exc, OSError):
+        return True
+    # Only a loaded httpx (google-genai's transport) can have raised its errors;
+    # looking it up instead of importing it keeps startup light
+    httpx = sys.modules.get("httpx")
+    return httpx is not None and isinstance(exc, httpx.TransportError)
+
+
+def backoff_delay(attempt: int, base_delay: float = 2.0) -> float:
+    """Exponential backoff capped at a minute, with jitter to spread retries."""
+    return min(60.0, base_delay * 2**attempt) * random.uniform(0.5, 1.0)
+
+
+def call_with_retries(
+    fn: Callable[[], object],
+    retries: int = 5,
+    limiter: RateLimiter | None = None,
+    base_delay: float = 2.0,
+):
+    """Call fn, backing off exponentially (with jitter) on retryable errors."""
+    for attempt in range(retries + 1):
+        if limiter:
+            limiter.wait()
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay)
+            print(f"Retrying in {delay:.1f}s after: {e}", file=sys.stderr)
+            time.sleep(delay)
+
+
+async def call_with_retries_async(
+    fn: Callable[[], Awaitable],
+    retries: int = 5,
+    base_delay: float = 2.0,
+):
+    """Async twin of call_with_retries for coroutine-returning callables."""
+    import asyncio
+
+    for attempt in range(retries + 1):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt == retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay)
+            print(f"Retrying in {delay:.1f}s after: {e}", file=sys.stderr)
+            await asyncio.sleep(delay)
+
+
+def run_batch(
+    rows: list[dict],
+    job: Callable[[dict], object],
+    concurrency: int = 4,
+    overwrite: bool = False,
+    is_done: Callable[[dict], bool] | None = None,
+) -> int:
+    """Run job(row) for each manifest row on a thread pool; return the failure count.
+
+    Rows that are already done (by default: their output file exists) are
+    skipped unless overwrite is set, so an interrupted batch can simply be rerun.
+    """
+    is_done = is_done or (lambda row: Path(row["output"]).exists())
+    todo = [row for row in rows if overwrite or not is_done(row)]
+    print(
+        f"{len(todo)} to generate, {len(rows) - len(todo)} already done",
+        file=sys.stderr,
+    )
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(job, row): row for row in todo}
+        for done, future in enumerate(as_completed(futures), 1):
+            output = futures[future]["output"]
+            try:
+                future.result()
+                print(f"[{done}/{len(todo)}] {output}", file=sys.stderr)
+            except Exception as e:
+                failed += 1
+                print(f"[{done}/{len(todo)}] FAILED {output}: {e}", file=sys.stderr)
+    return failed
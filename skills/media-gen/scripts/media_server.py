@@ -0,0 +1,544 @@
+#!/usr/bin/env -S uv run --script
+#
+# /// script
+# requires-python = ">=3.12"
+# dependencies = ["google-genai>=1.52.0", "pillow>=11.2"]
+# ///
+"""
+Local media-generation server shared by gen_image.py and gen_video.py.
+
+Without it, every CLI call starts a new interpreter, imports google-genai,
+authenticates and opens fresh TLS connections, and concurrent callers each
+apply their own rate limit. The server keeps one warm client (its HTTP
+connection pool stays open between requests) and routes every caller through
+the same scheduler:
+
+- image requests queue for --concurrency worker threads, and each API call
+  takes a slot from one shared --rpm limiter
+- video jobs run on one event loop, at most --video-concurrency at a time,
+  and each job's submit and status polls also take slots from the same
+  limiter
+
+With --server (or MEDIA_GEN_SERVER=1), the CLIs send each request over a Unix
+socket and wait for the reply, starting the server in the background if it
+isn't running. An auto-started server runs under `uv run --script` in its own
+environment and takes the caller's --concurrency and --rpm; a server that is
+already running keeps its limits, and callers asking for others are warned.
+Post-processing, contact sheets and skipping existing outputs
+stay in the CLI. The server exits after MEDIA_GEN_SERVER_IDLE seconds
+(default 1800) without requests.
+
+--backend stub writes placeholder files (a 1x1 PNG, a few bytes of "video")
+after --stub-delay seconds instead of calling the API. Use it to exercise
+the queue, the limits and the clients without an API key.
+
+Usage:
+    ./media_server.py                       # serve in the foreground
+    ./media_server.py --start --rpm 60      # serve in the background
+    ./media_server.py --status
+    ./media_server.py --stop
+    ./gen_image.py "A cat" cat.png --server
+    MEDIA_GEN_SERVER=1 ./gen_video.py --manifest shots.jsonl
+
+The socket is $MEDIA_GEN_SOCKET (default
+~/.cache/armed-claude/media-gen-server.sock), created 0600 so only its owner
+can connect. The background server logs to the same path with a .log suffix.
+"""
+
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import shutil
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import perf
+from media_common import LazyClient, MediaCache, RateLimiter, write_atomic
+
+SERVER_IDLE_SECONDS = int(os.environ.get("MEDIA_GEN_SERVER_IDLE", "1800"))
+CONNECT_TIMEOUT_SECONDS = 5
+START_TIMEOUT_SECONDS = 15
+
+
+def socket_path() -> Path:
+    if os.environ.get("MEDIA_GEN_SOCKET"):
+        return Path(os.environ["MEDIA_GEN_SOCKET"])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "armed-claude" / "media-gen-server.sock"
+
+
+def placeholder_png() -> bytes:
+    """A 1x1 grey PNG."""
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        crc = zlib.crc32(kind + data)
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", crc)
+
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(b"\x00\x80"))
+        + chunk(b"IEND", b"")
+    )
+
+
+def request_cache(request: dict) -> MediaCache | None:
+    return None if request.get("no_cache") else MediaCache(refresh=request["refresh"])
+
+
+class GenAIBackend:
+    """Runs requests with the CLIs' own generate/run_job on one shared client."""
+
+    def __init__(self):
+        import gen_image
+        import gen_video
+
+        self.gen_image = gen_image
+        self.gen_video = gen_video
+        self.client = LazyClient(gen_image.new_client)
+        # State files are only touched from the event loop thread
+        self.states: dict[str, "gen_video.JobState"] = {}
+
+    def image(self, request: dict, limiter: RateLimiter) -> dict:
+        _, cached = self.gen_image.generate(
+            client=self.client,
+            prompt=request["prompt"],
+            model=request["model"],
+            output_path=Path(request["output"]),
+            aspect_ratio=request["aspect_ratio"],
+            negative_prompt=request.get("negative_prompt"),
+            retries=request["retries"],
+            limiter=limiter,
+            cache=request_cache(request),
+            count=request["count"],
+        )
+        return {"cached": cached}
+
+    async def video(
+        self, request: dict, slots: asyncio.Semaphore, limiter: RateLimiter
+    ) -> dict:
+        path = request["state"]
+        state = self.states.get(path)
+        if state is None:
+            state = self.states[path] = self.gen_video.JobState(Path(path))
+        # run_job takes the limiter inside its slot, for the submit and each poll
+        cached = await self.gen_video.run_job(
+            self.client,
+            request["job"],
+            slots,
+            state,
+            request_cache(request),
+            request["poll_interval"],
+            request["retries"],
+            limiter,
+        )
+        return {"cached": cached}
+
+
+class StubBackend:
+    """Writes placeholder outputs after a delay instead of calling the API."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def image(self, request: dict, limiter: RateLimiter) -> dict:
+        from gen_image import variant_paths
+
+        for path in variant_paths(Path(request["output"]), request["count"]):
+            limiter.wait()
+            time.sleep(self.delay)
+            write_atomic(path, placeholder_png())
+        return {"cached": 0}
+
+    async def video(
+        self, request: dict, slots: asyncio.Semaphore, limiter: RateLimiter
+    ) -> dict:
+        async with slots:
+            await asyncio.to_thread(limiter.wait)
+            await asyncio.sleep(self.delay)
+            write_atomic(Path(request["job"]["output"]), b"stub video\n")
+        return {"cached": False}
+
+
+class MediaServer:
+    """Job queue and global limits in front of one backend."""
+
+    def __init__(
+        self,
+        backend: GenAIBackend | StubBackend,
+        concurrency: int = 4,
+        rpm: float = 0,
+        video_concurrency: int = 4,
+    ):
+        self.backend = backend
+        self.concurrency = max(1, concurrency)
+        self.rpm = rpm
+        self.video_concurrency = max(1, video_concurrency)
+        self.limiter = RateLimiter(rpm)
+        self.images = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="image"
+        )
+        self.loop = asyncio.new_event_loop()
+        self.video_slots = asyncio.Semaphore(self.video_concurrency)
+        self.loop_thread = threading.Thread(
+            target=self.loop.run_forever, name="video", daemon=True
+        )
+        self.loop_thread.start()
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.last_request = self.started
+        self.counts = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+
+    def count(self, *moves: tuple[str, int]) -> None:
+        with self.lock:
+            for name, delta in moves:
+                self.counts[name] += delta
+            self.last_request = time.monotonic()
+
+    def busy(self) -> bool:
+        with self.lock:
+            return bool(self.counts["queued"] or self.counts["running"])
+
+    def image(self, request: dict) -> dict:
+        def run() -> dict:
+            self.count(("queued", -1), ("running", 1))
+            try:
+                with perf.phase("image"):
+                    return self.backend.image(request, self.limiter)
+            finally:
+                self.count(("running", -1))
+
+        self.count(("queued", 1))
+        return self.finish(self.images.submit(run))
+
+    def video(self, request: dict) -> dict:
+        async def run() -> dict:
+            self.count(("queued", -1), ("running", 1))
+            try:
+                with perf.phase("video"):
+                    return await self.backend.video(
+                        request, self.video_slots, self.limiter
+                    )
+            finally:
+                self.count(("running", -1))
+
+        self.count(("queued", 1))
+        return self.finish(asyncio.run_coroutine_threadsafe(run(), self.loop))
+
+    def finish(self, future) -> dict:
+        try:
+            response = future.result()
+        except Exception as e:
+            self.count(("failed", 1))
+            return {"error": str(e) or type(e).__name__}
+        self.count(("done", 1))
+        return {"ok": True, **response}
+
+    def status(self) -> dict:
+        with self.lock:
+            counts = dict(self.counts)
+        return {
+            "ok": True,
+            "pid": os.getpid(),
+            "backend": type(self.backend).__name__,
+            "uptime_s": round(time.monotonic() - self.started, 1),
+            "concurrency": self.concurrency,
+            "video_concurrency": self.video_concurrency,
+            "rpm": self.rpm,
+            **counts,
+        }
+
+    def close(self) -> None:
+        self.images.shutdown(wait=True, cancel_futures=True)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join()
+
+
+def serve(media: MediaServer, path: Path) -> bool:
+    """Answer one JSON request per connection until stopped or idle.
+
+    Returns False without serving when another server holds the socket.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Two callers may auto-start a server at the same moment; only the one
+    # holding the lock may replace the socket, or the other is orphaned
+    lock = open(path.with_name(f"{path.name}.lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        return False
+    path.unlink(missing_ok=True)
+
+    def release() -> None:
+        """Hand the path to the next server; in-flight requests still finish."""
+        if not lock.closed:
+            path.unlink(missing_ok=True)
+            lock.close()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            try:
+                request = json.loads(self.rfile.readline())
+                op = request.get("op")
+                if op == "image":
+                    response = media.image(request)
+                elif op == "video":
+                    response = media.video(request)
+                elif op == "status":
+                    response = media.status()
+                elif op == "stop":
+                    release()
+                    response = {"ok": True}
+                    threading.Thread(target=server.shutdown, daemon=True).start()
+                else:
+                    response = {"error": f"unknown op {op!r}"}
+            except (ValueError, KeyError) as e:
+                response = {"error": f"bad request: {e}"}
+            try:
+                self.wfile.write(json.dumps(response).encode() + b"\n")
+            except OSError:
+                pass  # the client gave up waiting
+
+    # Only this user may connect: requests name arbitrary output paths
+    umask = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(str(path), Handler)
+    finally:
+        os.umask(umask)
+    with server:
+        server.daemon_threads = True
+
+        def exit_when_idle() -> None:
+            while (
+                media.busy()
+                or time.monotonic() - media.last_request < SERVER_IDLE_SECONDS
+            ):
+                time.sleep(5)
+            server.shutdown()
+
+        threading.Thread(target=exit_when_idle, daemon=True).start()
+        print(f"Serving on {path} ({media.status()['backend']})", file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            release()
+            media.close()
+    return True
+
+
+def request(payload: dict, path: Path | None = None) -> dict | None:
+    """Send one request and wait for its reply; None if no server is listening."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT_SECONDS)
+    try:
+        sock.connect(str(path or socket_path()))
+    except OSError:
+        sock.close()
+        return None
+    # Generation can take minutes; only connecting is bounded
+    sock.settimeout(None)
+    try:
+        with sock, sock.makefile("rwb") as stream:
+            stream.write(json.dumps(payload).encode() + b"\n")
+            stream.flush()
+            line = stream.readline()
+    except OSError:
+        line = b""
+    return json.loads(line) if line else {"error": "server closed the connection"}
+
+
+def submit(payload: dict) -> dict:
+    """Run a request on the server, raising its error as RuntimeError."""
+    response = request(payload)
+    if response is None:
+        raise RuntimeError(f"media server is not running at {socket_path()}")
+    if "error" in response:
+        raise RuntimeError(response["error"])
+    return response
+
+
+def start_server(argv: list[str] | None = None) -> None:
+    path = socket_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    script = str(Path(__file__).resolve())
+    # Run in this script's own environment: the caller's may lack pillow
+    # (gen_video.py) and would break image requests for every later client
+    if shutil.which("uv"):
+        cmd = ["uv", "run", "--script", script]
+    else:
+        cmd = [sys.executable, script]
+    with open(path.with_name(f"{path.name}.log"), "ab") as log:
+        subprocess.Popen(
+            [*cmd, *(argv or [])],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+
+
+def limit_args(limits: dict) -> list[str]:
+    """Command-line flags for limits keyed like the status reply."""
+    return [
+        arg
+        for key, value in limits.items()
+        for arg in (f"--{key.replace('_', '-')}", str(value))
+    ]
+
+
+def ensure_server(limits: dict | None = None) -> bool:
+    """Make sure a server is listening, starting one with these limits if needed.
+
+    limits maps status keys (concurrency, video_concurrency, rpm) to the
+    caller's values. A server that is already running keeps its own; the
+    caller is warned when they differ.
+    """
+    limits = limits or {}
+    status = request({"op": "status"})
+    if status is not None:
+        differ = {k: v for k, v in limits.items() if status.get(k) != v}
+        if differ:
+            print(
+                "Warning: media server is already running with "
+                + ", ".join(f"{k}={status.get(k)}" for k in differ)
+                + f"; ignoring {' '.join(limit_args(differ))} "
+                "(restart it with media_server.py --stop to change them)",
+                file=sys.stderr,
+            )
+        return True
+    start_server(limit_args(limits))
+    deadline = time.monotonic() + START_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        if request({"op": "status"}) is not None:
+            return True
+    return False
+
+
+def available(limits: dict | None = None) -> bool:
+    """Whether a CLI can go through the server; warns when it falls back."""
+    if ensure_server(limits):
+        return True
+    print(
+        f"Warning: media server did not start (see {socket_path()}.log); "
+        "generating in this process",
+        file=sys.stderr,
+    )
+    return False
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Local media-generation server for gen_image.py/gen_video.py",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument(
+        "--start", action="store_true", help="Start the server in the background"
+    )
+    action.add_argument(
+        "--status", action="store_true", help="Print the running server's status"
+    )
+    action.add_argument("--stop", action="store_true", help="Stop the running server")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Image requests generated at once (default: 4)",
+    )
+    parser.add_argument(
+        "--video-concurrency",
+        type=int,
+        default=4,
+        help="Video operations in flight at once (default: 4)",
+    )
+    parser.add_argument(
+        "--rpm",
+        type=float,
+        default=0,
+        help="API calls per minute across all callers (default: unlimited)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["genai", "stub"],
+        default="genai",
+        help="genai calls the API; stub writes placeholders (default: genai)",
+    )
+    parser.add_argument(
+        "--stub-delay",
+        type=float,
+        default=0.5,
+        help="Seconds each stub request takes (default: 0.5)",
+    )
+    perf.add_argument(parser)
+
+    args = parser.parse_args()
+    perf.start(args.profile)
+
+    if args.status or args.stop:
+        response = request({"op": "stop" if args.stop else "status"})
+        if response is None:
+            print(f"No media server at {socket_path()}", file=sys.stderr)
+            sys.exit(1)
+        print("Stopped" if args.stop else json.dumps(response, indent=2))
+        return
+
+    if request({"op": "status"}) is not None:
+        print(
+            f"Error: a media server is already running at {socket_path()}",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    if args.start:
+        argv = [
+            "--concurrency",
+            str(args.concurrency),
+            "--video-concurrency",
+            str(args.video_concurrency),
+            "--rpm",
+            str(args.rpm),
+            "--backend",
+            args.backend,
+            "--stub-delay",
+            str(args.stub_delay),
+        ]
+        start_server(argv)
+        deadline = time.monotonic() + START_TIMEOUT_SECONDS
+        while request({"op": "status"}) is None:
+            if time.monotonic() > deadline:
+                print(
+                    f"Error: server did not start; see {socket_path()}.log",
+                    file=sys.stderr,
+                )
+                sys.exit(1)
+            time.sleep(0.1)
+        print(f"Started media server at {socket_path()}")
+        return
+
+    backend = StubBackend(args.stub_delay) if args.backend == "stub" else GenAIBackend()
+    media = MediaServer(backend, args.concurrency, args.rpm, args.video_concurrency)
+    if not serve(media, socket_path()):
+        media.close()
+        print(
+            f"Error: a media server is already running at {socket_path()}",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
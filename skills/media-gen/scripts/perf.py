@@ -0,0 +1,284 @@
+"""Opt-in phase timing and profiling for skill scripts (standard library only).
+
+Scripts mark their key phases and enable this module from --profile or the
+SKILL_PROFILE environment variable:
+
+    import perf
+    perf.add_argument(parser)
+    args = parser.parse_args()
+    perf.start(args.profile)
+
+    with perf.phase("read"):
+        ...
+
+When enabled, a table of per-phase calls, wall time, CPU time (including
+waited-for subprocesses) and peak RSS goes to stderr at exit. The mode is a
+comma list; summary is always on:
+
+    summary   phase table only (what --profile or SKILL_PROFILE=1 give)
+    cprofile  cProfile stats in <script>-<pid>.prof (python -m pstats)
+    sample    stack samples every 5 ms in <script>-<pid>.folded, as
+              collapsed stacks for flamegraph.pl or speedscope
+    trace     Chrome trace JSON in <script>-<pid>.trace.json, one slice per
+              phase per thread (chrome://tracing or ui.perfetto.dev)
+
+Files go to SKILL_PROFILE_DIR (default: the current directory). When
+profiling is off, a phase costs one small object and a None check.
+
+Each skill ships its own copy of this file because skills are installed
+independently. hooks/perf.py is the reference: edit it, then run
+scripts/check_perf_copies.py --sync.
+"""
+
+import argparse
+import atexit
+import contextlib
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from pathlib import Path
+
+ENV = "SKILL_PROFILE"
+ENV_DIR = "SKILL_PROFILE_DIR"
+MODES = {"summary", "cprofile", "sample", "trace"}
+SAMPLE_INTERVAL = 0.005
+# ru_maxrss is KiB on Linux and bytes on macOS
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+class _Profile:
+    def __init__(self, modes: set[str]):
+        self.modes = modes
+        self.script = Path(sys.argv[0]).stem or "python"
+        self.lock = threading.Lock()
+        self.totals: dict[str, list[float]] = {}  # name -> [calls, wall, cpu, rss]
+        self.events: list[dict] = []
+        self.samples: dict[str, int] = {}
+        self.t0 = time.perf_counter()
+        self.cpu0 = cpu_time()
+        self.profiler = None
+        self.sampler = None
+        self.stop_sampling = threading.Event()
+
+    def record(self, name: str, start: float, wall: float, cpu: float) -> None:
+        rss = peak_rss()
+        with self.lock:
+            total = self.totals.setdefault(name, [0, 0.0, 0.0, 0])
+            total[0] += 1
+            total[1] += wall
+            total[2] += cpu
+            total[3] = max(total[3], rss)
+            if "trace" in self.modes:
+                self.events.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": round((start - self.t0) * 1e6, 1),
+                        "dur": round(wall * 1e6, 1),
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                        "args": {"cpu_ms": round(cpu * 1000, 3)},
+                    }
+                )
+
+
+_profile: _Profile | None = None
+
+
+def cpu_time() -> float:
+    """CPU seconds of this process plus its waited-for children."""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def peak_rss() -> int:
+    """Largest resident set so far, of this process or any child, in bytes."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * RSS_UNIT
+
+
+def parse_modes(value: str) -> set[str]:
+    """Modes from a --profile or SKILL_PROFILE value ("1" means summary)."""
+    modes = {m.strip() for m in value.split(",") if m.strip()} - {"1"}
+    unknown = modes - MODES
+    if unknown:
+        raise ValueError(
+            f"unknown profile mode {', '.join(sorted(unknown))} "
+            f"(choose from {', '.join(sorted(MODES))})"
+        )
+    return modes | {"summary"}
+
+
+def add_argument(parser: argparse.ArgumentParser) -> None:
+    def modes(value: str) -> set[str]:
+        try:
+            return parse_modes(value)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e)) from e
+
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="summary",
+        type=modes,
+        metavar="MODES",
+        help="Print per-phase timings at exit; MODES adds cprofile, sample "
+        "and/or trace output (default: $SKILL_PROFILE)",
+    )
+
+
+def start(modes: set[str] | str | None = None) -> bool:
+    """Enable profiling from --profile, else from SKILL_PROFILE.
+
+    Returns whether profiling is on. Safe to call more than once.
+    """
+    global _profile
+    if _profile:
+        return True
+    if modes is None:
+        value = os.environ.get(ENV, "")
+        if value in ("", "0"):
+            return False
+        modes = value
+    if isinstance(modes, str):
+        modes = parse_modes(modes)
+
+    _profile = _Profile(modes)
+    if "cprofile" in modes:
+        import cProfile
+
+        _profile.profiler = cProfile.Profile()
+        _profile.profiler.enable()
+    if "sample" in modes:
+        _profile.sampler = threading.Thread(
+            target=_sample, args=(_profile,), daemon=True, name="perf-sampler"
+        )
+        _profile.sampler.start()
+    atexit.register(_finish)
+    return True
+
+
+def enabled() -> bool:
+    return _profile is not None
+
+
+def phase_cpu() -> float:
+    """CPU clock for a phase: the whole process (and its waited-for children)
+    on the main thread, the thread's own time on any other thread, so phases
+    running concurrently in a pool don't count each other's work."""
+    if threading.current_thread() is threading.main_thread():
+        return cpu_time()
+    return time.thread_time()
+
+
+class phase(contextlib.ContextDecorator):
+    """Time a block (or, as a decorator, every call) under a phase name.
+
+    Phases may nest and run on several threads at once; each is timed on its
+    own, so nested time is counted in both the inner and the outer phase.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def _recreate_cm(self):
+        # A decorated function may run on several threads at once
+        return phase(self.name)
+
+    def __enter__(self):
+        if _profile:
+            self.start = time.perf_counter()
+            self.cpu = phase_cpu()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        profile = _profile
+        if profile and hasattr(self, "start"):
+            profile.record(
+                self.name,
+                self.start,
+                time.perf_counter() - self.start,
+                phase_cpu() - self.cpu,
+            )
+        return False
+
+
+def _sample(profile: _Profile) -> None:
+    """Collect collapsed stacks of every other thread until told to stop."""
+    me = threading.get_ident()
+    names = {}
+    while not profile.stop_sampling.wait(SAMPLE_INTERVAL):
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_filename, code.co_name)
+                label = names.get(key)
+                if label is None:
+                    label = names[key] = f"{Path(code.co_filename).name}:{code.co_name}"
+                stack.append(label)
+                frame = frame.f_back
+            line = ";".join(reversed(stack))
+            profile.samples[line] = profile.samples.get(line, 0) + 1
+
+
+def _finish() -> None:
+    profile = _profile
+    if profile is None:
+        return
+    wall = time.perf_counter() - profile.t0
+    cpu = cpu_time() - profile.cpu0
+    if profile.sampler:
+        profile.stop_sampling.set()
+        profile.sampler.join()
+    if profile.profiler:
+        profile.profiler.disable()
+
+    out_dir = Path(os.environ.get(ENV_DIR) or ".")
+    base = out_dir / f"{profile.script}-{os.getpid()}"
+    written = []
+    try:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        if profile.profiler:
+            profile.profiler.dump_stats(f"{base}.prof")
+            written.append(f"{base}.prof")
+        if profile.sampler:
+            with open(f"{base}.folded", "w") as f:
+                for stack, count in sorted(profile.samples.items()):
+                    f.write(f"{stack} {count}\n")
+            written.append(f"{base}.folded")
+        if "trace" in profile.modes:
+            meta = {"name": "process_name", "ph": "M", "pid": os.getpid()}
+            meta["args"] = {"name": profile.script}
+            with open(f"{base}.trace.json", "w") as f:
+                json.dump(
+                    {"traceEvents": [meta, *profile.events], "displayTimeUnit": "ms"},
+                    f,
+                )
+            written.append(f"{base}.trace.json")
+    except OSError as e:
+        print(f"profile: could not write output: {e}", file=sys.stderr)
+
+    lines = [
+        f"profile: {profile.script}  wall {wall:.3f}s  cpu {cpu:.3f}s  "
+        f"peak RSS {peak_rss() / 2**20:.1f} MB",
+    ]
+    if profile.totals:
+        lines.append(
+            f"  {'phase':<16} {'calls':>6} {'wall ms':>10} {'cpu ms':>10} {'peak MB':>9}"
+        )
+        for name, (calls, pwall, pcpu, rss) in sorted(
+            profile.totals.items(), key=lambda item: -item[1][1]
+        ):
+            lines.append(
+                f"  {name:<16} {calls:>6} {pwall * 1000:>10.1f} "
+                f"{pcpu * 1000:>10.1f} {rss / 2**20:>9.1f}"
+            )
+    lines += [f"  wrote {path}" for path in written]
+    print("\n".join(lines), file=sys.stderr)
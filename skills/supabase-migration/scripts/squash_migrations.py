@@ -0,0 +1,448 @@
+#!/usr/bin/env -S uv run
+# /// script
+# requires-python = ">=3.11"
+# dependencies = []
+# ///
+"""
+Squash a run of migrations into one baseline migration, verified against a replay.
+
+The migrations are replayed into a scratch database and dumped with pg_dump into
+a single baseline file: the schema, the rows the migrations inserted (as INSERT
+statements, sequence positions included), and any roles they created (from
+pg_dumpall --roles-only, without passwords). Roles are cluster-wide, so they are
+dropped again before the baseline is applied to a second scratch database; the
+two databases' catalogs, data and roles are then diffed. Only when they match
+are the squashed files moved to an archive directory and the baseline written as
+<last version>_squashed_baseline.sql. Keeping the last squashed version means
+environments that already ran the originals treat it as applied, and new
+migrations sort after it.
+
+Object names come straight from the database, so tb_/fn_/idx_/pc_ names are
+kept as they are.
+
+Usage:
+    uv run squash_migrations.py [options]
+
+Examples:
+    uv run squash_migrations.py --db-url postgres://postgres@localhost:5432/postgres
+    uv run squash_migrations.py --upto 20250101000000 --dry-run
+    uv run squash_migrations.py --prelude supabase/squash_prelude.sql
+    uv run squash_migrations.py --template tpl_platform --schema public --schema private
+
+Scratch databases are created with CREATE DATABASE ... TEMPLATE (template1 by
+default) on the server behind --db-url and dropped afterwards. Supabase
+migrations usually depend on platform objects (auth schema, anon/authenticated
+roles, extensions schema). Provide those with --prelude, or point --template at
+a database that already has them.
+"""
+
+import argparse
+import difflib
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+BASELINE_MARKER = "-- squash-baseline:"
+# The header build_baseline writes; lint_migration.py relaxes its rules after it
+BASELINE_HEADER = re.compile(
+    rf"^{re.escape(BASELINE_MARKER)} replaces \d+ migrations \S+\.sql \.\. \S+\.sql\n"
+    r"-- Source sha256: [0-9a-f]{64}\n"
+)
+
+# Schemas/extensions created by migrations, as opposed to the template and prelude
+SCHEMAS_SQL = """\
+SELECT nspname FROM pg_namespace
+WHERE nspname NOT LIKE 'pg\\_%' AND nspname <> 'information_schema'
+ORDER BY 1"""
+EXTENSIONS_SQL = "SELECT extname FROM pg_extension ORDER BY 1"
+ROLES_SQL = "SELECT rolname FROM pg_roles ORDER BY 1"
+
+# pg_dump noise that would make identical catalogs compare unequal
+DUMP_NOISE = re.compile(r"^(--.*|\\(un)?restrict .*|)$")
+RESTRICT_RE = re.compile(r"^\\(un)?restrict ")
+CREATE_SCHEMA_RE = re.compile(r"^CREATE SCHEMA (\S+);$")
+# pg_dumpall --roles-only statements, keyed by the role they configure
+IDENT = r'("(?:[^"]|"")*"|[^\s";]+)'
+ROLE_RE = re.compile(rf"^(?:CREATE|ALTER) ROLE {IDENT}[\s;]")
+MEMBERSHIP_RE = re.compile(rf"^GRANT {IDENT} TO {IDENT}[\s;]")
+GRANTED_BY_RE = re.compile(r" GRANTED BY \S+;$")
+
+
+def psql(db_url: str, sql: str) -> str:
+    result = subprocess.run(
+        [
+            "psql",
+            db_url,
+            "--no-psqlrc",
+            "--quiet",
+            "--tuples-only",
+            "--no-align",
+            "-v",
+            "ON_ERROR_STOP=1",
+            "-c",
+            sql,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return result.stdout.strip()
+
+
+def apply_files(db_url: str, files: list[Path]) -> float:
+    """Apply SQL files in order in one psql session; return elapsed seconds."""
+    script = "".join(f"\\echo {f.name}\n\\i '{f.resolve()}'\n" for f in files)
+    started = time.perf_counter()
+    result = subprocess.run(
+        ["psql", db_url, "--no-psqlrc", "--quiet", "-v", "ON_ERROR_STOP=1", "-f", "-"],
+        input=script,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        # The last echoed file name is the one that failed
+        applied = result.stdout.strip().splitlines()
+        failed = applied[-1] if applied else "?"
+        raise RuntimeError(f"{failed}: {result.stderr.strip()}")
+    return time.perf_counter() - started
+
+
+def with_database(db_url: str, dbname: str) -> str:
+    parts = urlsplit(db_url)
+    return urlunsplit(parts._replace(path=f"/{dbname}"))
+
+
+@contextmanager
+def scratch_database(admin_url: str, name: str, template: str):
+    """Create a throwaway database from a template, yield its URL, drop it after."""
+    psql(admin_url, f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+    psql(admin_url, f'CREATE DATABASE "{name}" TEMPLATE "{template}"')
+    try:
+        yield with_database(admin_url, name)
+    finally:
+        psql(admin_url, f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+
+
+def catalog_names(db_url: str) -> tuple[set[str], set[str]]:
+    schemas = set(psql(db_url, SCHEMAS_SQL).splitlines())
+    extensions = set(psql(db_url, EXTENSIONS_SQL).splitlines())
+    return schemas, extensions
+
+
+def role_names(db_url: str) -> set[str]:
+    return set(psql(db_url, ROLES_SQL).splitlines())
+
+
+def drop_roles(admin_url: str, roles: set[str]) -> None:
+    if roles:
+        names = ", ".join('"' + r.replace('"', '""') + '"' for r in sorted(roles))
+        psql(admin_url, f"DROP ROLE IF EXISTS {names}")
+
+
+def pg_dump(db_url: str, args: list[str] = (), data: bool = False) -> str:
+    """Schema-only dump, or with data set the rows as one INSERT per row."""
+    section = ["--data-only", "--column-inserts"] if data else ["--schema-only"]
+    result = subprocess.run(
+        ["pg_dump", *section, "--no-owner", *args, db_url],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return result.stdout
+
+
+def dump_roles(db_url: str, roles: set[str]) -> list[str]:
+    """pg_dumpall statements that create, configure or grant the given roles."""
+    if not roles:
+        return []
+    result = subprocess.run(
+        ["pg_dumpall", "--roles-only", "--no-role-passwords", "-d", db_url],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+
+    def named(ident: str) -> bool:
+        if ident.startswith('"'):
+            ident = ident[1:-1].replace('""', '"')
+        return ident in roles
+
+    lines = []
+    for line in result.stdout.splitlines():
+        role = ROLE_RE.match(line)
+        member = MEMBERSHIP_RE.match(line)
+        if (role and named(role[1])) or (
+            member and (named(member[1]) or named(member[2]))
+        ):
+            lines.append(line)
+    return lines
+
+
+def normalize_dump(text: str) -> list[str]:
+    """Dump lines with comments, blank lines and per-run tokens removed."""
+    return [line for line in text.splitlines() if not DUMP_NOISE.match(line)]
+
+
+def dump_body(dump: str, settings: bool) -> str:
+    """pg_dump output minus \\restrict lines, with its leading SETs made local.
+
+    With settings false those SETs are dropped instead, for a dump that follows
+    another one in the same transaction.
+    """
+    body = []
+    in_header = True
+    for line in dump.splitlines():
+        if RESTRICT_RE.match(line):
+            continue
+        if in_header:
+            # Keep pg_dump's session settings inside this migration's transaction
+            if line.startswith("-- Dumped"):
+                continue
+            if line == "SELECT pg_catalog.set_config('search_path', '', false);":
+                line = "SET LOCAL search_path = '';"
+            elif line.startswith("SET "):
+                line = "SET LOCAL " + line[4:]
+            elif line and not line.startswith("--"):
+                in_header = False
+            if in_header and line.startswith("SET LOCAL ") and not settings:
+                continue
+        # public (and platform schemas) may already exist where this runs
+        line = CREATE_SCHEMA_RE.sub(r"CREATE SCHEMA IF NOT EXISTS \1;", line)
+        body.append(line)
+    return "\n".join(body).strip()
+
+
+def build_baseline(schema: str, data: str, roles: list[str], files: list[Path]) -> str:
+    """Wrap the dumps in one transaction with the baseline marker header."""
+    digest = hashlib.sha256()
+    for f in files:
+        digest.update(f.name.encode())
+        digest.update(f.read_bytes())
+
+    sections = []
+    if roles:
+        # Roles are cluster-wide and may already exist where this runs
+        statements = []
+        for line in roles:
+            if line.startswith("CREATE ROLE "):
+                line = (
+                    f"DO $$ BEGIN {line} "
+                    "EXCEPTION WHEN duplicate_object THEN NULL; END $$;"
+                )
+            statements.append(GRANTED_BY_RE.sub(";", line))
+        sections.append("--\n-- Roles\n--\n\n" + "\n".join(statements))
+    sections.append(dump_body(schema, settings=True))
+    data = dump_body(data, settings=False)
+    if any(line and not line.startswith("--") for line in data.splitlines()):
+        sections.append(data)
+    text = "\n\n".join(sections)
+
+    return (
+        f"{BASELINE_MARKER} replaces {len(files)} migrations "
+        f"{files[0].name} .. {files[-1].name}\n"
+        f"-- Source sha256: {digest.hexdigest()}\n"
+        f"-- Generated by squash_migrations.py on {datetime.now():%Y-%m-%d}. "
+        "Do not edit; add new migrations after this file.\n\n"
+        f"BEGIN;\n\n{text}\n\nCOMMIT;\n"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Squash migrations into a verified baseline migration",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument(
+        "--dir",
+        "-d",
+        type=Path,
+        default=Path("supabase/migrations"),
+        help="Migrations directory (default: supabase/migrations)",
+    )
+    parser.add_argument(
+        "--upto",
+        help="Squash migrations up to and including this version (default: all)",
+    )
+    parser.add_argument(
+        "--db-url",
+        default=os.environ.get("DATABASE_URL"),
+        help="Server to create scratch databases on (default: $DATABASE_URL)",
+    )
+    parser.add_argument(
+        "--template",
+        default="template1",
+        help="Template for the scratch databases (default: template1)",
+    )
+    parser.add_argument(
+        "--prelude",
+        type=Path,
+        help="SQL applied to both scratch databases first (platform roles/schemas)",
+    )
+    parser.add_argument(
+        "--schema",
+        action="append",
+        help="Schema to put in the baseline; repeatable "
+        "(default: public plus schemas the migrations create)",
+    )
+    parser.add_argument(
+        "--archive-dir",
+        type=Path,
+        help="Where squashed files are moved (default: <dir>/../migrations_archive)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Build and verify the baseline without writing or moving files",
+    )
+
+    args = parser.parse_args()
+
+    if not args.db_url:
+        print(
+            "Error: No database URL. Set DATABASE_URL or use --db-url", file=sys.stderr
+        )
+        sys.exit(1)
+    for tool in ("psql", "pg_dump", "pg_dumpall"):
+        if not shutil.which(tool):
+            print(f"Error: {tool} not found", file=sys.stderr)
+            sys.exit(1)
+
+    files = sorted(args.dir.glob("*.sql"))
+    if args.upto:
+        files = [f for f in files if f.name.split("_", 1)[0] <= args.upto]
+    if len(files) < 2:
+        print(f"Nothing to squash: {len(files)} migration(s) in {args.dir}")
+        sys.exit(0)
+
+    prelude = [args.prelude] if args.prelude else []
+    tag = os.getpid()
+    new_roles = set()
+    try:
+        with scratch_database(
+            args.db_url, f"squash_{tag}_history", args.template
+        ) as history_url:
+            apply_files(history_url, prelude)
+            base_schemas, base_extensions = catalog_names(history_url)
+            base_roles = role_names(history_url)
+
+            print(f"Replaying {len(files)} migrations...")
+            history_s = apply_files(history_url, files)
+            schemas, extensions = catalog_names(history_url)
+            new_roles = role_names(history_url) - base_roles
+
+            keep = args.schema or sorted(
+                (schemas - base_schemas) | ({"public"} & schemas)
+            )
+            dump_args = [arg for s in keep for arg in ("--schema", s)]
+            roles = dump_roles(history_url, new_roles)
+            baseline = build_baseline(
+                pg_dump(
+                    history_url,
+                    dump_args
+                    + [
+                        arg
+                        for e in sorted(extensions - base_extensions)
+                        for arg in ("--extension", e)
+                    ],
+                ),
+                pg_dump(history_url, dump_args, data=True),
+                roles,
+                files,
+            )
+
+            # Data anywhere in the database, so rows written outside the
+            # dumped schemas show up as a difference
+            expected = (
+                normalize_dump(pg_dump(history_url))
+                + sorted(normalize_dump(pg_dump(history_url, data=True)))
+                + roles
+            )
+
+        # Verify on a cluster without the history's roles, as a fresh one is
+        drop_roles(args.db_url, new_roles)
+        with scratch_database(
+            args.db_url, f"squash_{tag}_baseline", args.template
+        ) as baseline_url:
+            apply_files(baseline_url, prelude)
+            baseline_file = args.dir / f".squash_{tag}.sql"
+            baseline_file.write_text(baseline)
+            try:
+                print("Applying baseline...")
+                baseline_s = apply_files(baseline_url, [baseline_file])
+            finally:
+                baseline_file.unlink()
+
+            actual = (
+                normalize_dump(pg_dump(baseline_url))
+                + sorted(normalize_dump(pg_dump(baseline_url, data=True)))
+                + dump_roles(baseline_url, new_roles)
+            )
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        # Leave the cluster's roles as they were before the replay
+        try:
+            drop_roles(args.db_url, new_roles)
+        except RuntimeError as e:
+            print(f"Warning: could not drop scratch roles: {e}", file=sys.stderr)
+
+    if expected != actual:
+        diff = list(
+            difflib.unified_diff(
+                expected, actual, "history", "baseline", lineterm="", n=1
+            )
+        )
+        print("\n".join(diff[:200]))
+        if len(diff) > 200:
+            print(f"... {len(diff) - 200} more diff lines")
+        print(
+            "\nError: baseline differs from the replayed history. Objects and "
+            "rows outside the dumped schemas (e.g. triggers on auth.users) are "
+            "not squashed; try --schema or keep them in a later migration.",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+
+    print(
+        f"Verified: catalogs, data and roles match ({len(expected)} dump lines, "
+        f"schemas: {', '.join(keep)}"
+        + (f", roles: {', '.join(sorted(new_roles))})" if new_roles else ")")
+    )
+    print(
+        f"Apply time: {history_s:.2f}s for {len(files)} migrations -> "
+        f"{baseline_s:.2f}s for the baseline"
+    )
+
+    version = files[-1].name.split("_", 1)[0]
+    target = args.dir / f"{version}_squashed_baseline.sql"
+    archive_dir = args.archive_dir or args.dir.parent / "migrations_archive"
+    if args.dry_run:
+        print(
+            f"[DRY RUN] Would archive {len(files)} file(s) to {archive_dir} "
+            f"and write {target}"
+        )
+        return
+
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    for f in files:
+        f.rename(archive_dir / f.name)
+    target.write_text(baseline)
+    print(f"Archived {len(files)} file(s) to {archive_dir}")
+    print(f"Created: {target}")
+
+
+if __name__ == "__main__":
+    main()
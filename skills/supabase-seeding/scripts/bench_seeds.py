@@ -0,0 +1,409 @@
+#!/usr/bin/env -S uv run
+# /// script
+# requires-python = ">=3.11"
+# dependencies = []
+# ///
+"""
+Benchmark generate_seed.py and run_seeds.py against a throwaway PostgreSQL.
+
+Every variant generates a seed file for a few bench tables, loads it with
+run_seeds.py into freshly created tables and records generation rows/s, load
+rows/s, file size and peak RSS of each step.
+
+Usage:
+    uv run bench_seeds.py [options]
+
+Examples:
+    uv run bench_seeds.py                                  # temp initdb cluster
+    uv run bench_seeds.py --supabase                       # local supabase start
+    uv run bench_seeds.py --db-url postgres://localhost/bench
+    uv run bench_seeds.py --rows 10000,100000 --formats insert,copy --batch-sizes 500,5000
+    uv run bench_seeds.py --jobs 1,4 --output bench.json
+    uv run bench_seeds.py --baseline bench.json --tolerance 0.2   # fail on regressions
+
+Tables are created in a dedicated `bench` schema that is dropped and recreated
+for every variant, so an existing database is never touched outside of it.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from pg_common import psql
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+BENCH_COLUMNS = [
+    {"name": "id", "type": "uuid"},
+    {"name": "name", "type": "text"},
+    {"name": "email", "type": "text"},
+    {"name": "total_amt", "type": "numeric"},
+    {"name": "status_cd", "type": "text"},
+    {"name": "note_txt", "type": "text"},
+    {"name": "created_at", "type": "timestamptz"},
+]
+
+TABLE_DDL = """\
+CREATE TABLE bench.tb_bench_{n} (
+    id uuid PRIMARY KEY,
+    name text,
+    email text,
+    total_amt numeric,
+    status_cd text,
+    note_txt text,
+    created_at timestamptz
+);
+"""
+
+
+def script_cmd(script: str) -> list[str]:
+    """Command prefix for running a sibling uv script."""
+    if shutil.which("uv"):
+        return ["uv", "run", "--script", str(SCRIPTS_DIR / script)]
+    return [sys.executable, str(SCRIPTS_DIR / script)]
+
+
+def run_measured(cmd: list[str], stdout=subprocess.DEVNULL) -> dict:
+    """Run a command and return its wall time, exit code and peak RSS."""
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=stdout, stderr=subprocess.PIPE)
+    stderr = proc.stderr.read()
+    # wait4 gives this child's own rusage instead of the RUSAGE_CHILDREN total
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return {
+        "wall_s": time.perf_counter() - started,
+        "returncode": proc.returncode,
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),  # KiB on Linux
+        "stderr": stderr.decode(errors="replace")[-2000:],
+    }
+
+
+def free_port() -> int:
+    """A TCP port nothing is bound to right now, picked by the kernel."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def temp_cluster(port: int = 0):
+    """Start a throwaway cluster from a temp data directory, yield its URL.
+
+    Port 0 picks a free port, so overlapping runs and a local server on the
+    usual ports don't collide.
+    """
+    for tool in ("initdb", "pg_ctl"):
+        if not shutil.which(tool):
+            raise RuntimeError(f"{tool} not found; use --db-url or --supabase")
+
+    with tempfile.TemporaryDirectory(prefix="bench_seeds_") as tmp:
+        data_dir = Path(tmp) / "data"
+        subprocess.run(
+            [
+                "initdb",
+                "-D",
+                str(data_dir),
+                "-U",
+                "postgres",
+                "--auth=trust",
+                "--no-sync",
+            ],
+            check=True,
+            capture_output=True,
+        )
+        port = port or free_port()
+        options = f"-p {port} -k {tmp} -c listen_addresses='' -c fsync=off"
+        subprocess.run(
+            [
+                "pg_ctl",
+                "-D",
+                str(data_dir),
+                "-o",
+                options,
+                "-l",
+                str(Path(tmp) / "postgres.log"),
+                "-w",
+                "start",
+            ],
+            check=True,
+            capture_output=True,
+        )
+        try:
+            yield f"postgresql://postgres@/postgres?host={tmp}&port={port}"
+        finally:
+            subprocess.run(
+                ["pg_ctl", "-D", str(data_dir), "-m", "fast", "-w", "stop"],
+                capture_output=True,
+            )
+
+
+@contextmanager
+def supabase_db():
+    """Make sure the local Supabase stack is running and yield its DB URL."""
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    from run_seeds import get_db_url
+
+    subprocess.run(["supabase", "start"], check=True)
+    db_url = get_db_url()
+    if not db_url:
+        raise RuntimeError("could not read DB_URL from supabase status")
+    yield db_url
+
+
+def generate_variant(
+    workdir: Path, fmt: str, batch_size: int, rows: int, tables: int
+) -> tuple[Path, dict]:
+    """Generate one seed file holding `rows` rows spread over `tables` tables."""
+    seed_dir = workdir / "seed"
+    seed_dir.mkdir(parents=True, exist_ok=True)
+    seed_file = seed_dir / "01_bench.sql"
+    per_table = rows // tables
+
+    wall = 0.0
+    peak_rss = 0.0
+    with open(seed_file, "w") as out:
+        for n in range(1, tables + 1):
+            part = workdir / f"part_{n}.sql"
+            cmd = [
+                *script_cmd("generate_seed.py"),
+                f"bench.tb_bench_{n}",
+                "--count",
+                str(per_table),
+                "--columns",
+                json.dumps(BENCH_COLUMNS),
+                "--format",
+                fmt,
+                "--output",
+                str(part),
+            ]
+            if fmt == "insert":
+                cmd += ["--batch-size", str(batch_size)]
+            step = run_measured(cmd)
+            if step["returncode"] != 0:
+                raise RuntimeError(f"generate_seed.py failed: {step['stderr']}")
+            wall += step["wall_s"]
+            peak_rss = max(peak_rss, step["peak_rss_mb"])
+            out.write(part.read_text() + "\n")
+            part.unlink()
+
+    return seed_file, {
+        "rows": per_table * tables,
+        "wall_s": round(wall, 3),
+        "rows_per_s": round(per_table * tables / wall, 1) if wall else None,
+        "file_mb": round(seed_file.stat().st_size / 1024 / 1024, 2),
+        "peak_rss_mb": peak_rss,
+    }
+
+
+def load_variant(
+    db_url: str, seed_file: Path, rows: int, tables: int, jobs: int, chunk_mb: float
+) -> dict:
+    """Load a generated seed file with run_seeds.py into fresh bench tables."""
+    ddl = "".join(TABLE_DDL.format(n=n) for n in range(1, tables + 1))
+    psql(db_url, f"DROP SCHEMA IF EXISTS bench CASCADE; CREATE SCHEMA bench; {ddl}")
+
+    metrics = seed_file.with_suffix(".metrics.jsonl")
+    metrics.unlink(missing_ok=True)
+    cmd = [
+        *script_cmd("run_seeds.py"),
+        str(seed_file.parent),
+        "--db-url",
+        db_url,
+        "--no-ledger",
+        "--no-progress",
+        "--stop-on-error",
+        "--metrics",
+        str(metrics),
+    ]
+    if jobs > 1:
+        cmd += ["--jobs", str(jobs), "--chunk-mb", str(chunk_mb)]
+    step = run_measured(cmd)
+    if step["returncode"] != 0:
+        raise RuntimeError(f"run_seeds.py failed: {step['stderr']}")
+
+    loaded = sum(
+        int(psql(db_url, f"SELECT count(*) FROM bench.tb_bench_{n}"))
+        for n in range(1, tables + 1)
+    )
+    if loaded != rows:
+        raise RuntimeError(f"expected {rows} rows, found {loaded}")
+
+    db_ms = sum(
+        record["db_ms"]
+        for record in map(json.loads, metrics.read_text().splitlines())
+        if record["event"] == "file"
+    )
+    return {
+        "wall_s": round(step["wall_s"], 3),
+        "db_s": round(db_ms / 1000, 3),
+        "rows_per_s": round(rows / step["wall_s"], 1),
+        "peak_rss_mb": step["peak_rss_mb"],
+    }
+
+
+def variant_key(result: dict) -> tuple:
+    return (result["format"], result["batch_size"], result["rows"], result["jobs"])
+
+
+def find_regressions(
+    results: list[dict], baseline: list[dict], tolerance: float
+) -> list[str]:
+    """Compare rows/s of matching variants against a previous run."""
+    previous = {variant_key(r): r for r in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(variant_key(result))
+        if not old:
+            continue
+        for step in ("generate", "load"):
+            before, after = old[step]["rows_per_s"], result[step]["rows_per_s"]
+            if before and after and after < before * (1 - tolerance):
+                regressions.append(
+                    f"{step} {variant_key(result)}: "
+                    f"{before:,.0f} -> {after:,.0f} rows/s"
+                )
+    return regressions
+
+
+def parse_list(value: str, cast=int) -> list:
+    return [cast(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the seed generation and loading pipeline",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--db-url", help="Use an existing database")
+    target.add_argument(
+        "--supabase", action="store_true", help="Use the local `supabase start` stack"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=0,
+        help="Port for the temporary cluster (default: a free one)",
+    )
+    parser.add_argument(
+        "--rows", default="10000,100000", help="Row counts (default: 10000,100000)"
+    )
+    parser.add_argument(
+        "--formats", default="insert,copy", help="Output formats (default: insert,copy)"
+    )
+    parser.add_argument(
+        "--batch-sizes",
+        default="1000,10000",
+        help="Rows per INSERT statement (default: 1000,10000; ignored for copy)",
+    )
+    parser.add_argument(
+        "--jobs", default="1", help="run_seeds.py --jobs values (default: 1)"
+    )
+    parser.add_argument(
+        "--tables", type=int, default=4, help="Bench tables per seed file (default: 4)"
+    )
+    parser.add_argument(
+        "--chunk-mb",
+        type=float,
+        default=1.0,
+        help="Chunk size used for --jobs > 1 (default: 1)",
+    )
+    parser.add_argument("--output", "-o", type=Path, help="Write results JSON here")
+    parser.add_argument(
+        "--baseline", type=Path, help="Previous results JSON to compare against"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed rows/s drop vs baseline before failing (default: 0.2)",
+    )
+
+    args = parser.parse_args()
+
+    if not shutil.which("psql"):
+        print("Error: psql not found", file=sys.stderr)
+        sys.exit(1)
+
+    formats = parse_list(args.formats, str)
+    variants = []
+    for fmt, rows, jobs in itertools.product(
+        formats, parse_list(args.rows), parse_list(args.jobs)
+    ):
+        batch_sizes = parse_list(args.batch_sizes) if fmt == "insert" else [None]
+        variants += [(fmt, batch, rows, jobs) for batch in batch_sizes]
+
+    if args.db_url:
+
+        @contextmanager
+        def database():
+            yield args.db_url
+
+    else:
+        database = supabase_db if args.supabase else lambda: temp_cluster(args.port)
+
+    results = []
+    try:
+        with database() as db_url, tempfile.TemporaryDirectory() as tmp:
+            for fmt, batch, rows, jobs in variants:
+                label = f"{fmt:6} batch={batch or '-':<6} rows={rows:<8} jobs={jobs}"
+                print(f"{label} ...", end="", flush=True)
+                workdir = Path(tmp) / f"{fmt}_{batch}_{rows}_{jobs}"
+                seed_file, gen = generate_variant(
+                    workdir, fmt, batch, rows, args.tables
+                )
+                load = load_variant(
+                    db_url, seed_file, gen["rows"], args.tables, jobs, args.chunk_mb
+                )
+                shutil.rmtree(workdir)
+                results.append(
+                    {
+                        "format": fmt,
+                        "batch_size": batch,
+                        "rows": gen["rows"],
+                        "jobs": jobs,
+                        "generate": gen,
+                        "load": load,
+                    }
+                )
+                print(
+                    f" gen {gen['rows_per_s']:>10,.0f} rows/s"
+                    f"  load {load['rows_per_s']:>10,.0f} rows/s"
+                    f"  {gen['file_mb']:>7.2f} MB"
+                    f"  rss {max(gen['peak_rss_mb'], load['peak_rss_mb']):.0f} MB"
+                )
+            psql(db_url, "DROP SCHEMA IF EXISTS bench CASCADE")
+    except (RuntimeError, subprocess.CalledProcessError) as e:
+        print(f"\nError: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(report + "\n")
+        print(f"\nResults -> {args.output}")
+    else:
+        print(report)
+
+    if args.baseline:
+        regressions = find_regressions(
+            results, json.loads(args.baseline.read_text()), args.tolerance
+        )
+        for line in regressions:
+            print(f"REGRESSION: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,8 @@ Examples:
     uv run generate_seed.py tb_users --count 100
     uv run generate_seed.py tb_products --count 50 --output seed/03_products.sql
     uv run generate_seed.py tb_orders --template orders.json
+    uv run generate_seed.py tb_events --count 100000 --format copy -o seed/04_events.sql
+    uv run generate_seed.py tb_events --count 100000 --batch-size 1000
 """
 
 import argparse
@@ -22,9 +24,12 @@ import json
 import sys
 import uuid
 from pathlib import Path
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-from faker import Faker
+import perf
+
+if TYPE_CHECKING:
+    from faker import Faker
 
 
 def generate_uuid() -> str:
@@ -32,7 +37,12 @@ def generate_uuid() -> str:
     return str(uuid.uuid4())
 
 
-def generate_value(column_name: str, column_type: str, fake: Faker | None = None) -> str:
+def quote(value: str) -> str:
+    """Quote a string as a SQL literal."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def generate_value(column_name: str, column_type: str, fake: "Faker | None" = None) -> str:
     """Generate a fake value based on column name and type."""
     name_lower = column_name.lower()
 
@@ -47,25 +57,25 @@ def generate_value(column_name: str, column_type: str, fake: Faker | None = None
     # Dates
     if name_lower.endswith("_dt"):
         if fake:
-            return f"'{fake.date()}'"
+            return quote(fake.date())
         return "'2024-01-01'"
 
     # Email
     if name_lower == "email" or name_lower.endswith("_em"):
         if fake:
-            return f"'{fake.email()}'"
+            return quote(fake.email())
         return "'user@example.com'"
 
     # Phone
     if name_lower.endswith("_pn"):
         if fake:
-            return f"'{fake.phone_number()[:20]}'"
+            return quote(fake.phone_number()[:20])
         return "'+1234567890'"
 
     # Name fields
     if name_lower == "name" or "name" in name_lower:
         if fake:
-            return f"'{fake.name()}'"
+            return quote(fake.name())
         return "'Test Name'"
 
     # Boolean
@@ -93,7 +103,7 @@ def generate_value(column_name: str, column_type: str, fake: Faker | None = None
     # Text
     if name_lower.endswith("_txt"):
         if fake:
-            return f"'{fake.sentence()[:100]}'"
+            return quote(fake.sentence()[:100])
         return "'Sample text'"
 
     # Path
@@ -114,23 +124,76 @@ def generate_value(column_name: str, column_type: str, fake: Faker | None = None
     return "NULL"
 
 
+def generate_rows(columns: list[dict], count: int, use_faker: bool = True):
+    """Yield one list of SQL literal values per generated row."""
+    # Imported here so --no-faker runs never load it
+    if use_faker:
+        from faker import Faker
+
+        fake = Faker()
+    else:
+        fake = None
+    for i in range(count):
+        if fake:
+            fake.seed_instance(i)  # Reproducible
+        yield [generate_value(c["name"], c["type"], fake) for c in columns]
+
+
 def generate_insert(
-    table_name: str, columns: list[dict], count: int, use_faker: bool = True
+    table_name: str,
+    columns: list[dict],
+    count: int,
+    use_faker: bool = True,
+    batch_size: int | None = None,
 ) -> str:
-    """Generate INSERT statements for a table."""
-    fake = Faker() if use_faker else None
-
+    """Generate INSERT statements for a table, batch_size rows per statement."""
     col_names = [c["name"] for c in columns]
     header = f"INSERT INTO {table_name} ({', '.join(col_names)}) VALUES"
 
+    def statement(rows: list[str]) -> str:
+        values_sql = ",\n".join(rows)
+        return f"{header}\n{values_sql}\nON CONFLICT DO NOTHING;"
+
+    statements = []
     rows = []
-    for i in range(count):
-        if fake:
-            fake.seed_instance(i)  # Reproducible
-        values = [generate_value(c["name"], c["type"], fake) for c in columns]
+    for values in generate_rows(columns, count, use_faker):
         rows.append(f"    ({', '.join(values)})")
+        if batch_size and len(rows) == batch_size:
+            statements.append(statement(rows))
+            rows = []
+    if rows or not statements:
+        statements.append(statement(rows))
+
+    return "\n\n".join(statements)
+
+
+def to_copy_value(literal: str) -> str:
+    """Convert a SQL literal from generate_value to COPY text format."""
+    if literal == "NULL":
+        return "\\N"
+    if literal == "CURRENT_TIMESTAMP":
+        return "now"
+    if literal.startswith("'"):
+        text = literal[1:-1].replace("''", "'")
+        return (
+            text.replace("\\", "\\\\")
+            .replace("\t", "\\t")
+            .replace("\n", "\\n")
+            .replace("\r", "\\r")
+        )
+    return literal
+
 
-    return f"{header}\n{',\n'.join(rows)}\nON CONFLICT DO NOTHING;"
+def generate_copy(
+    table_name: str, columns: list[dict], count: int, use_faker: bool = True
+) -> str:
+    """Generate a COPY ... FROM stdin block for a table."""
+    col_names = [c["name"] for c in columns]
+    lines = [f"COPY {table_name} ({', '.join(col_names)}) FROM stdin;"]
+    for values in generate_rows(columns, count, use_faker):
+        lines.append("\t".join(to_copy_value(v) for v in values))
+    lines.append("\\.")
+    return "\n".join(lines)
 
 
 def main():
@@ -160,8 +223,23 @@ def main():
     parser.add_argument(
         "--wrap-transaction", action="store_true", help="Wrap output in BEGIN/COMMIT"
     )
+    parser.add_argument(
+        "--format",
+        "-f",
+        choices=["insert", "copy"],
+        default="insert",
+        help="INSERT statements or a COPY FROM stdin block (default: insert)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        "-b",
+        type=int,
+        help="Rows per INSERT statement (default: all rows in one statement)",
+    )
 
+    perf.add_argument(parser)
     args = parser.parse_args()
+    perf.start(args.profile)
 
     if not args.table_name:
         parser.print_help()
@@ -190,20 +268,31 @@ def main():
         )
 
     # Generate SQL
-    sql = generate_insert(
-        args.table_name, columns, args.count, use_faker=not args.no_faker
-    )
+    with perf.phase("generate"):
+        if args.format == "copy":
+            sql = generate_copy(
+                args.table_name, columns, args.count, use_faker=not args.no_faker
+            )
+        else:
+            sql = generate_insert(
+                args.table_name,
+                columns,
+                args.count,
+                use_faker=not args.no_faker,
+                batch_size=args.batch_size,
+            )
 
     if args.wrap_transaction:
         sql = f"BEGIN;\n\n{sql}\n\nCOMMIT;"
 
     # Output
-    if args.output:
-        args.output.parent.mkdir(parents=True, exist_ok=True)
-        args.output.write_text(sql)
-        print(f"Generated {args.count} rows -> {args.output}")
-    else:
-        print(sql)
+    with perf.phase("write"):
+        if args.output:
+            args.output.parent.mkdir(parents=True, exist_ok=True)
+            args.output.write_text(sql)
+            print(f"Generated {args.count} rows -> {args.output}")
+        else:
+            print(sql)
 
 
 if __name__ == "__main__":
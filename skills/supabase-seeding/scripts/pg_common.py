@@ -0,0 +1,58 @@
+"""Shared psql helpers for the supabase-seeding scripts that manage databases.
+
+template_db.py and bench_seeds.py create, fill and drop databases through
+these; the supabase-migration skill keeps its own copy in squash_migrations.py
+because the two skills are installed independently.
+"""
+
+import subprocess
+import time
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+
+def psql(db_url: str, sql: str) -> str:
+    """Run SQL and return its unaligned output, raising RuntimeError on error."""
+    result = subprocess.run(
+        [
+            "psql",
+            db_url,
+            "--no-psqlrc",
+            "--quiet",
+            "--tuples-only",
+            "--no-align",
+            "-v",
+            "ON_ERROR_STOP=1",
+            "-c",
+            sql,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return result.stdout.strip()
+
+
+def apply_files(db_url: str, files: list[Path]) -> float:
+    """Apply SQL files in order in one psql session; return elapsed seconds."""
+    script = "".join(f"\\echo {f.name}\n\\i '{f.resolve()}'\n" for f in files)
+    started = time.perf_counter()
+    result = subprocess.run(
+        ["psql", db_url, "--no-psqlrc", "--quiet", "-v", "ON_ERROR_STOP=1", "-f", "-"],
+        input=script,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        # The last echoed file name is the one that failed
+        applied = result.stdout.strip().splitlines()
+        failed = applied[-1] if applied else "?"
+        raise RuntimeError(f"{failed}: {result.stderr.strip()}")
+    return time.perf_counter() - started
+
+
+def with_database(db_url: str, dbname: str) -> str:
+    """The same server URL pointed at another database."""
+    parts = urlsplit(db_url)
+    return urlunsplit(parts._replace(path=f"/{dbname}"))
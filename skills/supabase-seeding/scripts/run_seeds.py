@@ -14,14 +14,115 @@ Examples:
     uv run run_seeds.py supabase/seed/ --db-url postgres://localhost/mydb
     uv run run_seeds.py supabase/seed/ --pattern "01_*.sql"
     uv run run_seeds.py supabase/seed/ --dry-run
+    uv run run_seeds.py supabase/seed/ --isolated
+    uv run run_seeds.py supabase/seed/ --status
+    uv run run_seeds.py supabase/seed/ --force
+    uv run run_seeds.py supabase/seed/ --metrics seed-metrics.jsonl
+    uv run run_seeds.py supabase/seed/ --chunk-mb 64 --resume --jobs 4
+
+By default all files are streamed through one psql session, each file in its
+own transaction, so a failing file rolls back without touching the others. The
+session is reset between files, so settings, roles, temp tables and psql
+variables one file sets don't carry into the next.
+--isolated starts a separate psql process per file instead.
+
+Applied files are recorded with their SHA-256 in private.tb_seed_ledger.
+Unchanged files are skipped on the next run and changed files are re-applied;
+--force re-applies everything and --no-ledger leaves the database untouched.
+
+With --chunk-mb, larger files are split into statement-aligned chunks (quotes,
+comments, dollar-quoting and COPY data respected) and each chunk commits on its
+own together with a checkpoint in private.tb_seed_chunks. The file's own
+BEGIN/COMMIT are dropped. --resume continues after the last committed chunk and
+--jobs loads chunks for different tables in parallel; only use it when those
+tables don't reference each other.
+
+While a file runs, a live line on stderr shows bytes sent, statements, rows,
+rows/s and ETA. --metrics appends one JSON object per file (wall and DB time,
+rows/s, slowest statements) plus a final run summary.
 """
 
 import argparse
+import hashlib
+import heapq
 import json
 import os
+import queue
+import re
+import shutil
 import subprocess
 import sys
+import threading
+import time
+import uuid
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import BinaryIO
+
+import perf
+
+FIELD_SEP = "\x1f"
+CHUNK_BYTES = 1 << 16
+SLOWEST_KEPT = 5
+
+# psql output parsed into progress: command tags, \timing lines, error locations
+TAG_RE = re.compile(r"^([A-Z]+)(?: [A-Z]+)*(?: (?:\d+ )?(\d+))?$")
+TIMING_RE = re.compile(r"^Time: ([\d.,]+) ms")
+STDIN_LINE_RE = re.compile(r"psql:<stdin>:(\d+):")
+VARIABLE_RE = re.compile(r"^(\w+) = '(.*)'$")
+# Variables psql itself updates after every command
+STATUS_VARIABLES = {
+    "ERROR",
+    "SQLSTATE",
+    "ROW_COUNT",
+    "LAST_ERROR_MESSAGE",
+    "LAST_ERROR_SQLSTATE",
+    "LASTOID",
+    "SHELL_ERROR",
+    "SHELL_EXIT_CODE",
+}
+ROW_TAGS = {"INSERT", "COPY", "UPDATE", "DELETE", "MERGE"}
+TX_TAGS = {"BEGIN", "START", "COMMIT", "END", "ROLLBACK", "SAVEPOINT", "RELEASE"}
+
+# Statement splitting for chunked runs
+SPECIAL_RE = re.compile(rb"""[;'"$]|--|/\*""")
+COMMENT_RE = re.compile(rb"/\*|\*/")
+ESCAPE_STRING_RE = re.compile(rb"\\.|'")
+DOLLAR_RE = re.compile(rb"\$(?:[A-Za-z_\x80-\xff][\w\x80-\xff]*)?\$")
+IDENT_CHAR_RE = re.compile(rb"[\w\x80-\xff$]")
+SPACE_RE = re.compile(rb"\s*")
+KEYWORD_RE = re.compile(rb"\\?([A-Za-z]+)")
+COPY_STDIN_RE = re.compile(rb"COPY\b.*\bFROM\s+STDIN\b", re.DOTALL | re.IGNORECASE)
+TARGET_RE = re.compile(rb"(?:INSERT\s+INTO|COPY|UPDATE|DELETE\s+FROM)\b", re.IGNORECASE)
+ONLY_RE = re.compile(rb"ONLY\b", re.IGNORECASE)
+NAME_PART_RE = re.compile(rb'"(?:[^"]|"")*"|[\w$\x80-\xff]+')
+TX_CONTROL = {"BEGIN", "START", "COMMIT", "END"}
+# Session state that a worker session must replay to run later chunks alike
+SESSION_KEYWORDS = {"SET", "RESET"}
+SET_CONFIG_RE = re.compile(rb"\bset_config\s*\(", re.IGNORECASE)
+
+LEDGER_DDL = """\
+CREATE SCHEMA IF NOT EXISTS private;
+CREATE TABLE IF NOT EXISTS private.tb_seed_ledger (
+    filename text PRIMARY KEY,
+    checksum_txt text NOT NULL,
+    applied_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS private.tb_seed_chunks (
+    filename text NOT NULL,
+    checksum_txt text NOT NULL,
+    start_offset_num bigint NOT NULL,
+    end_offset_num bigint NOT NULL,
+    committed_at timestamptz NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (filename, start_offset_num)
+);
+-- How the file was chunked, so a mismatched --resume can name the flag
+ALTER TABLE private.tb_seed_chunks
+    ADD COLUMN IF NOT EXISTS chunk_bytes_num bigint,
+    ADD COLUMN IF NOT EXISTS jobs_num integer;
+"""
 
 
 def get_db_url():
@@ -43,24 +144,813 @@ def get_db_url():
         return None
 
 
-def run_seed_file(filepath: Path, db_url: str, dry_run: bool = False) -> bool:
-    """Run a single seed file and return success status."""
+@dataclass
+class FileStats:
+    """Progress counters for one seed file, updated while it runs."""
+
+    name: str
+    total_bytes: int
+    bytes_sent: int = 0
+    statements: int = 0
+    rows: int = 0
+    db_ms: float = 0.0
+    started: float = field(default_factory=time.monotonic)
+    wall_s: float = 0.0
+    first_line: int = 0
+    errors: list[str] = field(default_factory=list)
+    slowest: list[tuple[float, int, str]] = field(default_factory=list)
+    last_tag: str = ""
+
+    def elapsed(self) -> float:
+        return self.wall_s or time.monotonic() - self.started
+
+    def rows_per_s(self) -> float:
+        elapsed = self.elapsed()
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def merge(self, other: "FileStats") -> None:
+        """Fold in the counters of a chunk that ran on another session."""
+        self.bytes_sent += other.bytes_sent
+        self.statements += other.statements
+        self.rows += other.rows
+        self.db_ms += other.db_ms
+        self.errors.extend(other.errors)
+        for item in other.slowest:
+            heapq.heappush(self.slowest, item)
+            if len(self.slowest) > SLOWEST_KEPT:
+                heapq.heappop(self.slowest)
+
+    def to_dict(self) -> dict:
+        return {
+            "event": "file",
+            "file": self.name,
+            "ok": not self.errors,
+            "bytes": self.total_bytes,
+            "statements": self.statements,
+            "rows": self.rows,
+            "wall_s": round(self.elapsed(), 3),
+            "db_ms": round(self.db_ms, 3),
+            "rows_per_s": round(self.rows_per_s(), 1),
+            "slowest": [
+                {"statement": n, "tag": tag, "ms": ms}
+                for ms, n, tag in sorted(self.slowest, reverse=True)
+            ],
+            "errors": self.errors,
+        }
+
+
+class ProgressDisplay:
+    """Single-line live progress on stderr, redrawn at most a few times a second."""
+
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.last_draw = 0.0
+
+    def draw(self, stats: FileStats, force: bool = False) -> None:
+        now = time.monotonic()
+        if not self.enabled or (not force and now - self.last_draw < 0.2):
+            return
+        self.last_draw = now
+        done = stats.bytes_sent / stats.total_bytes if stats.total_bytes else 1.0
+        elapsed = stats.elapsed()
+        eta = f"{elapsed / done - elapsed:5.0f}s" if 0 < done < 1 else "    -"
+        line = (
+            f"  {format_bytes(stats.bytes_sent)}/{format_bytes(stats.total_bytes)}"
+            f" {done:4.0%}  {stats.statements:,} stmts  {stats.rows:,} rows"
+            f"  {stats.rows_per_s():,.0f} rows/s  {elapsed:.0f}s  ETA {eta}"
+        )
+        print(f"\r{line:<100}", end="", file=sys.stderr, flush=True)
+
+    def clear(self) -> None:
+        if self.enabled:
+            print(f"\r{'':<100}\r", end="", file=sys.stderr, flush=True)
+
+
+def read_blocks(filepath: Path, start: int = 0) -> Iterator[bytes]:
+    with open(filepath, "rb") as f:
+        f.seek(start)
+        while block := f.read(CHUNK_BYTES):
+            yield block
+
+
+def format_bytes(n: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+
+
+class PsqlSession:
+    """One long-lived psql process that seed files are streamed through.
+
+    Each file's contents are written to psql's stdin inside their own
+    transaction, so a failure rolls that file back while the connection stays
+    open for the next one. Between files, reset() puts the server session and
+    psql's variables back to how they started. A reader thread drains psql's
+    output so command tags and \\timing lines can be turned into live progress.
+    """
+
+    def __init__(self, db_url: str):
+        self.proc = subprocess.Popen(
+            [
+                "psql",
+                db_url,
+                "--no-psqlrc",
+                "--quiet",
+                "--no-align",
+                "--tuples-only",
+                f"--field-separator={FIELD_SEP}",
+                "-v",
+                "ON_ERROR_STOP=0",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+        )
+        self.lines_sent = 0
+        self.output: queue.Queue[str | None] = queue.Queue()
+        threading.Thread(target=self._read_output, daemon=True).start()
+        self.variables = self._variables()
+
+    def _read_output(self) -> None:
+        for raw in self.proc.stdout:
+            self.output.put(raw.decode("utf-8", errors="replace").rstrip("\n"))
+        self.output.put(None)
+
+    def _send(self, data: str | bytes) -> None:
+        if isinstance(data, str):
+            data = data.encode()
+        try:
+            self.proc.stdin.write(data)
+            self.proc.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            raise ConnectionError("psql session closed") from None
+        self.lines_sent += data.count(b"\n")
+
+    def _stream(
+        self,
+        payload: Iterable[bytes],
+        stats: FileStats,
+        marker: str,
+        line_offset: int,
+        tail_sql: str,
+    ) -> None:
+        try:
+            # A seed file's own BEGIN/COMMIT simply takes over this transaction
+            self._send("\\set QUIET off\n\\timing on\nBEGIN;\n")
+            stats.first_line = self.lines_sent - line_offset
+            for data in payload:
+                self._send(data)
+                stats.bytes_sent += len(data)
+            # Terminate a trailing statement that lacks its semicolon; the
+            # tail (checkpoint bookkeeping) runs quietly so it isn't counted
+            self._send(
+                f"\n;\n\\timing off\n\\set QUIET on\n{tail_sql}COMMIT;\n\\echo {marker}\n"
+            )
+        except ConnectionError:
+            pass  # the reader sees EOF and reports it
+
+    @perf.phase("psql")
+    def run_stream(
+        self,
+        payload: Iterable[bytes],
+        stats: FileStats,
+        display: ProgressDisplay | None = None,
+        line_offset: int = 0,
+        tail_sql: str = "",
+    ) -> FileStats:
+        """Run SQL in its own transaction, updating stats from psql's output.
+
+        line_offset is the file line the payload starts at, so errors point at
+        the seed file; tail_sql runs inside the same transaction before COMMIT.
+        """
+        marker = f"__run_seeds_{uuid.uuid4().hex}__"
+        writer = threading.Thread(
+            target=self._stream,
+            args=(payload, stats, marker, line_offset, tail_sql),
+            daemon=True,
+        )
+        writer.start()
+
+        output = []
+        while True:
+            try:
+                line = self.output.get(timeout=0.2)
+            except queue.Empty:
+                if display:
+                    display.draw(stats)
+                continue
+            if line is None:
+                context = [
+                    line
+                    for line in output[-50:]
+                    if not TAG_RE.match(line) and not TIMING_RE.match(line)
+                ]
+                raise ConnectionError(
+                    "\n".join(context) or "psql session ended unexpectedly"
+                )
+            if line == marker:
+                break
+            output.append(line)
+            self._parse_line(line, stats)
+            if display:
+                display.draw(stats)
+
+        writer.join()
+        return stats
+
+    def run_file(
+        self, filepath: Path, display: ProgressDisplay | None = None
+    ) -> FileStats:
+        """Run one seed file and return its stats (errors empty on success)."""
+        stats = FileStats(filepath.name, filepath.stat().st_size)
+        self.run_stream(read_blocks(filepath), stats, display)
+        stats.wall_s = time.monotonic() - stats.started
+        self.reset()
+        return stats
+
+    def _parse_line(self, line: str, stats: FileStats) -> None:
+        if "ERROR:" in line or "FATAL:" in line:
+            # Report line numbers relative to the seed file, not the session
+            line = STDIN_LINE_RE.sub(
+                lambda m: f"{stats.name}:{int(m.group(1)) - stats.first_line}:", line
+            )
+            stats.errors.append(line)
+        elif m := TIMING_RE.match(line):
+            ms = float(m.group(1).replace(",", ""))
+            stats.db_ms += ms
+            if stats.last_tag and stats.last_tag.split()[0] not in TX_TAGS:
+                heapq.heappush(stats.slowest, (ms, stats.statements, stats.last_tag))
+                if len(stats.slowest) > SLOWEST_KEPT:
+                    heapq.heappop(stats.slowest)
+        elif m := TAG_RE.match(line):
+            stats.last_tag = line
+            if m.group(1) not in TX_TAGS:
+                stats.statements += 1
+                if m.group(1) in ROW_TAGS:
+                    stats.rows += int(m.group(2))
+
+    def query(self, sql: str) -> list[list[str]]:
+        """Run SQL outside any seed file and return result rows as strings."""
+        marker = f"__run_seeds_{uuid.uuid4().hex}__"
+        self._send(f"{sql}\n\\echo {marker}\n")
+
+        rows = []
+        while (line := self.output.get()) is not None:
+            if line == marker:
+                return rows
+            if "ERROR:" in line or "FATAL:" in line:
+                raise RuntimeError(line)
+            rows.append(line.split(FIELD_SEP))
+        raise ConnectionError("psql session ended unexpectedly")
+
+    def _variables(self) -> dict[str, str]:
+        return {
+            m.group(1): m.group(2)
+            for (line,) in self.query("\\set")
+            if (m := VARIABLE_RE.match(line))
+        }
+
+    def reset(self) -> None:
+        """Undo the last file's changes to the session before the next one.
+
+        DISCARD ALL resets server settings, roles, temp tables and prepared
+        statements; psql variables the file \\set (ON_ERROR_STOP included) are
+        unset or restored.
+        """
+        self.query("DISCARD ALL;")
+        commands = []
+        current = self._variables()
+        for name in current.keys() - self.variables.keys() - STATUS_VARIABLES:
+            commands.append(f"\\unset {name}\n")
+        for name, value in self.variables.items():
+            if name not in STATUS_VARIABLES and current.get(name) != value:
+                quoted = value.replace("\\", "\\\\").replace("'", "''")
+                commands.append(f"\\set {name} '{quoted}'\n")
+        if commands:
+            self.query("".join(commands))
+
+    def close(self) -> None:
+        if self.proc.poll() is None:
+            try:
+                self._send("\\q\n")
+            except ConnectionError:
+                pass
+        self.proc.wait()
+
+
+def sql_literal(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+@perf.phase("checksum")
+def file_checksum(filepath: Path) -> str:
+    with open(filepath, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class SeedLedger:
+    """Seed file checksums and chunk checkpoints recorded in the target database."""
+
+    def __init__(self, session: PsqlSession):
+        self.session = session
+        session.query(LEDGER_DDL)
+        self.entries = {
+            name: (checksum, applied_at)
+            for name, checksum, applied_at in session.query(
+                "SELECT filename, checksum_txt, applied_at FROM private.tb_seed_ledger;"
+            )
+        }
+        self.partial = {
+            name: int(count)
+            for name, count in session.query(
+                "SELECT filename, count(*) FROM private.tb_seed_chunks GROUP BY filename;"
+            )
+        }
+
+    def state(self, name: str, checksum: str) -> str:
+        """Return 'applied', 'changed', 'partial' or 'pending' for a seed file."""
+        if name in self.partial:
+            return "partial"
+        if name not in self.entries:
+            return "pending"
+        return "applied" if self.entries[name][0] == checksum else "changed"
+
+    def record(self, name: str, checksum: str) -> None:
+        """Mark a file applied and drop checkpoints left by an interrupted run."""
+        self.session.query(
+            "INSERT INTO private.tb_seed_ledger (filename, checksum_txt) "
+            f"VALUES ({sql_literal(name)}, {sql_literal(checksum)}) "
+            "ON CONFLICT (filename) DO UPDATE "
+            "SET checksum_txt = EXCLUDED.checksum_txt, applied_at = CURRENT_TIMESTAMP;"
+        )
+        self.clear_chunks(name)
+        self.entries[name] = (checksum, "now")
+
+    def committed_chunks(self, name: str, checksum: str) -> set[tuple[int, int]]:
+        rows = self.session.query(
+            "SELECT start_offset_num, end_offset_num FROM private.tb_seed_chunks "
+            f"WHERE filename = {sql_literal(name)} AND checksum_txt = {sql_literal(checksum)};"
+        )
+        return {(int(start), int(end)) for start, end in rows}
+
+    def chunk_settings(self, name: str, checksum: str) -> tuple[int, int] | None:
+        """--chunk-mb (in bytes) and --jobs of the run that left checkpoints."""
+        rows = self.session.query(
+            "SELECT chunk_bytes_num, jobs_num FROM private.tb_seed_chunks "
+            f"WHERE filename = {sql_literal(name)} AND checksum_txt = {sql_literal(checksum)} "
+            "AND jobs_num IS NOT NULL LIMIT 1;"
+        )
+        return (int(rows[0][0]), int(rows[0][1])) if rows else None
+
+    def chunk_sql(
+        self, name: str, checksum: str, chunk: "Chunk", chunk_bytes: int, jobs: int
+    ) -> str:
+        """Checkpoint INSERT to run inside the chunk's own transaction."""
+        return (
+            "INSERT INTO private.tb_seed_chunks (filename, checksum_txt, "
+            "start_offset_num, end_offset_num, chunk_bytes_num, jobs_num) "
+            f"VALUES ({sql_literal(name)}, {sql_literal(checksum)}, "
+            f"{chunk.start}, {chunk.end}, {chunk_bytes}, {jobs});\n"
+        )
+
+    def clear_chunks(self, name: str) -> None:
+        self.session.query(
+            f"DELETE FROM private.tb_seed_chunks WHERE filename = {sql_literal(name)};"
+        )
+        self.partial.pop(name, None)
+
+
+def print_status(seed_files: list[Path], seed_dir: Path, ledger: SeedLedger) -> None:
+    """Print the ledger state of every seed file."""
+    for filepath in seed_files:
+        name = filepath.relative_to(seed_dir).as_posix()
+        state = ledger.state(name, file_checksum(filepath))
+        applied_at = ledger.entries.get(name, ("", ""))[1]
+        print(f"{state:8} {name:40} {applied_at}")
+
+
+@dataclass
+class Statement:
+    """One top-level statement (or psql meta-command) and where it sits in the file."""
+
+    start: int
+    end: int
+    first_line: int
+    sql: bytes
+
+    @property
+    def keyword(self) -> str:
+        m = KEYWORD_RE.match(self.sql, skip_comments(self.sql))
+        return m.group(1).decode().upper() if m else ""
+
+    @property
+    def table(self) -> str | None:
+        """Target table of a data-loading statement, None for anything else.
+
+        Unquoted name parts are folded to lower case, quoted ones kept as is.
+        """
+        m = TARGET_RE.match(self.sql, skip_comments(self.sql))
+        if not m:
+            return None
+        pos = skip_comments(self.sql, m.end())
+        if only := ONLY_RE.match(self.sql, pos):
+            pos = skip_comments(self.sql, only.end())
+        parts = []
+        while part := NAME_PART_RE.match(self.sql, pos):
+            name = part.group().decode(errors="replace")
+            parts.append(name if name.startswith('"') else name.lower())
+            pos = part.end()
+            if self.sql[pos : pos + 1] != b".":
+                break
+            pos += 1
+        return ".".join(parts) or None
+
+    @property
+    def is_session_setting(self) -> bool:
+        """SET, RESET, \\set and set_config(), replayed on every session."""
+        keyword = self.keyword
+        return keyword in SESSION_KEYWORDS or (
+            keyword == "SELECT" and bool(SET_CONFIG_RE.search(self.sql))
+        )
+
+
+def skip_comments(sql: bytes, pos: int = 0) -> int:
+    """Offset of the first token after leading whitespace and comments.
+
+    Block comments nest, as they do in PostgreSQL.
+    """
+    while True:
+        pos = SPACE_RE.match(sql, pos).end()
+        if sql.startswith(b"--", pos):
+            end = sql.find(b"\n", pos)
+            pos = len(sql) if end < 0 else end + 1
+        elif sql.startswith(b"/*", pos):
+            depth, pos = 1, pos + 2
+            while depth and (m := COMMENT_RE.search(sql, pos)):
+                depth += 1 if m.group() == b"/*" else -1
+                pos = m.end()
+            if depth:
+                return len(sql)
+        else:
+            return pos
+
+
+def split_statements(f: BinaryIO) -> Iterator[Statement]:
+    """Stream top-level SQL statements out of a seed file.
+
+    Semicolons inside quoted strings, identifiers, comments and dollar-quoted
+    bodies don't end a statement. psql meta-commands end at their newline and
+    the data block after COPY ... FROM stdin stays with its COPY statement.
+    """
+    buf = bytearray()
+    start = offset = line_no = stmt_line = 0
+    state: bytes | None = None  # quote char, b"E", b"*" or a dollar-quote tag
+    depth = 0
+    has_sql = in_copy = False
+
+    def emit(end: int) -> Statement:
+        stmt = Statement(start, end, stmt_line, bytes(buf))
+        buf.clear()
+        return stmt
+
+    for line in f:
+        line_start = offset
+        offset += len(line)
+        line_no += 1
+
+        if in_copy:
+            buf += line
+            if line.rstrip(b"\r\n") == b"\\.":
+                in_copy = has_sql = False
+                yield emit(offset)
+                start, stmt_line = offset, line_no
+            continue
+
+        stripped = line.lstrip()
+        if state is None and not has_sql and stripped.startswith(b"\\"):
+            buf += line
+            yield emit(offset)
+            start, stmt_line = offset, line_no
+            continue
+        if state is not None or (stripped and not stripped.startswith(b"--")):
+            has_sql = True
+
+        seg = pos = 0
+        while pos < len(line):
+            if state is None:
+                m = SPECIAL_RE.search(line, pos)
+                if not m:
+                    break
+                tok, pos = m.group(), m.end()
+                if tok == b";":
+                    buf += line[seg:pos]
+                    seg = pos
+                    if COPY_STDIN_RE.match(buf, skip_comments(buf)):
+                        in_copy = True
+                        break
+                    yield emit(line_start + pos)
+                    start, stmt_line, has_sql = line_start + pos, line_no - 1, False
+                elif tok == b"--":
+                    break
+                elif tok == b"/*":
+                    state, depth = b"*", 1
+                elif tok == b"'":
+                    prev = line[pos - 2 : pos - 1]
+                    state = b"E" if prev in (b"E", b"e") else b"'"
+                elif tok == b'"':
+                    state = b'"'
+                else:  # "$" - a dollar-quote opener unless part of an identifier
+                    d = DOLLAR_RE.match(line, pos - 1)
+                    if d and not IDENT_CHAR_RE.match(line[pos - 2 : pos - 1] or b" "):
+                        state, pos = d.group(), d.end()
+            elif state == b"*":
+                m = COMMENT_RE.search(line, pos)
+                if not m:
+                    break
+                pos = m.end()
+                depth += 1 if m.group() == b"/*" else -1
+                if depth == 0:
+                    state = None
+            elif state == b"E":
+                m = ESCAPE_STRING_RE.search(line, pos)
+                if not m:
+                    break
+                pos = m.end()
+                if m.group() == b"'":
+                    state = None
+            else:
+                # Doubled quotes ('' and "") just close and reopen the literal
+                i = line.find(state, pos)
+                if i < 0:
+                    break
+                pos, state = i + len(state), None
+        buf += line[seg:]
+
+    if has_sql:
+        yield emit(offset)
+
+
+@dataclass
+class Chunk:
+    """A run of statements committed together; table is None for barriers."""
+
+    start: int
+    end: int
+    first_line: int
+    table: str | None
+    statements: list[Statement]
+    preamble: list[Statement]  # session settings of every earlier chunk
+
+
+def build_chunks(filepath: Path, chunk_bytes: int, by_table: bool) -> Iterator[Chunk]:
+    """Group a file's statements into chunks of about chunk_bytes.
+
+    The file's own BEGIN/COMMIT are dropped because every chunk gets its own
+    transaction. With by_table, a chunk only ever loads one table and any
+    other statement (DDL, SET, ...) becomes a chunk of its own, so chunks
+    between two such barriers can be loaded in parallel.
+    """
+    current: list[Statement] = []
+    preamble: list[Statement] = []
+    table: str | None = None
+    size = 0
+
+    def flush() -> Chunk:
+        chunk = Chunk(
+            current[0].start,
+            current[-1].end,
+            current[0].first_line,
+            table,
+            list(current),
+            list(preamble),
+        )
+        preamble.extend(s for s in current if s.is_session_setting)
+        current.clear()
+        return chunk
+
+    with open(filepath, "rb") as f:
+        for stmt in split_statements(f):
+            if stmt.keyword in TX_CONTROL:
+                continue
+            stmt_table = stmt.table if by_table else None
+            if current and (
+                size >= chunk_bytes or (by_table and (stmt_table != table or not table))
+            ):
+                yield flush()
+                size = 0
+            table = stmt_table
+            current.append(stmt)
+            size += len(stmt.sql)
+    if current:
+        yield flush()
+
+
+def resume_mismatch(
+    recorded: tuple[int, int] | None, chunk_bytes: int, jobs: int
+) -> str:
+    """Error for checkpoints that this run's chunk boundaries don't match.
+
+    Chunks depend on --chunk-mb, and on --jobs because parallel runs split
+    at every change of table.
+    """
+    if recorded is None:
+        return (
+            "checkpoints don't line up with this run's chunks; resume with the "
+            "--chunk-mb and --jobs used for the interrupted run"
+        )
+    recorded_bytes, recorded_jobs = recorded
+    changed = []
+    if recorded_bytes != chunk_bytes:
+        changed.append(
+            f"--chunk-mb {recorded_bytes / 1024 / 1024:.3g} "
+            f"(not {chunk_bytes / 1024 / 1024:.3g})"
+        )
+    if (recorded_jobs > 1) != (jobs > 1):
+        changed.append(f"--jobs {recorded_jobs} (not {jobs})")
+    if not changed:
+        return "checkpoints don't line up with this file's chunks"
+    return (
+        "checkpoints don't line up with this run's chunks; the interrupted run "
+        f"used {' and '.join(changed)}"
+    )
+
+
+def run_chunked_file(
+    filepath: Path,
+    name: str,
+    checksum: str,
+    sessions: list[PsqlSession],
+    ledger: "SeedLedger | None",
+    chunk_bytes: int,
+    resume: bool,
+    display: ProgressDisplay | None = None,
+) -> FileStats:
+    """Run a large seed file as separately committed, statement-aligned chunks.
+
+    Each committed chunk records a checkpoint in the same transaction, so
+    --resume continues after the last chunk that actually committed. With
+    more than one session, chunks for different tables load in parallel.
+    """
+    stats = FileStats(filepath.name, filepath.stat().st_size)
+    done = set()
+    if ledger:
+        if resume:
+            done = ledger.committed_chunks(name, checksum)
+        if not done:
+            # Nothing to resume, or checkpoints of an earlier version of the file
+            ledger.clear_chunks(name)
+
+    with perf.phase("split"):
+        chunks = list(build_chunks(filepath, chunk_bytes, len(sessions) > 1))
+    if done - {(c.start, c.end) for c in chunks}:
+        stats.errors.append(
+            resume_mismatch(
+                ledger.chunk_settings(name, checksum), chunk_bytes, len(sessions)
+            )
+        )
+        return stats
+    stats.bytes_sent = sum(c.end - c.start for c in chunks if (c.start, c.end) in done)
+    if done:
+        print(f"  Resuming: {len(done)}/{len(chunks)} chunks already committed")
+
+    lock = threading.Lock()
+    # How many of the file's session settings each session has run so far.
+    # Barriers run on one session only, so the others catch up on the SETs
+    # they missed before their next chunk.
+    settings_seen = {id(s): 0 for s in sessions}
+
+    def run_chunk(session: PsqlSession, chunk: Chunk) -> bool:
+        statements = chunk.preamble[settings_seen[id(session)] :] + chunk.statements
+        settings_seen[id(session)] = len(chunk.preamble) + sum(
+            s.is_session_setting for s in chunk.statements
+        )
+        tail_sql = (
+            ledger.chunk_sql(name, checksum, chunk, chunk_bytes, len(sessions))
+            if ledger
+            else ""
+        )
+        payload = (s.sql for s in statements)
+        if len(sessions) == 1:
+            session.run_stream(payload, stats, display, chunk.first_line, tail_sql)
+            return not stats.errors
+        part = FileStats(filepath.name, 0)
+        session.run_stream(payload, part, None, chunk.first_line, tail_sql)
+        with lock:
+            stats.merge(part)
+            if display:
+                display.draw(stats, force=True)
+        return not part.errors
+
+    def run_group(session: PsqlSession, group: list[Chunk]) -> bool:
+        return all(run_chunk(session, c) for c in group if (c.start, c.end) not in done)
+
+    # Barrier chunks run alone; runs of table chunks between them fan out
+    pending: dict[str, list[Chunk]] = {}
+    segments: list[list[list[Chunk]]] = []
+    for chunk in chunks:
+        if chunk.table:
+            pending.setdefault(chunk.table, []).append(chunk)
+            continue
+        if pending:
+            segments.append(list(pending.values()))
+            pending = {}
+        segments.append([[chunk]])
+    if pending:
+        segments.append(list(pending.values()))
+
+    with ThreadPoolExecutor(max_workers=len(sessions)) as pool:
+        for groups in segments:
+            if len(groups) == 1:
+                ok = run_group(sessions[0], groups[0])
+            else:
+                free: queue.Queue[PsqlSession] = queue.Queue()
+                for session in sessions:
+                    free.put(session)
+
+                def run_on_free(group: list[Chunk]) -> bool:
+                    session = free.get()
+                    try:
+                        return run_group(session, group)
+                    finally:
+                        free.put(session)
+
+                ok = all(list(pool.map(run_on_free, groups)))
+            if not ok:
+                break
+
+    stats.wall_s = time.monotonic() - stats.started
+    # Settings carry over between this file's chunks, but not into the next file
+    for session in sessions:
+        session.reset()
+    if not stats.errors and ledger:
+        ledger.clear_chunks(name)
+    return stats
+
+
+def report_file(stats: FileStats, display: ProgressDisplay | None, metrics) -> bool:
+    """Print a finished file's outcome, append its metrics and return success."""
+    if display:
+        display.clear()
+    if metrics:
+        metrics.write(json.dumps(stats.to_dict()) + "\n")
+        metrics.flush()
+
+    if stats.errors:
+        details = "\n".join(stats.errors)
+        print(f"  ERROR: {details}", file=sys.stderr)
+        return False
+
+    print(
+        f"  OK  {stats.statements:,} stmts  {stats.rows:,} rows  "
+        f"{stats.wall_s:.2f}s wall  {stats.db_ms / 1000:.2f}s db  "
+        f"{stats.rows_per_s():,.0f} rows/s"
+    )
+    return True
+
+
+def run_session_file(
+    filepath: Path,
+    session: PsqlSession | None,
+    display: ProgressDisplay | None = None,
+    metrics=None,
+) -> bool:
+    """Run a single seed file through a shared session and return success status."""
+    print(f"{'[DRY RUN] ' if session is None else ''}Seeding: {filepath.name}")
+
+    if session is None:
+        return True
+
+    return report_file(session.run_file(filepath, display), display, metrics)
+
+
+def run_seed_file(
+    filepath: Path, db_url: str, dry_run: bool = False, use_pv: bool = False
+) -> bool:
+    """Run a single seed file in its own psql process and return success status."""
     print(f"{'[DRY RUN] ' if dry_run else ''}Seeding: {filepath.name}")
 
     if dry_run:
         return True
 
     try:
-        # Use pv for progress if available, otherwise plain psql
-        try:
-            subprocess.run(["pv", "--version"], capture_output=True, check=True)
-            cmd = f"pv '{filepath}' | psql '{db_url}'"
-            shell = True
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            cmd = ["psql", db_url, "-f", str(filepath)]
-            shell = False
+        # Use pv for progress if available, otherwise plain psql. Without
+        # ON_ERROR_STOP psql exits 0 after a failed statement, and without
+        # pipefail the pipeline's status is psql's alone
+        if use_pv:
+            cmd = [
+                "bash",
+                "-c",
+                'set -o pipefail; pv "$1" | psql "$2" -v ON_ERROR_STOP=1',
+                "bash",
+                str(filepath),
+                db_url,
+            ]
+        else:
+            cmd = ["psql", db_url, "-v", "ON_ERROR_STOP=1", "-f", str(filepath)]
 
-        result = subprocess.run(cmd, shell=shell, capture_output=True, text=True)
+        with perf.phase("psql"):
+            result = subprocess.run(cmd, capture_output=True, text=True)
 
         if result.returncode != 0:
             print(f"  ERROR: {result.stderr}", file=sys.stderr)
@@ -98,8 +988,65 @@ def main():
     parser.add_argument(
         "--stop-on-error", action="store_true", help="Stop execution on first error"
     )
+    parser.add_argument(
+        "--isolated",
+        action="store_true",
+        help="Run each file in its own psql process instead of one shared session",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-apply files even if the ledger says they are unchanged",
+    )
+    parser.add_argument(
+        "--status",
+        action="store_true",
+        help="Show applied/changed/partial/pending state of each file and exit",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=Path,
+        help="Append per-file timing and throughput as JSON lines to this file",
+    )
+    parser.add_argument(
+        "--no-progress",
+        action="store_true",
+        help="Don't draw the live progress line on stderr",
+    )
+    parser.add_argument(
+        "--no-ledger",
+        action="store_true",
+        help="Don't read or write private.tb_seed_ledger",
+    )
+    parser.add_argument(
+        "--chunk-mb",
+        type=float,
+        help="Split files larger than this into statement-aligned chunks, "
+        "each committed separately",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue chunked files from their last committed chunk",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Sessions for loading chunks of different tables in parallel (default: 1)",
+    )
 
+    perf.add_argument(parser)
     args = parser.parse_args()
+    perf.start(args.profile)
+
+    if args.chunk_mb and args.isolated:
+        parser.error("--chunk-mb needs the shared session; drop --isolated")
+    if args.resume and (not args.chunk_mb or args.no_ledger):
+        parser.error("--resume needs --chunk-mb and the ledger")
+    if args.jobs > 1 and not args.chunk_mb:
+        parser.error("--jobs only applies to chunked files; add --chunk-mb")
 
     # Validate seed directory
     if not args.seed_dir.is_dir():
@@ -120,18 +1067,102 @@ def main():
         print(f"No files matching '{args.pattern}' in {args.seed_dir}")
         sys.exit(0)
 
-    print(f"Found {len(seed_files)} seed file(s)\n")
+    if args.status and (args.dry_run or args.no_ledger):
+        print("Error: --status needs the ledger and a database", file=sys.stderr)
+        sys.exit(1)
+
+    if not args.status:
+        print(f"Found {len(seed_files)} seed file(s)\n")
+
+    # Detect tools once per run, not once per file
+    use_pv = args.isolated and shutil.which("pv") is not None
+    session = None
+    workers: list[PsqlSession] = []
+    ledger = None
+    chunk_bytes = int(args.chunk_mb * 1024 * 1024) if args.chunk_mb else 0
+    display = ProgressDisplay(sys.stderr.isatty() and not args.no_progress)
+    metrics = open(args.metrics, "a") if args.metrics else None
+    run_started = time.monotonic()
 
     # Run seeds
     success_count = 0
-    for filepath in seed_files:
-        if run_seed_file(filepath, db_url, args.dry_run):
-            success_count += 1
-        elif args.stop_on_error:
-            print(f"\nStopped after error. {success_count}/{len(seed_files)} completed.")
-            sys.exit(1)
+    skipped_count = 0
+    try:
+        if not args.dry_run:
+            with perf.phase("connect"):
+                session = PsqlSession(db_url)
+                workers = [session] + [
+                    PsqlSession(db_url) for _ in range(args.jobs - 1)
+                ]
+            if not args.no_ledger:
+                ledger = SeedLedger(session)
+
+        if args.status:
+            print_status(seed_files, args.seed_dir, ledger)
+            sys.exit(0)
+
+        for filepath in seed_files:
+            name = filepath.relative_to(args.seed_dir).as_posix()
+            checksum = file_checksum(filepath) if ledger else ""
+            state = ledger.state(name, checksum) if ledger else "pending"
+            if state == "applied" and not args.force:
+                print(f"Skipping: {filepath.name} (unchanged)")
+                success_count += 1
+                skipped_count += 1
+                continue
+            if state == "changed":
+                print(f"Changed since last apply: {filepath.name}")
+            elif state == "partial" and not args.resume:
+                print(f"Restarting interrupted chunked run: {filepath.name}")
+
+            if chunk_bytes and session and filepath.stat().st_size > chunk_bytes:
+                print(f"Seeding: {filepath.name} (chunked)")
+                stats = run_chunked_file(
+                    filepath,
+                    name,
+                    checksum,
+                    workers,
+                    ledger,
+                    chunk_bytes,
+                    args.resume,
+                    display,
+                )
+                ok = report_file(stats, display, metrics)
+            elif args.isolated:
+                ok = run_seed_file(filepath, db_url, args.dry_run, use_pv)
+            else:
+                ok = run_session_file(filepath, session, display, metrics)
+            if ok:
+                success_count += 1
+                if ledger:
+                    ledger.record(name, checksum)
+            elif args.stop_on_error:
+                print(f"\nStopped after error. {success_count}/{len(seed_files)} completed.")
+                sys.exit(1)
+    except (ConnectionError, RuntimeError) as e:
+        print(f"  ERROR: {e}", file=sys.stderr)
+        print(f"\nAborted. {success_count}/{len(seed_files)} completed.")
+        sys.exit(1)
+    finally:
+        for worker in workers:
+            worker.close()
+        if metrics:
+            metrics.write(
+                json.dumps(
+                    {
+                        "event": "run",
+                        "files": len(seed_files),
+                        "succeeded": success_count,
+                        "skipped": skipped_count,
+                        "wall_s": round(time.monotonic() - run_started, 3),
+                    }
+                )
+                + "\n"
+            )
+            metrics.close()
 
-    print(f"\nCompleted: {success_count}/{len(seed_files)} seed files")
+    skipped = f" ({skipped_count} unchanged, skipped)" if skipped_count else ""
+    print(f"\nCompleted: {success_count}/{len(seed_files)} seed files{skipped}")
     sys.exit(0 if success_count == len(seed_files) else 1)
 
 
@@ -0,0 +1,304 @@
+#!/usr/bin/env -S uv run
+# /// script
+# requires-python = ">=3.11"
+# dependencies = []
+# ///
+"""
+Create migrated and seeded test databases by cloning a cached template.
+
+The template is built once: a staging database gets every migration (the
+*.sql files lint_migration.py checks) and then run_seeds.py over the seed
+directory, and is renamed to tpl_<key>. The key is a hash of the names and
+contents of those migration and seed files, so the template is rebuilt only
+when one of them changes. Each test database is then a
+CREATE DATABASE ... TEMPLATE copy, which takes well under a second instead of
+replaying migrations and seeds.
+
+Usage:
+    uv run template_db.py [name] [options]
+
+Examples:
+    uv run template_db.py                         # build the template if stale
+    uv run template_db.py test_db                 # clone it into test_db
+    export DATABASE_URL=$(uv run template_db.py test_$$ --replace)
+    uv run template_db.py --key                   # print the current key
+    uv run template_db.py --drop test_db          # clean up after a test run
+    uv run template_db.py --rebuild --base tpl_platform
+
+Progress goes to stderr; the URL of the cloned database is printed on stdout.
+--db-url names the server to create databases on (any database that is not
+the template works as the admin connection). Templates are marked
+IS_TEMPLATE and ALLOW_CONNECTIONS false: a connected session would make the
+clone fail. Older tpl_ templates are dropped after a new one is built.
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from pg_common import apply_files, psql, with_database
+from run_seeds import get_db_url
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+# Part of the key, so a change to how templates are built invalidates old ones
+BUILD_VERSION = "1"
+KEY_CHARS = 16
+NAME_RE = re.compile(r"^[A-Za-z_][\w$-]{0,62}$")
+
+
+def script_cmd(script: str) -> list[str]:
+    """Command prefix for running a sibling uv script."""
+    if shutil.which("uv"):
+        return ["uv", "run", "--script", str(SCRIPTS_DIR / script)]
+    return [sys.executable, str(SCRIPTS_DIR / script)]
+
+
+def template_key(
+    migrations: list[Path],
+    migrations_dir: Path,
+    seeds: list[Path],
+    seed_dir: Path,
+    base: str,
+) -> str:
+    """Hash of every input that shapes the template's contents."""
+    digest = hashlib.sha256(f"{BUILD_VERSION}\0{base}\0".encode())
+    inputs = (("migration", migrations_dir, migrations), ("seed", seed_dir, seeds))
+    for label, root, files in inputs:
+        for f in files:
+            digest.update(f"{label}\0{f.relative_to(root).as_posix()}\0".encode())
+            with open(f, "rb") as fh:
+                digest.update(hashlib.file_digest(fh, "sha256").digest())
+    return digest.hexdigest()[:KEY_CHARS]
+
+
+def database_exists(admin_url: str, name: str) -> bool:
+    return psql(admin_url, f"SELECT 1 FROM pg_database WHERE datname = '{name}'") == "1"
+
+
+def drop_database(admin_url: str, name: str) -> None:
+    # A template has to be demoted before it can be dropped
+    if database_exists(admin_url, name):
+        psql(admin_url, f'ALTER DATABASE "{name}" WITH IS_TEMPLATE false')
+        psql(admin_url, f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+
+
+def build_template(
+    admin_url: str,
+    template: str,
+    base: str,
+    migrations: list[Path],
+    seed_dir: Path,
+    pattern: str,
+) -> float:
+    """Migrate and seed a staging database, then rename it to the template.
+
+    Building under a per-process name means concurrent builders never see a
+    half-built template; the first rename wins and the others drop their copy.
+    Returns the build time in seconds.
+    """
+    staging = f"{template}_build_{os.getpid()}"
+    started = time.perf_counter()
+    drop_database(admin_url, staging)
+    psql(admin_url, f'CREATE DATABASE "{staging}" TEMPLATE "{base}"')
+    try:
+        staging_url = with_database(admin_url, staging)
+        print(f"Applying {len(migrations)} migration(s)...", file=sys.stderr)
+        apply_files(staging_url, migrations)
+
+        print(f"Running seeds from {seed_dir}...", file=sys.stderr)
+        result = subprocess.run(
+            [
+                *script_cmd("run_seeds.py"),
+                str(seed_dir),
+                "--db-url",
+                staging_url,
+                "--pattern",
+                pattern,
+                "--stop-on-error",
+                "--no-progress",
+            ],
+            stdout=sys.stderr,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"run_seeds.py failed with exit code {result.returncode}"
+            )
+
+        # Nobody may hold a connection to a template while it is cloned
+        psql(admin_url, f'ALTER DATABASE "{staging}" WITH ALLOW_CONNECTIONS false')
+        try:
+            psql(admin_url, f'ALTER DATABASE "{staging}" RENAME TO "{template}"')
+        except RuntimeError:
+            if not database_exists(admin_url, template):
+                raise
+            print(f"{template} was built concurrently; using that one", file=sys.stderr)
+        else:
+            psql(admin_url, f'ALTER DATABASE "{template}" WITH IS_TEMPLATE true')
+    finally:
+        drop_database(admin_url, staging)
+    return time.perf_counter() - started
+
+
+def stale_templates(admin_url: str, prefix: str, current: str) -> list[str]:
+    rows = psql(
+        admin_url,
+        "SELECT datname FROM pg_database WHERE datistemplate "
+        f"AND datname ~ '^{prefix}_[0-9a-f]{{{KEY_CHARS}}}$' ORDER BY 1",
+    )
+    return [name for name in rows.splitlines() if name != current]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Clone migrated and seeded test databases from a cached template",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=__doc__,
+    )
+    parser.add_argument(
+        "name",
+        nargs="?",
+        help="Database to create from the template (default: only build the template)",
+    )
+    parser.add_argument(
+        "--db-url",
+        help="Server to create databases on "
+        "(default: $DATABASE_URL or from supabase status)",
+    )
+    parser.add_argument(
+        "--migrations-dir",
+        type=Path,
+        default=Path("supabase/migrations"),
+        help="Migrations directory (default: supabase/migrations)",
+    )
+    parser.add_argument(
+        "--seed-dir",
+        type=Path,
+        default=Path("supabase/seed"),
+        help="Seed directory passed to run_seeds.py (default: supabase/seed)",
+    )
+    parser.add_argument(
+        "--pattern",
+        default="*.sql",
+        help="Glob pattern for seed files (default: *.sql)",
+    )
+    parser.add_argument(
+        "--base",
+        default="template1",
+        help="Database the template starts from, e.g. one with the Supabase "
+        "platform schemas and roles (default: template1)",
+    )
+    parser.add_argument(
+        "--prefix",
+        default="tpl",
+        help="Template name prefix; the template is <prefix>_<key> (default: tpl)",
+    )
+    parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="Drop the target database first if it exists",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Rebuild the template even if its key is unchanged",
+    )
+    parser.add_argument(
+        "--keep-stale",
+        action="store_true",
+        help="Don't drop templates with an older key after building",
+    )
+    parser.add_argument(
+        "--key",
+        action="store_true",
+        help="Print the template name for the current files and exit",
+    )
+    parser.add_argument(
+        "--drop",
+        action="store_true",
+        help="Drop the named database instead of creating it",
+    )
+
+    args = parser.parse_args()
+
+    if args.drop and not args.name:
+        parser.error("--drop needs a database name")
+    for name in (args.name, args.prefix):
+        if name and not NAME_RE.match(name):
+            parser.error(f"invalid database name: {name}")
+
+    if not args.migrations_dir.is_dir():
+        print(f"Error: {args.migrations_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+    if not args.seed_dir.is_dir():
+        print(f"Error: {args.seed_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+
+    # The same file sets lint_migration.py and run_seeds.py work on
+    migrations = sorted(args.migrations_dir.glob("*.sql"))
+    seeds = sorted(args.seed_dir.glob(args.pattern))
+    template = f"{args.prefix}_" + template_key(
+        migrations, args.migrations_dir, seeds, args.seed_dir, args.base
+    )
+    if args.key:
+        print(template)
+        return
+
+    db_url = args.db_url or get_db_url()
+    if not db_url:
+        print(
+            "Error: No database URL. Set DATABASE_URL or use --db-url", file=sys.stderr
+        )
+        sys.exit(1)
+    if not shutil.which("psql"):
+        print("Error: psql not found", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.drop:
+            drop_database(db_url, args.name)
+            print(f"Dropped {args.name}", file=sys.stderr)
+            return
+
+        if args.rebuild:
+            drop_database(db_url, template)
+        if database_exists(db_url, template):
+            print(f"Template {template} is up to date", file=sys.stderr)
+        else:
+            print(
+                f"Building {template} ({len(migrations)} migrations, "
+                f"{len(seeds)} seed files)",
+                file=sys.stderr,
+            )
+            elapsed = build_template(
+                db_url, template, args.base, migrations, args.seed_dir, args.pattern
+            )
+            print(f"Built {template} in {elapsed:.2f}s", file=sys.stderr)
+            if not args.keep_stale:
+                for stale in stale_templates(db_url, args.prefix, template):
+                    drop_database(db_url, stale)
+                    print(f"Dropped stale template {stale}", file=sys.stderr)
+
+        if args.name:
+            if args.replace:
+                drop_database(db_url, args.name)
+            started = time.perf_counter()
+            psql(db_url, f'CREATE DATABASE "{args.name}" TEMPLATE "{template}"')
+            elapsed = time.perf_counter() - started
+            print(
+                f"Cloned {args.name} from {template} in {elapsed:.2f}s",
+                file=sys.stderr,
+            )
+            print(with_database(db_url, args.name))
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()